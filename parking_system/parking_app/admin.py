@@ -1,8 +1,18 @@
 # parking_api/admin.py
 from django.contrib import admin
-from .models import Owner, Vehicle, ParkingPass, ParkingTransaction
+from .models import (
+    Owner, Vehicle, ParkingPass, ParkingTransaction, Notification, HourlyRollup, DailyRollup, GateJournalCheckpoint,
+    Zone, Slot, Facility,
+)
 
 admin.site.register(Owner)
 admin.site.register(Vehicle)
 admin.site.register(ParkingPass)
-admin.site.register(ParkingTransaction)
\ No newline at end of file
+admin.site.register(ParkingTransaction)
+admin.site.register(Notification)
+admin.site.register(HourlyRollup)
+admin.site.register(DailyRollup)
+admin.site.register(GateJournalCheckpoint)
+admin.site.register(Zone)
+admin.site.register(Slot)
+admin.site.register(Facility)
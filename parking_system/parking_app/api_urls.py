@@ -2,21 +2,41 @@ from django.urls import path
 from .views import (
     LoginView,
     DashboardStatsView,
+    DashboardStreamView,
     SlotsDataView,
+    ZoneAvailabilityView,
     CreatePassView,
     VehicleEntryExitView,
+    GateEventBatchView,
+    GateJournalView,
     AllTransactionsView,
+    TransactionExportView,
     ExpiryNotificationsView,
     AllPassesView,
+    RevenueReportView,
+    HourlyTrafficReportView,
+    RequestMetricsView,
+    PlateSearchView,
+    vehicle_entry_exit_async,
 )
 
 urlpatterns = [
     path('auth/login/', LoginView.as_view(), name='api_login'),
     path('dashboard-stats/', DashboardStatsView.as_view(), name='dashboard_stats'),
+    path('dashboard-stream/', DashboardStreamView.as_view(), name='dashboard_stream'),
     path('available-slots/', SlotsDataView.as_view(), name='slots_data'),
+    path('available-slots/zones/', ZoneAvailabilityView.as_view(), name='zone_availability'),
     path('create-pass/', CreatePassView.as_view(), name='create_pass'),
     path('entry-exit/', VehicleEntryExitView.as_view(), name='entry_exit'),
+    path('entry-exit/batch/', GateEventBatchView.as_view(), name='entry_exit_batch'),
+    path('entry-exit/journal/', GateJournalView.as_view(), name='entry_exit_journal'),
+    path('entry-exit/async/', vehicle_entry_exit_async, name='entry_exit_async'),
     path('transactions/', AllTransactionsView.as_view(), name='transactions'),
+    path('transactions/export/', TransactionExportView.as_view(), name='transactions_export'),
+    path('vehicles/search/', PlateSearchView.as_view(), name='plate_search'),
     path('passes/', AllPassesView.as_view(), name='passes'),
     path('passes/expiring/', ExpiryNotificationsView.as_view(), name='passes_expiring'),
+    path('reports/revenue/', RevenueReportView.as_view(), name='report_revenue'),
+    path('reports/hourly/', HourlyTrafficReportView.as_view(), name='report_hourly'),
+    path('metrics/', RequestMetricsView.as_view(), name='request_metrics'),
 ]
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ParkingAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'parking_app'
+
+    def ready(self):
+        from . import authentication, expiry_scheduler, plate_search, plates
+        authentication.connect_signals()
+        expiry_scheduler.connect_signals()
+        plates.connect_signals()
+        plate_search.connect_signals()
@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_CACHE_KEY = 'parking:token:{key}'
+
+
+def _cache_key(key):
+    return TOKEN_CACHE_KEY.format(key=key)
+
+
+def _remember(key, user):
+    cache.set(_cache_key(key), user, getattr(settings, 'TOKEN_CACHE_TTL', 30))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that keeps token -> user in the Django cache for
+    TOKEN_CACHE_TTL seconds, so a known token costs no query.
+
+    Deleting a token (LogoutView, logout_user, the admin) and saving a user,
+    e.g. to deactivate it, evict the cached entries (see connect_signals).
+    That eviction reaches other processes only through a shared CACHES
+    backend. With the default per-process LocMemCache, other workers keep
+    accepting a revoked token for up to TOKEN_CACHE_TTL seconds; set it to 0
+    to turn the cache off. Unknown and inactive tokens are never cached.
+    """
+
+    def authenticate_credentials(self, key):
+        user = cache.get(_cache_key(key))
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            _remember(key, user)
+            return user, token
+        # request.auth only needs the key; the row is not read
+        return user, Token(key=key, user=user)
+
+
+class QueryTokenAuthentication(CachedTokenAuthentication):
+    """
+    Token authentication from a `?token=` query parameter.
+
+    For clients that cannot set an Authorization header, such as the
+    browser's EventSource. Only use it on read-only streams: the token ends up
+    in URLs and therefore in access logs.
+    """
+
+    def authenticate(self, request):
+        key = request.query_params.get('token')
+        if not key:
+            return None
+        return self.authenticate_credentials(key)
+
+
+async def atoken_user(request):
+    """
+    The active user named by an `Authorization: Token <key>` header, or None.
+
+    For plain Django async views, which DRF's authentication classes cannot
+    serve. Shares CachedTokenAuthentication's cache.
+    """
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) != 2 or auth[0].lower() != 'token':
+        return None
+    user = await cache.aget(_cache_key(auth[1]))
+    if user is not None:
+        return user
+    token = await Token.objects.select_related('user').filter(key=auth[1]).afirst()
+    if token is None or not token.user.is_active:
+        return None
+    await cache.aset(_cache_key(token.key), token.user, getattr(settings, 'TOKEN_CACHE_TTL', 30))
+    return token.user
+
+
+# ======================================================
+# ========== INVALIDATION ==============================
+# ======================================================
+def evict_tokens(keys):
+    keys = [_cache_key(key) for key in keys]
+    cache.delete_many(keys)
+    # Again at commit, in case a request re-cached the old state meanwhile
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _token_deleted(sender, instance, **kwargs):
+    evict_tokens([instance.key])
+
+
+def _user_saved(sender, instance, created=False, **kwargs):
+    if not created:
+        evict_tokens(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+
+
+def connect_signals():
+    post_delete.connect(_token_deleted, sender=Token, dispatch_uid='authentication.token_deleted')
+    post_save.connect(_user_saved, sender=User, dispatch_uid='authentication.user_saved')
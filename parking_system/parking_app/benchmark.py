@@ -0,0 +1,583 @@
+"""
+Synthetic load for the parking API.
+
+seed() fills the database with owners, vehicles, passes and a history of
+completed stays; run() replays a weighted mix of API calls through the DRF
+test client, timing each one and counting its queries; summarise() turns
+the samples into per-endpoint latency percentiles, queries per request and
+throughput. The summary is plain JSON so runs can be saved and compared
+between versions with compare().
+
+run_gate_sync() and run_gate_async() push the same burst of entries and
+exits through the sync gate view (one thread per in-flight request) and the
+async one (served by the ASGI handler), for comparing their throughput under
+concurrency.
+
+time_plate_search() times the fuzzy plate index (plate_search.py) on
+camera misreads, against a linear scan.
+
+time_listings() serializes whole tables through each list view's
+ModelSerializer and through its values() serializer, and checks that both
+render the same JSON.
+
+The management command `benchmark_api` wraps all of this in a throwaway
+test database; `benchmark_sqlite` runs it under each SQLite profile and
+`benchmark_gate` compares the two gate views, `benchmark_serializers` the
+two listing paths and `benchmark_plate_search` the plate index and a scan.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .facilities import reset_facilities
+from .gate import close_async_gate
+from .models import Owner, Vehicle, ParkingPass, ParkingTransaction
+from .occupancy import ledger, VEHICLE_TYPES
+from .owners import reset_guest_owner
+from .plate_search import reset_plate_index
+from .plates import plate_cache
+from .rollups import rebuild_rollups
+from .slots import allocator
+from .tariffs import compute_fees
+
+PASS_DURATIONS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+    'monthly': timedelta(days=30),
+    'yearly': timedelta(days=365),
+}
+
+# Relative weight of each operation in the replayed traffic
+DEFAULT_MIX = {
+    'entry': 30,
+    'exit': 25,
+    'create_pass': 5,
+    'dashboard': 20,
+    'slots': 10,
+    'transactions': 5,
+    'reports': 5,
+}
+
+
+def plate(n):
+    return f"BM{n % 100:02d}X{n:06d}"
+
+
+# ======================================================
+# ========== SEEDING ===================================
+# ======================================================
+def seed(owners=500, vehicles=1500, passes=300, days=730, per_day=60, parked=40, rng=None, batch_size=5000):
+    """
+    Bulk-load synthetic data: `days` of closed history at roughly `per_day`
+    stays a day, `parked` vehicles currently inside and `passes` passes
+    with expiry dates spread a year either side of today.
+    """
+    rng = rng or random.Random(0)
+    now = timezone.now()
+
+    Owner.objects.bulk_create([Owner(name=f"Owner {i:06d}") for i in range(owners)], batch_size=batch_size)
+    owner_ids = list(Owner.objects.values_list('id', flat=True))
+    Vehicle.objects.bulk_create(
+        [Vehicle(vehicle_number=plate(i), owner_id=rng.choice(owner_ids),
+                 vehicle_type=rng.choices(VEHICLE_TYPES, weights=[6, 3, 1])[0])
+         for i in range(vehicles)],
+        batch_size=batch_size,
+    )
+    fleet = list(Vehicle.objects.values_list('id', 'vehicle_type'))
+
+    pass_objs = []
+    for vehicle_id, _ in rng.sample(fleet, min(passes, len(fleet))):
+        pass_objs.append(ParkingPass(vehicle_id=vehicle_id, pass_type=rng.choice(list(PASS_DURATIONS)),
+                                     expiry_date=now + timedelta(days=rng.uniform(-365, 365))))
+    ParkingPass.objects.bulk_create(pass_objs, batch_size=batch_size)
+    # issue_date is auto_now_add, so back-date it from the expiry afterwards
+    for pass_type, duration in PASS_DURATIONS.items():
+        ParkingPass.objects.filter(pass_type=pass_type).update(issue_date=F('expiry_date') - duration)
+
+    history = 0
+    start = now - timedelta(days=days)
+    stays = []
+    for day in range(days):
+        for _ in range(max(0, int(rng.gauss(per_day, per_day / 5)))):
+            vehicle_id, vehicle_type = rng.choice(fleet)
+            entry = start + timedelta(days=day, seconds=rng.uniform(6 * 3600, 22 * 3600))
+            exit_time = min(entry + timedelta(minutes=rng.lognormvariate(4.5, 0.8)), now - timedelta(minutes=1))
+            stays.append((vehicle_id, vehicle_type, entry, exit_time))
+        if len(stays) >= batch_size or day == days - 1:
+            history += _insert_stays(stays, batch_size)
+            stays = []
+
+    ParkingTransaction.objects.bulk_create(
+        [ParkingTransaction(vehicle_id=vehicle_id, entry_time=now - timedelta(minutes=rng.uniform(5, 600)))
+         for vehicle_id, _ in rng.sample(fleet, min(parked, len(fleet)))],
+        batch_size=batch_size,
+    )
+
+    ledger.rebuild()
+    if days:
+        rebuild_rollups(timezone.localdate(start), timezone.localdate(now))
+    return {'owners': owners, 'vehicles': len(fleet), 'passes': len(pass_objs),
+            'transactions': history, 'parked': min(parked, len(fleet))}
+
+
+def _insert_stays(stays, batch_size):
+    if not stays:
+        return 0
+    fees = compute_fees([s[2] for s in stays], [s[3] for s in stays], [s[1] for s in stays]).tolist()
+    ParkingTransaction.objects.bulk_create(
+        [ParkingTransaction(vehicle_id=vehicle_id, entry_time=entry, exit_time=exit_time,
+                            fees_paid=fee, status="Exited")
+         for (vehicle_id, _, entry, exit_time), fee in zip(stays, fees)],
+        batch_size=batch_size,
+    )
+    return len(stays)
+
+
+# ======================================================
+# ========== REPLAY ====================================
+# ======================================================
+class Replay:
+    """
+    Generates the next request for each operation from the current parking
+    state. Concurrent workers each replay a disjoint share of the plates.
+    """
+
+    def __init__(self, rng, worker=0, workers=1):
+        self.rng = rng
+        parked = set(
+            ParkingTransaction.objects.filter(exit_time__isnull=True).values_list('vehicle__vehicle_number', flat=True)
+        )
+        numbers = Vehicle.objects.order_by('id').values_list('vehicle_number', flat=True)
+        mine = [number for i, number in enumerate(numbers) if i % workers == worker]
+        self.parked = [number for number in mine if number in parked]
+        self.outside = [number for number in mine if number not in parked]
+        self.next_plate = (worker + 1) * 10_000_000 + len(numbers)
+
+    def new_plate(self):
+        self.next_plate += 1
+        return plate(self.next_plate)
+
+    def entry(self):
+        if self.outside and self.rng.random() < 0.8:
+            number = self.outside.pop(self.rng.randrange(len(self.outside)))
+        else:
+            number = self.new_plate()
+        self.parked.append(number)
+        return 'post', '/api/entry-exit/', {'vehicle_number': number,
+                                            'vehicle_type': self.rng.choices(VEHICLE_TYPES, weights=[6, 3, 1])[0]}
+
+    def exit(self):
+        if not self.parked:
+            return None
+        number = self.parked.pop(self.rng.randrange(len(self.parked)))
+        self.outside.append(number)
+        return 'post', '/api/entry-exit/', {'vehicle_number': number}
+
+    def create_pass(self):
+        return 'post', '/api/create-pass/', {
+            'owner_name': f"Owner {self.rng.randrange(10 ** 6):06d}",
+            'vehicle_number': self.new_plate(),
+            'vehicle_type': self.rng.choice(VEHICLE_TYPES),
+            'pass_type': self.rng.choice(list(PASS_DURATIONS)),
+        }
+
+    def dashboard(self):
+        return 'get', '/api/dashboard-stats/', None
+
+    def slots(self):
+        return 'get', '/api/available-slots/', None
+
+    def transactions(self):
+        return 'get', '/api/transactions/', None
+
+    def reports(self):
+        return 'get', '/api/reports/revenue/', {'period': self.rng.choice(['day', 'week', 'month'])}
+
+
+def run(user, requests=1000, mix=None, rng=None, workers=1):
+    """
+    Replay `requests` API calls drawn from `mix` (operation -> weight) as
+    `user`, split over `workers` threads with a database connection each.
+    Returns one sample dict per request.
+    """
+    mix = mix or DEFAULT_MIX
+    rng = rng or random.Random(0)
+    if workers == 1:
+        return _replay(user, requests, mix, Replay(rng))
+
+    # Partition the plates up front, before the workers start changing them
+    replays = [Replay(random.Random(rng.random()), worker, workers) for worker in range(workers)]
+    start = threading.Barrier(workers)
+
+    def worker(i):
+        try:
+            start.wait()
+            return _replay(user, requests // workers + (i < requests % workers), mix, replays[i])
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(workers) as pool:
+        return [sample for samples in pool.map(worker, range(workers)) for sample in samples]
+
+
+def _replay(user, requests, mix, replay):
+    rng = replay.rng
+    client = APIClient()
+    client.force_authenticate(user)
+    operations, weights = zip(*mix.items())
+
+    samples = []
+    for _ in range(requests):
+        operation = rng.choices(operations, weights=weights)[0]
+        call = getattr(replay, operation)()
+        if call is None:
+            operation, call = 'entry', replay.entry()
+        method, path, payload = call
+
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            if method == 'post':
+                response = client.post(path, payload, format='json')
+            else:
+                response = client.get(path, payload)
+            elapsed = time.perf_counter() - started
+        samples.append({'operation': operation, 'method': method, 'seconds': elapsed,
+                        'queries': len(ctx.captured_queries), 'status': response.status_code})
+    return samples
+
+
+# ======================================================
+# ========== GATE CONCURRENCY ==========================
+# ======================================================
+SYNC_GATE_PATH = '/api/entry-exit/'
+ASYNC_GATE_PATH = '/api/entry-exit/async/'
+
+
+def gate_phases(prefix, vehicles, copies=1, rng=None):
+    """
+    An entry phase then an exit phase for `vehicles` new plates. Each event
+    is read `copies` times back to back, as a camera re-reading a plate does.
+    """
+    rng = rng or random.Random(0)
+    numbers = [f"{prefix}{i:06d}" for i in range(vehicles)]
+    types = {number: rng.choices(VEHICLE_TYPES, weights=[6, 3, 1])[0] for number in numbers}
+    return [
+        ('entry', [{'vehicle_number': n, 'vehicle_type': types[n]} for n in numbers for _ in range(copies)]),
+        ('exit', [{'vehicle_number': n} for n in numbers for _ in range(copies)]),
+    ]
+
+
+def run_gate_sync(token, phases, concurrency):
+    """POST every phase to the sync VehicleEntryExitView from `concurrency` threads."""
+    local = threading.local()
+
+    def post(operation, payload):
+        if not hasattr(local, 'client'):
+            local.client = APIClient()
+            local.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        started = time.perf_counter()
+        response = local.client.post(SYNC_GATE_PATH, payload, format='json')
+        return {'operation': operation, 'method': 'post', 'seconds': time.perf_counter() - started,
+                'status': response.status_code, 'coalesced': False}
+
+    samples = []
+    with ThreadPoolExecutor(concurrency) as pool:
+        for operation, payloads in phases:
+            samples += pool.map(lambda payload: post(operation, payload), payloads)
+        # One call per thread, so each closes its own connection
+        barrier = threading.Barrier(concurrency)
+        list(pool.map(lambda _: (barrier.wait(), connection.close()), range(concurrency)))
+    return samples
+
+
+def run_gate_async(token, phases, concurrency):
+    """
+    POST every phase to the async gate view through Django's ASGI handler,
+    with `concurrency` requests in flight.
+    """
+    app = ASGIHandler()
+    headers = [(b'authorization', f'Token {token}'.encode()), (b'content-type', b'application/json')]
+
+    async def post(limit, operation, payload):
+        async with limit:
+            started = time.perf_counter()
+            status, body = await _asgi_post(app, ASYNC_GATE_PATH, json.dumps(payload).encode(), headers)
+            elapsed = time.perf_counter() - started
+        return {'operation': operation, 'method': 'post', 'seconds': elapsed, 'status': status,
+                'coalesced': json.loads(body).get('coalesced', False)}
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+        samples = []
+        for operation, payloads in phases:
+            samples += await asyncio.gather(*(post(limit, operation, payload) for payload in payloads))
+        close_async_gate()
+        return samples
+
+    # Outside the gate pool, requests run their sync parts on short-lived threads, so their
+    # connections must close with each request (as Django recommends under ASGI)
+    max_age = connection.settings_dict['CONN_MAX_AGE']
+    connection.settings_dict['CONN_MAX_AGE'] = 0
+    try:
+        return asyncio.run(main())
+    finally:
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+
+async def _asgi_post(app, path, body, headers):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [*headers, (b'content-length', str(len(body)).encode())],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    request = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {'status': None, 'body': b''}
+
+    async def receive():
+        if request:
+            return request.pop()
+        await asyncio.Event().wait()  # the client never disconnects
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+
+    await app(scope, receive, send)
+    return response['status'], response['body']
+
+
+# ======================================================
+# ========== SERIALIZATION =============================
+# ======================================================
+def listing_views():
+    from .views import AllPassesView, AllTransactionsView, OwnersListView, VehiclesListView
+    return {'owners': OwnersListView, 'vehicles': VehiclesListView,
+            'passes': AllPassesView, 'transactions': AllTransactionsView}
+
+
+def _best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def time_listings(repeat=3):
+    """
+    For each list view, the best of `repeat` timings for querying and
+    serializing its whole table through `serializer_class` (model instances)
+    and through `values_serializer_class` (values() rows).
+    """
+    renderer = JSONRenderer()
+    results = {}
+    for name, view_class in listing_views().items():
+        queryset = view_class().get_queryset()
+        values_serializer = view_class.values_serializer_class()
+        model_seconds, model_data = _best_of(
+            repeat, lambda: view_class.serializer_class(queryset.all(), many=True).data)
+        values_seconds, values_data = _best_of(
+            repeat, lambda: values_serializer.many(queryset.values(*values_serializer.columns)))
+        results[name] = {
+            'rows': len(values_data),
+            'model_ms': round(model_seconds * 1000, 1),
+            'values_ms': round(values_seconds * 1000, 1),
+            'speedup': round(model_seconds / values_seconds, 2) if values_seconds else None,
+            'identical': renderer.render(model_data) == renderer.render(values_data),
+        }
+    return results
+
+
+# ======================================================
+# ========== PLATE SEARCH ==============================
+# ======================================================
+LOOK_ALIKES = {'0': 'ODQ', '1': 'IL', '8': 'B', '5': 'S', '2': 'Z', '6': 'G'}
+STATE_CODES = ['KA', 'MH', 'TN', 'DL', 'KL', 'AP', 'TS', 'GJ', 'UP', 'RJ']
+
+
+def camera_plate(rng):
+    return (f"{rng.choice(STATE_CODES)}{rng.randint(1, 99):02d}"
+            f"{''.join(rng.choices('ABCDEFGHJKMNPRTUVWXY', k=2))}{rng.randint(0, 9999):04d}")
+
+
+def misread(plate, rng):
+    """`plate` as a camera might misread it: a look-alike character, or one dropped, extra, wrong or swapped."""
+    i = rng.randrange(len(plate))
+    kind = rng.choice(['look-alike', 'substitution', 'insertion', 'deletion', 'swap'])
+    digits = [j for j, c in enumerate(plate) if c in LOOK_ALIKES]
+    if kind == 'look-alike' and digits:
+        j = rng.choice(digits)
+        return plate[:j] + rng.choice(LOOK_ALIKES[plate[j]]) + plate[j + 1:]
+    other = rng.choice('ABCDEFGHJKMNPRTUVWXY0123456789')
+    if kind == 'insertion':
+        return plate[:i] + other + plate[i:]
+    if kind == 'deletion':
+        return plate[:i] + plate[i + 1:]
+    if kind == 'swap' and i < len(plate) - 1:
+        return plate[:i] + plate[i + 1] + plate[i] + plate[i + 2:]
+    return plate[:i] + other + plate[i + 1:]
+
+
+def time_plate_search(vehicles=1_000_000, queries=10000, scans=20, rng=None):
+    """
+    Builds a PlateIndex over `vehicles` synthetic plates and times searching
+    it for misreads of registered plates, against a linear scan of the plates
+    on `scans` of the same queries. `found` is the share of queries whose
+    plate came back.
+    """
+    from .plate_search import PlateIndex, canonical, within_one_edit
+    rng = rng or random.Random(0)
+    plates = list({camera_plate(rng) for _ in range(vehicles)})
+    started = time.perf_counter()
+    index = PlateIndex()
+    index.add_many(plates)
+    build_seconds = time.perf_counter() - started
+
+    reads = [(plate, misread(plate, rng)) for plate in rng.choices(plates, k=queries)]
+    timings, found = [], 0
+    for plate, read in reads:
+        started = time.perf_counter()
+        matches = index.search(read)
+        timings.append(time.perf_counter() - started)
+        found += any(match.vehicle_number == plate for match in matches)
+
+    forms = [canonical(plate) for plate in plates]
+    scan_seconds, _ = _best_of(1, lambda: [
+        [form for form in forms if within_one_edit(canonical(read), form)] for _, read in reads[:scans]
+    ])
+    micros = np.array(timings) * 1e6
+    return {
+        'plates': len(plates),
+        'build_s': round(build_seconds, 2),
+        'p50_us': round(float(np.percentile(micros, 50)), 1),
+        'p99_us': round(float(np.percentile(micros, 99)), 1),
+        'max_us': round(float(micros.max()), 1),
+        'scan_ms': round(scan_seconds / max(1, min(scans, len(reads))) * 1000, 1),
+        'found': round(found / len(reads), 4) if reads else None,
+    }
+
+
+# ======================================================
+# ========== THROWAWAY DATABASE ========================
+# ======================================================
+def reset_process_state():
+    """Per-process caches must not carry ids across throwaway databases."""
+    ledger.reset()
+    allocator.reset()
+    plate_cache.clear()
+    reset_guest_owner()
+    reset_facilities()
+    reset_plate_index()
+
+
+@contextmanager
+def throwaway_database():
+    """Run the block against a fresh test database for the default alias, destroyed afterwards."""
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        reset_process_state()
+        cache.clear()
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        reset_process_state()
+
+
+# ======================================================
+# ========== REPORTING =================================
+# ======================================================
+def _stats(samples):
+    seconds = np.array([s['seconds'] for s in samples])
+    p50, p95, p99 = np.percentile(seconds * 1000, [50, 95, 99])
+    stats = {
+        'requests': len(samples),
+        'errors': sum(1 for s in samples if s['status'] >= 400),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(seconds.mean() * 1000), 3),
+    }
+    # Queries are only counted where all of a request's queries run on the sampling thread
+    if 'queries' in samples[0]:
+        queries = np.array([s['queries'] for s in samples])
+        stats.update(queries_mean=round(float(queries.mean()), 2), queries_max=int(queries.max()))
+    stats['throughput_rps'] = round(len(samples) / float(seconds.sum()), 1) if seconds.sum() else None
+    return stats
+
+
+def summarise(samples, wall_seconds=None):
+    """Per-operation and overall statistics for the samples from run()."""
+    by_operation = defaultdict(list)
+    for sample in samples:
+        by_operation[sample['operation']].append(sample)
+    by_method = defaultdict(list)
+    for sample in samples:
+        by_method['reads' if sample.get('method') == 'get' else 'writes'].append(sample)
+    summary = {
+        'endpoints': {operation: _stats(group) for operation, group in sorted(by_operation.items())},
+        'overall': _stats(samples) if samples else {},
+        **{kind: _stats(group) for kind, group in by_method.items()},
+    }
+    if wall_seconds:
+        summary['overall']['wall_seconds'] = round(wall_seconds, 3)
+        for kind, group in [('overall', samples), *by_method.items()]:
+            summary[kind]['wall_throughput_rps'] = round(len(group) / wall_seconds, 1)
+    return summary
+
+
+def compare(current, baseline, threshold=0.2):
+    """
+    Regressions of `current` against a `baseline` summary: p95 latency more
+    than `threshold` (a fraction) slower, or more queries per request.
+    """
+    regressions = []
+    for operation, stats in current['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(operation)
+        if not before:
+            continue
+        if stats['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append(f"{operation}: p95 {before['p95_ms']:.2f}ms -> {stats['p95_ms']:.2f}ms")
+        if 'queries_max' in before and stats.get('queries_max', 0) > before['queries_max']:
+            regressions.append(f"{operation}: max queries {before['queries_max']} -> {stats['queries_max']}")
+    return regressions
+
+
+@contextmanager
+def use_sqlite_profile(name):
+    """Open the default database's connections with one of settings.SQLITE_PROFILES inside this block."""
+    pragmas = settings.SQLITE_PROFILES[name]
+    # A copy: the OPTIONS dict is shared with the other SQLite aliases
+    options = connection.settings_dict['OPTIONS']
+    connection.close()
+    connection.settings_dict['OPTIONS'] = {
+        **options, 'init_command': ';'.join(f'PRAGMA {pragma}={value}' for pragma, value in pragmas.items()),
+    }
+    try:
+        yield
+    finally:
+        connection.close()
+        connection.settings_dict['OPTIONS'] = options
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .facilities import facility_alias
+from .models import ParkingPass, Notification
+
+EXPIRY_MESSAGE = "Your parking pass for vehicle {vehicle_number} expired on {expiry:%Y-%m-%d %H:%M}."
+REMINDER_MESSAGE = "Reminder: Your parking pass for vehicle {vehicle_number} will expire on {expiry:%Y-%m-%d %H:%M}."
+
+
+def _without_notification(passes, notification_type):
+    already_sent = Notification.objects.filter(pass_notified=OuterRef('pk'), notification_type=notification_type)
+    return passes.filter(~Exists(already_sent))
+
+
+def notify_passes(rows, notification_type):
+    """
+    Insert one notification per (pass_id, owner_id, vehicle_number, expiry_date)
+    row. The unique (pass, type) constraint makes repeats and races no-ops.
+    Returns how many were actually inserted.
+    """
+    if not rows:
+        return 0
+    template = EXPIRY_MESSAGE if notification_type == 'pass_expiry' else REMINDER_MESSAGE
+    # ignore_conflicts gives no insert count, so count the passes' notifications around the insert
+    existing = Notification.objects.filter(
+        pass_notified_id__in=[row[0] for row in rows], notification_type=notification_type
+    )
+    with transaction.atomic(using=facility_alias()):
+        before = existing.count()
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    recipient_id=owner_id,
+                    pass_notified_id=pass_id,
+                    message=template.format(vehicle_number=vehicle_number, expiry=expiry),
+                    notification_type=notification_type,
+                )
+                for pass_id, owner_id, vehicle_number, expiry in rows
+            ],
+            ignore_conflicts=True,
+        )
+        return existing.count() - before
+
+
+def pending_rows(passes, notification_type):
+    """notify_passes() rows for the passes in `passes` that lack this notification."""
+    return (
+        _without_notification(passes, notification_type)
+        .order_by('id')
+        .values_list('id', 'vehicle__owner_id', 'vehicle__vehicle_number', 'expiry_date')
+    )
+
+
+def _sweep(passes, notification_type, chunk_size):
+    """Notify every pass in `passes` that lacks this notification, in keyset chunks by id."""
+    pending = pending_rows(passes, notification_type)
+    created = 0
+    last_id = 0
+    while True:
+        rows = list(pending.filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            return created
+        last_id = rows[-1][0]
+        created += notify_passes(rows, notification_type)
+
+
+def sweep_expired(now, chunk_size=5000):
+    return _sweep(ParkingPass.objects.filter(expiry_date__lte=now), 'pass_expiry', chunk_size)
+
+
+def sweep_reminders(now, days=3, chunk_size=5000):
+    upcoming = ParkingPass.objects.filter(expiry_date__gt=now, expiry_date__lte=now + timedelta(days=days))
+    return _sweep(upcoming, 'pass_reminder', chunk_size)
+
+
+def retire_reminders(now, pass_ids=None):
+    """Mark unread reminders for passes that have since expired (of `pass_ids`, if given) as read."""
+    reminders = Notification.objects.filter(
+        notification_type='pass_reminder', is_read=False, pass_notified__expiry_date__lte=now,
+    )
+    if pass_ids is not None:
+        reminders = reminders.filter(pass_notified_id__in=pass_ids)
+    return reminders.update(is_read=True)
@@ -0,0 +1,286 @@
+"""
+In-process scheduler for pass expiry and reminder notifications.
+
+check_expiry scans the pass table each time cron runs it, so a notification
+is only as punctual as the crontab. This scheduler keeps the upcoming events
+in a heap instead and sends each one when it falls due: the expiry notice at
+the pass's expiry_date, and the reminder EXPIRY_REMINDER_DAYS before it.
+
+Only the passes expiring within EXPIRY_REMINDER_DAYS plus
+EXPIRY_SCHEDULER_HORIZON seconds are held. When half the horizon has gone by,
+the next slice is loaded with one range query on expiry_date. New passes
+saved through the ORM in this process, such as those from CreatePassView, are
+scheduled when they commit (see apps.ready). Passes created by other
+processes are picked up every EXPIRY_SCHEDULER_POLL seconds by loading the
+ids past the highest seen. A due event reads its passes again by id, so a
+pass that was deleted or extended meanwhile is skipped. A pass whose expiry
+was brought forward by another process is caught at the next restart.
+
+On start, recover() runs the check_expiry sweeps once, for whatever fell due
+while no scheduler was running, and loads the heap from the database. The
+unique (pass, type) constraint makes a notification sent twice a no-op, so
+check_expiry can still run alongside as a safety net.
+
+Each database (default and every alias in FACILITY_DATABASES) is loaded and
+notified inside the scope of a facility stored there.
+"""
+import heapq
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .expiry import notify_passes, pending_rows, retire_reminders, sweep_expired, sweep_reminders
+from .facilities import database_facilities, facility_alias, facility_scope
+from .models import ParkingPass
+
+logger = logging.getLogger(__name__)
+
+EXPIRY = 'pass_expiry'
+REMINDER = 'pass_reminder'
+
+
+class ExpiryScheduler:
+    def __init__(self, reminder_days=3, horizon=3600, poll=60, chunk_size=500):
+        self.reminder_days = reminder_days
+        self.horizon = timedelta(seconds=horizon)
+        self.poll = poll
+        self.chunk_size = chunk_size
+
+        self._lock = threading.Lock()   # the heap and the load marks
+        self._wakeup = threading.Event()
+        self._heap = []                 # (due, kind, alias, pass_id)
+        self._queued = set()            # the heap's entries, so that a pass seen twice is queued once
+        self._scopes = {}               # alias -> FacilityInfo
+        self._loaded_until = {}         # alias -> every pass expiring by then is in the heap
+        self._max_id = {}               # alias -> highest pass id seen
+        self._polled_at = 0.0
+        self._thread = None
+        self._stopping = False
+
+        self.sent = {EXPIRY: 0, REMINDER: 0}
+        self.last_error = None
+
+    # ---------- scheduling ----------
+    def _push(self, due, kind, alias, pass_id):
+        entry = (due, kind, alias, pass_id)
+        if entry not in self._queued:
+            self._queued.add(entry)
+            heapq.heappush(self._heap, entry)
+
+    def schedule(self, pass_id, expiry_date, alias='default', now=None):
+        """Queue the reminder and expiry events of one pass, if it expires within the loaded window."""
+        now = now or timezone.now()
+        with self._lock:
+            loaded_until = self._loaded_until.get(alias)
+            if expiry_date is None or loaded_until is None or expiry_date > loaded_until:
+                # Not loaded yet; the window picks it up when it gets there
+                return False
+            self._push(max(expiry_date - timedelta(days=self.reminder_days), now), REMINDER, alias, pass_id)
+            self._push(expiry_date, EXPIRY, alias, pass_id)
+        self._wakeup.set()
+        return True
+
+    def next_due(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def __len__(self):
+        return len(self._heap)
+
+    # ---------- loading ----------
+    def recover(self, now=None):
+        """Catch up on everything already due and rebuild the heap from the database."""
+        now = now or timezone.now()
+        with self._lock:
+            self._heap.clear()
+            self._queued.clear()
+            self._loaded_until.clear()
+            self._max_id.clear()
+            self._scopes = database_facilities()
+        for alias, facility in self._scopes.items():
+            with facility_scope(facility):
+                expired = sweep_expired(now, self.chunk_size)
+                reminded = sweep_reminders(now, self.reminder_days, self.chunk_size)
+                retire_reminders(now)
+                max_id = ParkingPass.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            self.sent[EXPIRY] += expired
+            self.sent[REMINDER] += reminded
+            with self._lock:
+                self._loaded_until[alias] = now
+                self._max_id[alias] = max_id
+            self._extend(alias, now)
+        self._polled_at = time.monotonic()
+
+    def _extend(self, alias, now):
+        """Load the passes expiring after the loaded window, up to the reminder lead plus the horizon."""
+        start = self._loaded_until[alias]
+        until = now + timedelta(days=self.reminder_days) + self.horizon
+        with facility_scope(self._scopes[alias]):
+            rows = list(
+                ParkingPass.objects.filter(expiry_date__gt=start, expiry_date__lte=until)
+                .values_list('id', 'expiry_date')
+            )
+        with self._lock:
+            self._loaded_until[alias] = until
+        for pass_id, expiry_date in rows:
+            self.schedule(pass_id, expiry_date, alias, now)
+        return len(rows)
+
+    def _poll(self, alias, now):
+        """Schedule the passes created by other processes since the last poll."""
+        with facility_scope(self._scopes[alias]):
+            rows = list(
+                ParkingPass.objects.filter(id__gt=self._max_id[alias]).order_by('id')
+                .values_list('id', 'expiry_date')
+            )
+        for pass_id, expiry_date in rows:
+            self.schedule(pass_id, expiry_date, alias, now)
+        if rows:
+            self._max_id[alias] = rows[-1][0]
+
+    # ---------- firing ----------
+    def _pop_due(self, now):
+        due = {}
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                self._queued.discard(entry)
+                _, kind, alias, pass_id = entry
+                due.setdefault((alias, kind), []).append(pass_id)
+        return due
+
+    def _send(self, alias, kind, pass_ids, now):
+        passes = ParkingPass.objects.filter(id__in=pass_ids)
+        if kind == EXPIRY:
+            passes = passes.filter(expiry_date__lte=now)
+        else:
+            passes = passes.filter(expiry_date__gt=now, expiry_date__lte=now + timedelta(days=self.reminder_days))
+        with facility_scope(self._scopes[alias]), transaction.atomic(using=facility_alias()):
+            sent = notify_passes(list(pending_rows(passes, kind)), kind)
+            if kind == EXPIRY:
+                retire_reminders(now, pass_ids)
+        self.sent[kind] += sent
+        return sent
+
+    def tick(self, now=None):
+        """Send every due event, and load or poll if it is time; returns how many notifications were sent."""
+        now = now or timezone.now()
+        for alias in self._scopes:
+            if now + timedelta(days=self.reminder_days) + self.horizon / 2 >= self._loaded_until[alias]:
+                self._extend(alias, now)
+        if time.monotonic() - self._polled_at >= self.poll:
+            for alias in self._scopes:
+                self._poll(alias, now)
+            self._polled_at = time.monotonic()
+        sent = 0
+        for (alias, kind), pass_ids in self._pop_due(now).items():
+            for i in range(0, len(pass_ids), self.chunk_size):
+                sent += self._send(alias, kind, pass_ids[i:i + self.chunk_size], now)
+        return sent
+
+    # ---------- lifecycle ----------
+    def start(self):
+        """Recover and start the background worker; idempotent."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self.run, name='expiry-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+        self._wakeup.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        """Recover, then send events as they fall due until stop()."""
+        backoff = 0.5
+        try:
+            self.recover()
+            while not self._stopping:
+                # A long-lived thread: recycle a broken connection the way request_finished would
+                close_old_connections()
+                try:
+                    self.tick()
+                    self.last_error = None
+                    backoff = 0.5
+                except Exception as exc:
+                    logger.exception("Sending pass notifications failed; retrying in %.1fs", backoff)
+                    self.last_error = str(exc)
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+                    continue
+                next_due = self.next_due()
+                wait = self.poll if next_due is None else (next_due - timezone.now()).total_seconds()
+                self._wakeup.wait(min(max(wait, 0), self.poll))
+                self._wakeup.clear()
+        finally:
+            for alias in settings.FACILITY_DATABASES.values():
+                connections[alias].close()
+            connection.close()
+
+    # ---------- monitoring ----------
+    def status(self):
+        next_due = self.next_due()
+        return {
+            'scheduled': len(self),
+            'next_due': next_due.isoformat() if next_due else None,
+            'loaded_until': {alias: until.isoformat() for alias, until in self._loaded_until.items()},
+            'expiry_sent': self.sent[EXPIRY],
+            'reminders_sent': self.sent[REMINDER],
+            'worker_running': self.running,
+            'last_error': self.last_error,
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def expiry_scheduler():
+    """This process's scheduler, created on first use; run_expiry_scheduler starts it."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ExpiryScheduler(
+                reminder_days=getattr(settings, 'EXPIRY_REMINDER_DAYS', 3),
+                horizon=getattr(settings, 'EXPIRY_SCHEDULER_HORIZON', 3600),
+                poll=getattr(settings, 'EXPIRY_SCHEDULER_POLL', 60),
+            )
+        return _scheduler
+
+
+def reset_expiry_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.stop()
+
+
+# ======================================================
+# ========== NEW PASSES ================================
+# ======================================================
+def _pass_saved(sender, instance, **kwargs):
+    scheduler = _scheduler
+    if scheduler is not None:
+        alias = facility_alias()
+        transaction.on_commit(lambda: scheduler.schedule(instance.pk, instance.expiry_date, alias), using=alias)
+
+
+def connect_signals():
+    post_save.connect(_pass_saved, sender=ParkingPass, dispatch_uid='expiry_scheduler.pass_saved')
@@ -0,0 +1,74 @@
+import csv
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .facilities import current_facility, facility_alias
+from .models import ParkingTransaction
+from .stats import start_of_day
+
+EXPORT_COLUMNS = [
+    ("id", "id"),
+    ("vehicle_number", "vehicle__vehicle_number"),
+    ("vehicle_type", "vehicle__vehicle_type"),
+    ("owner_name", "vehicle__owner__name"),
+    ("entry_time", "entry_time"),
+    ("exit_time", "exit_time"),
+    ("fees_paid", "fees_paid"),
+    ("status", "status"),
+]
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(start=None, end=None, vehicle_type=None, chunk_size=None):
+    """
+    The current facility's transaction history as flat tuples, oldest first,
+    read with a server-side iterator so memory stays constant regardless of
+    history size.
+
+    `start` and `end` are inclusive local dates on entry_time.
+    """
+    # Bound now: a streamed response is read after the request has left the facility's scope
+    rows = (
+        ParkingTransaction.objects.using(facility_alias())
+        .filter(facility_id=current_facility().id).order_by("entry_time", "id")
+    )
+    if start:
+        rows = rows.filter(entry_time__gte=start_of_day(start))
+    if end:
+        rows = rows.filter(entry_time__lt=start_of_day(end + timedelta(days=1)))
+    if vehicle_type:
+        rows = rows.filter(vehicle__vehicle_type=vehicle_type)
+
+    chunk_size = chunk_size or getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+    return rows.values_list(*[source for _, source in EXPORT_COLUMNS]).iterator(chunk_size=chunk_size)
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([value.isoformat() if hasattr(value, "isoformat") else value for value in row])
+
+
+def iter_ndjson(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def iter_export(output, rows):
+    return iter_csv(rows) if output == "csv" else iter_ndjson(rows)
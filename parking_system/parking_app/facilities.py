@@ -0,0 +1,175 @@
+"""
+Facilities (parking lots), and which one the current request is for.
+
+Transactions, passes, bays and the report rollups each belong to one
+Facility. Owners and vehicles are shared, so a regular can park at every
+lot, though a vehicle can be inside only one lot at a time.
+
+FacilityMiddleware reads a facility code from the `X-Facility` header or
+the `?facility=` parameter, falling back to DEFAULT_FACILITY. It keeps the
+facility in a context variable for the rest of the request. Views filter on
+it, and new rows default to it. The occupancy ledger, the bay allocator,
+the cached stats, the plate cache and the live stream keep their state per
+facility. Code outside a request, such as commands and the journal worker,
+serves the default facility unless it enters facility_scope().
+
+A facility listed in FACILITY_DATABASES has a database alias of its own.
+The router sends the parking_app queries made for that facility there (see
+routers.py), so its tables never grow with another lot's traffic. Such a
+facility keeps its own owners and vehicles. The facility rows themselves are
+read from 'default'. create_facility copies a routed facility's row to its
+own database so that the foreign keys hold.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+
+from .models import Facility
+
+FACILITY_HEADER = 'X-Facility'
+FACILITY_PARAM = 'facility'
+
+
+class FacilityInfo(NamedTuple):
+    id: int
+    code: str
+    name: str
+
+    @property
+    def database(self) -> Optional[str]:
+        return settings.FACILITY_DATABASES.get(self.code)
+
+
+_current = ContextVar('facility', default=None)
+_lock = threading.Lock()
+_by_code = {}
+
+
+def _load(code):
+    row = Facility.objects.using('default').filter(code=code).values_list('id', 'code', 'name').first()
+    return FacilityInfo(*row) if row else None
+
+
+def get_facility(code):
+    """The facility with this code, or None; looked up once per process."""
+    info = _by_code.get(code)
+    if info is None:
+        info = _load(code)
+        if info is not None:
+            with _lock:
+                _by_code[code] = info
+    return info
+
+
+def default_facility():
+    """The DEFAULT_FACILITY, created on first use if missing."""
+    code = settings.DEFAULT_FACILITY
+    info = get_facility(code)
+    if info is None:
+        facility, _ = Facility.objects.using('default').get_or_create(code=code, defaults={'name': code.title()})
+        info = FacilityInfo(facility.id, facility.code, facility.name)
+        # Remember it only once committed, so a rolled-back insert is never reused
+        transaction.on_commit(lambda: _by_code.setdefault(code, info), using='default')
+    return info
+
+
+def facility_or_default(code=None):
+    """The facility with this code, or DEFAULT_FACILITY for no code; None if the code is unknown."""
+    return get_facility(code) if code else default_facility()
+
+
+def current_facility():
+    return _current.get() or default_facility()
+
+
+def current_facility_code():
+    """The current facility's code, without a query; the router needs it on every query."""
+    info = _current.get()
+    return info.code if info else settings.DEFAULT_FACILITY
+
+
+def facility_database():
+    """The database alias of the current facility, or None if it lives in 'default'."""
+    return settings.FACILITY_DATABASES.get(current_facility_code())
+
+
+def facility_alias():
+    """The alias the current facility's rows are written to; pass it to atomic() and on_commit()."""
+    return facility_database() or 'default'
+
+
+@contextmanager
+def facility_scope(facility):
+    """Serve `facility` (a FacilityInfo) inside this block."""
+    token = _current.set(facility)
+    try:
+        yield facility
+    finally:
+        _current.reset(token)
+
+
+def facilities():
+    """Every facility, by code."""
+    return {code: FacilityInfo(pk, code, name)
+            for pk, code, name in Facility.objects.using('default').values_list('id', 'code', 'name')}
+
+
+def database_facilities():
+    """One facility per database alias (default and each FACILITY_DATABASES alias), to scope work on that database."""
+    scopes = {'default': default_facility()}
+    for code, alias in settings.FACILITY_DATABASES.items():
+        info = get_facility(code)
+        if info is not None:
+            scopes.setdefault(alias, info)
+    return scopes
+
+
+def reset_facilities():
+    with _lock:
+        _by_code.clear()
+
+
+# ======================================================
+# ========== MIDDLEWARE ================================
+# ======================================================
+class FacilityMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _code(request):
+        return request.headers.get(FACILITY_HEADER) or request.GET.get(FACILITY_PARAM)
+
+    @staticmethod
+    def _unknown(code):
+        return JsonResponse({'detail': f'Unknown facility "{code}".'}, status=404)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        code = self._code(request)
+        facility = facility_or_default(code)
+        if facility is None:
+            return self._unknown(code)
+        with facility_scope(facility):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        code = self._code(request)
+        facility = _by_code.get(code or settings.DEFAULT_FACILITY) or await sync_to_async(facility_or_default)(code)
+        if facility is None:
+            return self._unknown(code)
+        with facility_scope(facility):
+            return await self.get_response(request)
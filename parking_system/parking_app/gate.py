@@ -0,0 +1,362 @@
+import asyncio
+import threading
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import plates
+from .facilities import current_facility, current_facility_code, facility_alias
+from .live import publish_gate_event
+from .models import Vehicle, ParkingPass, ParkingTransaction
+from .occupancy import ledger
+from .owners import guest_owner_id
+from .rollups import record_exit, record_exits
+from .slots import ParkingFull, allocator
+from .stats import invalidate_dashboard_stats
+from .tariffs import calculate_fee, compute_fees
+
+# Times a batch is replayed after losing a race with another gate worker
+BATCH_ATTEMPTS = 3
+
+
+# ======================================================
+# ========== SINGLE GATE EVENTS ========================
+# ======================================================
+def enter_vehicle(vehicle_number, vehicle_type='car', guest_owner=True):
+    """
+    Open a transaction for an upper-cased plate, registering unknown plates,
+    and give it the next free bay (see slots.py).
+
+    Returns the opened transaction, or None if the vehicle is already
+    parked. The one-open-transaction constraint decides that, so two gates
+    reading the same plate at once cannot both let it in. Raises ParkingFull
+    when every bay of the vehicle's type is taken. A vehicle parked at
+    another facility counts as parked.
+    """
+    vehicle = plates.resolve(vehicle_number, vehicle_type, guest_owner)
+    while True:
+        bay = allocator.allocate(vehicle.vehicle_type)
+        try:
+            with transaction.atomic(using=facility_alias()):
+                txn = ParkingTransaction.objects.create(vehicle_id=vehicle.vehicle_id, slot_id=bay and bay.id)
+            break
+        except IntegrityError:
+            if bay is None or ParkingTransaction.objects.filter(
+                vehicle_id=vehicle.vehicle_id, exit_time__isnull=True
+            ).exists():
+                if bay is not None:
+                    allocator.release(bay.id)
+                return None
+            # Another process handed out this bay; it stays taken here, try the next one
+    ledger.record_entry(vehicle.vehicle_type)
+    invalidate_dashboard_stats()
+    publish_gate_event([(txn, vehicle_number, vehicle.vehicle_type)])
+    return txn
+
+
+def exit_vehicle(vehicle_number):
+    """
+    Close the open transaction of an upper-cased plate, charging it unless a
+    pass covers the exit.
+
+    Returns the closed transaction, or None if the vehicle is not parked at
+    the current facility. The close is a conditional UPDATE on exit_time IS NULL, so when two
+    gates exit the same vehicle at once exactly one of them succeeds.
+    """
+    vehicle = plates.lookup(vehicle_number)
+    # A vehicle has at most one open stay, so no ORDER BY: with one, SQLite walks the facility's history by id
+    txn = vehicle and next(iter(
+        ParkingTransaction.objects.filter(
+            facility_id=current_facility().id, vehicle_id=vehicle.vehicle_id, exit_time__isnull=True
+        ).only('id', 'vehicle_id', 'entry_time', 'slot')[:1]
+    ), None)
+    if not txn:
+        return None
+
+    txn.exit_time = timezone.now()
+    txn.status = "Exited"
+    txn.fees_paid = 0 if vehicle.has_pass(txn.exit_time) else calculate_fee(
+        txn.entry_time, txn.exit_time, vehicle.vehicle_type
+    )
+    with transaction.atomic(using=facility_alias()):
+        closed = ParkingTransaction.objects.filter(pk=txn.pk, exit_time__isnull=True).update(
+            exit_time=txn.exit_time, fees_paid=txn.fees_paid, status=txn.status,
+        )
+        if not closed:
+            return None
+        record_exit(vehicle.vehicle_type, txn.entry_time, txn.exit_time, txn.fees_paid)
+    ledger.record_exit(vehicle.vehicle_type)
+    allocator.release_on_commit(txn.slot_id)
+    invalidate_dashboard_stats()
+    publish_gate_event([(txn, vehicle_number, vehicle.vehicle_type)])
+    return txn
+
+
+# ======================================================
+# ========== BATCH GATE EVENTS =========================
+# ======================================================
+def apply_gate_events(events):
+    """
+    Apply a burst of entry/exit events with a handful of set-based queries.
+
+    `events` is a list of dicts with `vehicle_number`, `action` ('entry' or
+    'exit') and optional `vehicle_type` and `timestamp`. Events are applied
+    in timestamp order (ties keep their upload order) inside one database
+    transaction. Returns one result dict per event, in input order. Every
+    event is for the current facility.
+
+    Entries are given bays like single entries; one that finds its slot
+    type full fails with a ParkingFull message.
+
+    If another worker opens a transaction for one of the plates, or takes
+    one of the bays, mid-batch, the batch is rolled back and replayed
+    against the new state.
+    """
+    for attempt in range(1, BATCH_ATTEMPTS + 1):
+        try:
+            return _apply_gate_events(events)
+        except IntegrityError:
+            if attempt == BATCH_ATTEMPTS:
+                raise
+            allocator.rebuild()
+
+
+def _apply_gate_events(events):
+    allocated = []
+    try:
+        return _apply_gate_events_once(events, allocated)
+    except BaseException:
+        # Rolled back: the bays this attempt handed out are free again
+        for bay_id in allocated:
+            allocator.release(bay_id)
+        raise
+
+
+def _apply_gate_events_once(events, allocated):
+    now = timezone.now()
+    events = [
+        {**event, 'vehicle_number': event['vehicle_number'].upper(), 'timestamp': event.get('timestamp') or now}
+        for event in events
+    ]
+    order = sorted(range(len(events)), key=lambda i: (events[i]['timestamp'], i))
+    results = [None] * len(events)
+    facility_id = current_facility().id
+
+    with transaction.atomic(using=facility_alias()):
+        vehicles = _resolve_vehicles(events)
+        vehicle_ids = [vehicle.id for vehicle in vehicles.values()]
+
+        # Row locks (where supported) stop another worker closing these under us.
+        # Stays at other facilities are included: those vehicles cannot enter here.
+        open_txns = {
+            txn.vehicle_id: txn for txn in
+            ParkingTransaction.objects.select_for_update().filter(vehicle_id__in=vehicle_ids, exit_time__isnull=True)
+        }
+
+        pass_expiry = dict(
+            ParkingPass.objects.filter(facility_id=facility_id, vehicle_id__in=vehicle_ids, expiry_date__isnull=False)
+            .values('vehicle_id').annotate(latest=Max('expiry_date')).values_list('vehicle_id', 'latest')
+        )
+
+        to_create, to_update, to_charge, closed = [], [], [], []
+        entered, exited = Counter(), Counter()
+        for i in order:
+            event = events[i]
+            vehicle = vehicles.get(event['vehicle_number'])
+            result = {'index': i, 'vehicle_number': event['vehicle_number'], 'action': event['action']}
+            results[i] = result
+
+            if event['action'] == 'entry':
+                if vehicle.id in open_txns:
+                    result.update(status='error', message='Vehicle is already parked inside.')
+                    continue
+                try:
+                    bay = allocator.allocate(vehicle.vehicle_type)
+                except ParkingFull as exc:
+                    result.update(status='error', message=str(exc))
+                    continue
+                if bay is not None:
+                    allocated.append(bay.id)
+                txn = ParkingTransaction(facility_id=facility_id, vehicle=vehicle, entry_time=event['timestamp'],
+                                         slot_id=bay and bay.id)
+                open_txns[vehicle.id] = txn
+                to_create.append(txn)
+                entered[vehicle.vehicle_type] += 1
+                result.update(status='success', message=f'Vehicle {vehicle.vehicle_number} entered.')
+                if bay is not None:
+                    result['slot'] = bay.payload()
+                continue
+
+            txn = open_txns.get(vehicle.id) if vehicle else None
+            if txn is None or txn.facility_id != facility_id:
+                result.update(status='error', message='No active entry for this vehicle.')
+                continue
+
+            del open_txns[vehicle.id]
+            txn.vehicle = vehicle
+            txn.exit_time = event['timestamp']
+            txn.status = "Exited"
+            txn.fees_paid = 0
+            expiry = pass_expiry.get(vehicle.id)
+            if not (expiry and expiry > txn.exit_time):
+                to_charge.append((txn, result))
+            if txn.pk:
+                to_update.append(txn)
+            closed.append(txn)
+            exited[vehicle.vehicle_type] += 1
+            result.update(status='success', message=f'Vehicle {vehicle.vehicle_number} exited.', fees_paid=0.0)
+
+        # Price every chargeable exit in the batch in one vectorised call
+        if to_charge:
+            fees = compute_fees(
+                [txn.entry_time for txn, _ in to_charge],
+                [txn.exit_time for txn, _ in to_charge],
+                [txn.vehicle.vehicle_type for txn, _ in to_charge],
+            )
+            for (txn, result), fee in zip(to_charge, fees.tolist()):
+                txn.fees_paid = fee
+                result['fees_paid'] = fee
+
+        ParkingTransaction.objects.bulk_create(to_create)
+        ParkingTransaction.objects.bulk_update(to_update, ['exit_time', 'fees_paid', 'status'])
+        record_exits((txn.vehicle.vehicle_type, txn.entry_time, txn.exit_time, txn.fees_paid) for txn in closed)
+
+        for vehicle_type, count in (entered - exited).items():
+            ledger.record_entry(vehicle_type, count)
+        for vehicle_type, count in (exited - entered).items():
+            ledger.record_exit(vehicle_type, count)
+        for txn in closed:
+            allocator.release_on_commit(txn.slot_id)
+        if to_create or to_update:
+            invalidate_dashboard_stats()
+        # A stay opened and closed within the batch is reported once, closed
+        changed = {id(txn): txn for txn in to_create + closed}.values()
+        publish_gate_event([(txn, txn.vehicle.vehicle_number, txn.vehicle.vehicle_type) for txn in changed])
+
+    return results
+
+
+def _resolve_vehicles(events):
+    """Vehicles for every plate in the batch, creating guest vehicles for new plates that enter."""
+    plates = {event['vehicle_number'] for event in events}
+    vehicles = {vehicle.vehicle_number: vehicle for vehicle in Vehicle.objects.filter(vehicle_number__in=plates)}
+
+    new_types = {}
+    for event in events:
+        if event['action'] == 'entry' and event['vehicle_number'] not in vehicles:
+            new_types.setdefault(event['vehicle_number'], event.get('vehicle_type') or 'car')
+    if new_types:
+        guest_id = guest_owner_id()
+        Vehicle.objects.bulk_create(
+            [Vehicle(vehicle_number=plate, vehicle_type=vehicle_type, owner_id=guest_id)
+             for plate, vehicle_type in new_types.items()],
+            ignore_conflicts=True,
+        )
+        vehicles.update(
+            (vehicle.vehicle_number, vehicle) for vehicle in Vehicle.objects.filter(vehicle_number__in=new_types)
+        )
+    return vehicles
+
+
+# ======================================================
+# ========== ASYNC GATE EVENTS (ASGI) ==================
+# ======================================================
+class GateOverloaded(Exception):
+    """More gate events are queued than GATE_ASYNC_MAX_PENDING allows."""
+
+
+class AsyncGate:
+    """
+    Coalescing and back-pressure for the gate events of one event loop.
+
+    Cameras often report one plate several times per pass. While an event
+    for a facility, plate and action is being applied, identical events share its
+    result instead of queueing more writes. Events run on a pool of
+    GATE_ASYNC_CONCURRENCY threads, each keeping its database connection.
+    At most GATE_ASYNC_MAX_PENDING events may be running or waiting; beyond
+    that apply() raises GateOverloaded so the caller can shed load.
+    """
+
+    def __init__(self):
+        self.workers = getattr(settings, 'GATE_ASYNC_CONCURRENCY', 4)
+        self.max_pending = getattr(settings, 'GATE_ASYNC_MAX_PENDING', 200)
+        self.pending = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='gate')
+        self._run = sync_to_async(_gate_event, thread_sensitive=False, executor=self._executor)
+
+    async def apply(self, action, vehicle_number, vehicle_type='car'):
+        """
+        Apply an 'entry' or 'exit' for an upper-cased plate.
+
+        Returns (result, coalesced). The result is what enter_vehicle or
+        exit_vehicle return: None when the vehicle is already parked, or is
+        not parked, respectively.
+        """
+        key = (current_facility_code(), action, vehicle_number)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task), True
+
+        if self.pending >= self.max_pending:
+            raise GateOverloaded()
+        self.pending += 1
+        task = asyncio.ensure_future(self._run(action, vehicle_number, vehicle_type))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._finished(key, task))
+        # A camera that disconnects must not cancel a write others are waiting on
+        return await asyncio.shield(task), False
+
+    def _finished(self, key, task):
+        self.pending -= 1
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def shutdown(self):
+        """Close every pool thread's connection and stop the pool."""
+        # Blocked on the barrier, each task holds a thread until all of them run one
+        barrier = threading.Barrier(self.workers)
+        for _ in range(self.workers):
+            self._executor.submit(lambda: (barrier.wait(), connection.close()))
+        self._executor.shutdown(wait=True)
+
+
+def _gate_event(action, vehicle_number, vehicle_type):
+    # Pool threads keep their connection across events; replace it only once it has broken
+    if connection.connection is not None and connection.errors_occurred and not connection.is_usable():
+        connection.close()
+    # Double entries and stray exits are answered from a read, without a write
+    vehicle = plates.lookup(vehicle_number)
+    parked = vehicle is not None and ParkingTransaction.objects.filter(
+        vehicle_id=vehicle.vehicle_id, exit_time__isnull=True
+    ).exists()
+    if action == 'entry':
+        return None if parked else enter_vehicle(vehicle_number, vehicle_type)
+    return exit_vehicle(vehicle_number) if parked else None
+
+
+_async_gates = weakref.WeakKeyDictionary()
+
+
+def async_gate():
+    """The AsyncGate of the running event loop."""
+    loop = asyncio.get_running_loop()
+    gate = _async_gates.get(loop)
+    if gate is None:
+        gate = _async_gates[loop] = AsyncGate()
+    return gate
+
+
+def close_async_gate():
+    """Shut down the running event loop's AsyncGate; the next event starts a fresh one."""
+    gate = _async_gates.pop(asyncio.get_running_loop(), None)
+    if gate is not None:
+        gate.shutdown()
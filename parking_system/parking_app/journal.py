@@ -0,0 +1,305 @@
+"""
+Write-behind journal for gate events.
+
+POST /api/entry-exit/journal/ appends the event to an append-only JSON-lines
+file. It answers 202 as soon as the line is written, and fsynced when
+GATE_JOURNAL_FSYNC is set. A camera therefore waits for one append instead of
+the lookups and inserts of the synchronous path.
+
+A background thread applies the pending events in sequence order, up to
+GATE_JOURNAL_BATCH_SIZE at a time, through apply_gate_events(). The last
+applied sequence number is saved in GateJournalCheckpoint in the same
+database transaction as the batch, so each event is applied exactly once.
+
+Sequence numbers and timestamps are assigned under one lock and never go
+backwards, so each plate's events are applied in the order they arrived. On
+start the journal re-reads its file and queues every event past the
+checkpoint ahead of new ones. A torn last line left by a crash is dropped,
+because that event was never acknowledged. Once everything is applied and
+the file exceeds GATE_JOURNAL_MAX_BYTES, the file is truncated.
+
+Each record carries the facility it was journaled for. A batch never spans
+two facilities, and it is applied inside that facility's scope, so its
+checkpoint is saved in that facility's database along with its events. On
+start the journal resumes after the highest checkpoint in any of them. Events
+for a facility that no longer exists fail rather than go to another lot.
+
+Like the occupancy ledger, a journal belongs to one process. Give each gate
+process its own GATE_JOURNAL_PATH: the journal holds an exclusive lock on its
+file while open, and one started on a file that another holds raises
+JournalInUse instead of interleaving their sequence numbers.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice, takewhile
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .facilities import current_facility_code, default_facility, facility_alias, facility_scope, get_facility
+from .gate import apply_gate_events
+from .models import GateJournalCheckpoint
+
+logger = logging.getLogger(__name__)
+
+
+class JournalInUse(Exception):
+    """Another gate process has the journal file open."""
+
+
+class GateJournal:
+    def __init__(self, path, fsync=True, batch_size=500, max_bytes=16 * 1024 * 1024):
+        self.path = str(path)
+        self.name = os.path.basename(self.path)
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()         # sequence numbers, the file and the pending queue
+        self._apply_lock = threading.Lock()   # one batch at a time
+        self._wakeup = threading.Event()
+        self._pending = deque()
+        self._file = None
+        self._sequence = 0
+        self._last_timestamp = None
+        self._thread = None
+        self._stopping = False
+
+        self.applied_sequence = 0
+        self.applied = 0
+        self.failed = 0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+        self.last_error = None
+
+    # ---------- lifecycle ----------
+    def open(self):
+        """Load the file and queue every event past the checkpoint; idempotent."""
+        with self._lock:
+            if self._file is not None:
+                return
+            file = open(self.path, 'ab')
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                checkpoint = max(
+                    GateJournalCheckpoint.objects.using(alias).filter(name=self.name)
+                    .values_list('sequence', flat=True).first() or 0
+                    for alias in {'default', *settings.FACILITY_DATABASES.values()}
+                )
+                records = self._read()
+            except BlockingIOError:
+                file.close()
+                raise JournalInUse(f"{self.path} is open in another gate process.")
+            except BaseException:
+                file.close()
+                raise
+            self._pending.extend(record for record in records if record['seq'] > checkpoint)
+            self._sequence = max([checkpoint] + [record['seq'] for record in records])
+            self.applied_sequence = checkpoint
+            self._file = file
+        if self._pending:
+            logger.info("Replaying %d journaled gate events from %s", len(self._pending), self.path)
+
+    def _read(self):
+        """Records in the file, truncating a torn last line."""
+        records, good_bytes = [], 0
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+                    good_bytes += len(line)
+        except FileNotFoundError:
+            return records
+        if good_bytes < os.path.getsize(self.path):
+            logger.warning("Dropping a torn record at the end of %s", self.path)
+            os.truncate(self.path, good_bytes)
+        return records
+
+    def start(self):
+        """Open the journal and start its background worker; idempotent."""
+        self.open()
+        with self._lock:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name=f'gate-journal-{self.name}', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=10):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._pending.clear()
+
+    # ---------- writing ----------
+    def append(self, vehicle_number, action, vehicle_type=None):
+        """Journal one event for the current facility and return its sequence number."""
+        self.open()
+        with self._lock:
+            now = timezone.now()
+            self._last_timestamp = max(now, self._last_timestamp) if self._last_timestamp else now
+            self._sequence += 1
+            record = {
+                'seq': self._sequence,
+                'facility': current_facility_code(),
+                'vehicle_number': vehicle_number,
+                'action': action,
+                'vehicle_type': vehicle_type,
+                'timestamp': self._last_timestamp.isoformat(),
+                'journaled_at': time.time(),
+            }
+            self._file.write(json.dumps(record).encode() + b'\n')
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._pending.append(record)
+        self._wakeup.set()
+        return record['seq']
+
+    # ---------- applying ----------
+    def apply_pending(self):
+        """Apply the next batch of pending events; returns how many were applied."""
+        with self._apply_lock:
+            batch = list(islice(self._pending, self.batch_size))
+            if not batch:
+                return 0
+            code = batch[0].get('facility')
+            batch = list(takewhile(lambda record: record.get('facility') == code, batch))
+            facility = get_facility(code) if code else default_facility()
+
+            started = time.perf_counter()
+            if facility is None:
+                # Renamed or deleted since it was journaled: applying it to another lot would open or close the
+                # wrong stay, so the events fail and the checkpoint moves past them
+                results = [{'status': 'error', 'message': f'Unknown facility "{code}".'} for _ in batch]
+                with transaction.atomic(using='default'):
+                    GateJournalCheckpoint.objects.using('default').update_or_create(
+                        name=self.name, defaults={'sequence': batch[-1]['seq']}
+                    )
+            else:
+                events = [
+                    {'vehicle_number': record['vehicle_number'], 'action': record['action'],
+                     'vehicle_type': record['vehicle_type'], 'timestamp': parse_datetime(record['timestamp'])}
+                    for record in batch
+                ]
+                with facility_scope(facility), transaction.atomic(using=facility_alias()):
+                    results = apply_gate_events(events)
+                    GateJournalCheckpoint.objects.update_or_create(
+                        name=self.name, defaults={'sequence': batch[-1]['seq']}
+                    )
+
+            with self._lock:
+                for _ in batch:
+                    self._pending.popleft()
+            failures = [(record, result) for record, result in zip(batch, results) if result['status'] != 'success']
+            for record, result in failures:
+                logger.warning("Journaled gate event %d (%s %s) failed: %s",
+                               record['seq'], record['action'], record['vehicle_number'], result['message'])
+            self.applied_sequence = batch[-1]['seq']
+            self.applied += len(batch) - len(failures)
+            self.failed += len(failures)
+            self.last_batch_size = len(batch)
+            self.last_batch_seconds = time.perf_counter() - started
+            self._compact()
+            return len(batch)
+
+    def apply_all(self):
+        total = 0
+        while applied := self.apply_pending():
+            total += applied
+        return total
+
+    def _compact(self):
+        with self._lock:
+            if self._file is not None and not self._pending and os.fstat(self._file.fileno()).st_size > self.max_bytes:
+                # Everything in the file is applied and the checkpoint carries the sequence on
+                self._file.truncate(0)
+
+    def _run(self):
+        backoff = 0.5
+        try:
+            while not self._stopping:
+                if not self._pending:
+                    self._wakeup.wait(1)
+                    self._wakeup.clear()
+                    continue
+                # A long-lived thread: recycle a broken connection the way request_finished would
+                close_old_connections()
+                try:
+                    self.apply_pending()
+                    self.last_error = None
+                    backoff = 0.5
+                except Exception as exc:
+                    logger.exception("Applying journaled gate events failed; retrying in %.1fs", backoff)
+                    self.last_error = str(exc)
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+        finally:
+            for alias in settings.FACILITY_DATABASES.values():
+                connections[alias].close()
+            connection.close()
+
+    # ---------- monitoring ----------
+    def lag(self):
+        with self._lock:
+            pending = len(self._pending)
+            oldest = self._pending[0]['journaled_at'] if pending else None
+            journaled = self._sequence
+        return {
+            'journaled_sequence': journaled,
+            'applied_sequence': self.applied_sequence,
+            'pending': pending,
+            'lag_seconds': round(time.time() - oldest, 3) if oldest else 0.0,
+            'applied': self.applied,
+            'failed': self.failed,
+            'last_batch_size': self.last_batch_size,
+            'last_batch_ms': round(self.last_batch_seconds * 1000, 3),
+            'worker_running': self._thread is not None and self._thread.is_alive(),
+            'last_error': self.last_error,
+        }
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def gate_journal():
+    """This process's journal, started on first use."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = GateJournal(
+                settings.GATE_JOURNAL_PATH,
+                fsync=getattr(settings, 'GATE_JOURNAL_FSYNC', True),
+                batch_size=getattr(settings, 'GATE_JOURNAL_BATCH_SIZE', 500),
+                max_bytes=getattr(settings, 'GATE_JOURNAL_MAX_BYTES', 16 * 1024 * 1024),
+            )
+        journal = _journal
+    journal.start()
+    return journal
+
+
+def reset_gate_journal():
+    global _journal
+    with _journal_lock:
+        journal, _journal = _journal, None
+    if journal is not None:
+        journal.stop()
@@ -0,0 +1,276 @@
+"""
+Live dashboard updates over Server-Sent Events.
+
+Once a gate write commits, it publishes one `gate` event. The event carries
+the transactions that were opened or closed, the occupancy counts from the
+ledger, and the fees the exits added to today's earnings. The broker encodes
+each event once and queues the same bytes for every connected dashboard. So
+N open dashboards cost one serialisation per gate event, instead of N
+clients polling the stats and recent-transaction endpoints.
+
+The figures that need a query (active passes, vehicles today) are published
+as a `stats` event, and only when they have changed. Streams look for a
+change at most once every LIVE_STATS_INTERVAL seconds, and only one stream
+per process does the check. Between writes the check hits the cached
+dashboard stats.
+
+A dashboard follows the facility it connected for (see facilities.py): it
+only receives that facility's events, and the stats check runs per facility.
+
+A subscriber that falls LIVE_QUEUE_SIZE events behind is dropped. Its
+EventSource then reconnects and starts from a fresh `snapshot`. Like the
+occupancy ledger, the broker is per process: a gate write served by one
+worker only reaches the dashboards connected to that same worker.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+
+from .facilities import current_facility, facility_alias, facility_scope
+from .occupancy import ledger
+from .stats import dashboard_stats, day_bounds
+
+KEEPALIVE = b": keep-alive\n\n"
+
+
+def encode(event, data):
+    """One SSE frame."""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n".encode()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF negotiate `Accept: text/event-stream`; errors go out as an `error` event."""
+    media_type = "text/event-stream"
+    format = "event-stream"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return encode("error", data)
+
+
+# ======================================================
+# ========== SUBSCRIBERS ===============================
+# ======================================================
+class Subscriber:
+    """One connected dashboard: its facility, its pending frames and a wake-up signal."""
+
+    def __init__(self, size, facility):
+        self.size = size
+        self.facility = facility
+        self.dropped = False
+        self._frames = deque()
+        self._loop = None
+        self._wakeup = threading.Event()
+
+    def put(self, frame):
+        if len(self._frames) >= self.size:
+            self.dropped = True
+        else:
+            self._frames.append(frame)
+        loop = self._loop
+        if loop:
+            loop.call_soon_threadsafe(self._wakeup.set)
+        else:
+            self._wakeup.set()
+
+    def drain(self):
+        self._wakeup.clear()
+        frames = []
+        while self._frames:
+            frames.append(self._frames.popleft())
+        return b"".join(frames)
+
+    def wait(self, timeout):
+        self._wakeup.wait(timeout)
+
+    async def await_frames(self, timeout):
+        if self._loop is None:
+            # Publishers run in other threads; they wake this stream through its loop from now on
+            self._wakeup = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+        if self._frames:
+            return
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+# ======================================================
+# ========== BROKER ====================================
+# ======================================================
+class DashboardBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._stats = {}             # facility id -> last published stats
+        self._stats_checked_at = {}  # facility id -> when its stats were last checked
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        subscriber = Subscriber(getattr(settings, "LIVE_QUEUE_SIZE", 100), current_facility())
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data, facility_id=None):
+        """
+        Encode an event once and queue it for every subscriber of the facility
+        (by default the current one); returns how many got it.
+        """
+        facility_id = facility_id or current_facility().id
+        with self._lock:
+            subscribers = [subscriber for subscriber in self._subscribers if subscriber.facility.id == facility_id]
+        if not subscribers:
+            return 0
+        frame = encode(event, data)
+        for subscriber in subscribers:
+            subscriber.put(frame)
+            if subscriber.dropped:
+                self.unsubscribe(subscriber)
+        return len(subscribers)
+
+    def refresh_stats(self, facility):
+        """Publish a facility's dashboard stats if they changed; one caller per interval does the work."""
+        interval = getattr(settings, "LIVE_STATS_INTERVAL", 1)
+        with self._lock:
+            now = time.monotonic()
+            if now - self._stats_checked_at.get(facility.id, 0.0) < interval:
+                return
+            self._stats_checked_at[facility.id] = now
+        # A WSGI stream is iterated after the middleware has left the facility's scope
+        with facility_scope(facility):
+            stats = stats_payload()
+        if stats != self._stats.get(facility.id):
+            self._stats[facility.id] = stats
+            self.publish("stats", stats, facility.id)
+
+    def reset(self):
+        with self._lock:
+            self._subscribers = set()
+            self._stats = {}
+            self._stats_checked_at = {}
+
+    # ---------- streams ----------
+    def _limits(self):
+        return (
+            time.monotonic() + getattr(settings, "LIVE_STREAM_SECONDS", 300),
+            getattr(settings, "LIVE_HEARTBEAT_SECONDS", 15),
+            getattr(settings, "LIVE_STATS_INTERVAL", 1),
+        )
+
+    def stream(self, subscriber, first):
+        """
+        SSE body for WSGI servers: `first` then every published event.
+
+        The stream ends after LIVE_STREAM_SECONDS so a worker thread is not
+        held forever; EventSource reconnects after the `retry` delay.
+        """
+        deadline, heartbeat, poll = self._limits()
+        try:
+            yield b"retry: 2000\n\n" + first
+            quiet_since = time.monotonic()
+            while not subscriber.dropped and time.monotonic() < deadline:
+                subscriber.wait(poll)
+                self.refresh_stats(subscriber.facility)
+                frames = subscriber.drain()
+                if frames:
+                    quiet_since = time.monotonic()
+                    yield frames
+                elif time.monotonic() - quiet_since >= heartbeat:
+                    quiet_since = time.monotonic()
+                    yield KEEPALIVE
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def astream(self, subscriber, first):
+        """The same stream for ASGI servers, without holding a thread while idle."""
+        deadline, heartbeat, poll = self._limits()
+        refresh_stats = sync_to_async(self.refresh_stats)
+        try:
+            yield b"retry: 2000\n\n" + first
+            quiet_since = time.monotonic()
+            while not subscriber.dropped and time.monotonic() < deadline:
+                await subscriber.await_frames(poll)
+                await refresh_stats(subscriber.facility)
+                frames = subscriber.drain()
+                if frames:
+                    quiet_since = time.monotonic()
+                    yield frames
+                elif time.monotonic() - quiet_since >= heartbeat:
+                    quiet_since = time.monotonic()
+                    yield KEEPALIVE
+        finally:
+            self.unsubscribe(subscriber)
+
+
+broker = DashboardBroker()
+
+
+# ======================================================
+# ========== PAYLOADS ==================================
+# ======================================================
+def stats_payload():
+    stats = dashboard_stats()
+    return {
+        "active_passes_count": stats["active_passes"],
+        "vehicles_today": stats["vehicles_today"],
+        "earnings_today": stats["earnings_today"],
+    }
+
+
+def transaction_payload(txn, vehicle_number, vehicle_type):
+    return {
+        "id": txn.pk,
+        "vehicle_number": vehicle_number,
+        "vehicle_type": vehicle_type,
+        "entry_time": txn.entry_time,
+        "exit_time": txn.exit_time,
+        "fees_paid": float(txn.fees_paid or 0),
+        "status": txn.status,
+    }
+
+
+def publish_gate_event(changes):
+    """
+    Send one `gate` event for `changes`, a list of (transaction, plate,
+    vehicle type), once the current write commits. Costs nothing while no
+    dashboard is connected.
+    """
+    if not broker.subscribers or not changes:
+        return
+
+    facility = current_facility()
+
+    def publish():
+        start, end = day_bounds(timezone.now())
+        with facility_scope(facility):
+            occupancy = ledger.snapshot()
+        broker.publish("gate", {
+            "transactions": [transaction_payload(*change) for change in changes],
+            "occupancy": occupancy,
+            "slots_filled": sum(occupancy.values()),
+            # Today's earnings sum the fees of stays that entered today
+            "earnings_delta": round(sum(
+                float(txn.fees_paid or 0) for txn, _, _ in changes
+                if txn.exit_time and start <= txn.entry_time < end
+            ), 2),
+        }, facility.id)
+
+    transaction.on_commit(publish, using=facility_alias())
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded least-recently-used cache with per-entry expiry.
+
+    Each entry lives for `ttl` seconds from when it was set (default_ttl when
+    not given). Expired entries are dropped when read; the least recently
+    used entry is evicted when the cache is full. An entry set with a `tag`
+    can be dropped with all others of that tag by discard_tag(), in time
+    proportional to their number rather than to the cache's size.
+    """
+
+    def __init__(self, maxsize, default_ttl=None):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (value, expires_at)
+        self._tags = {}                 # key -> tag
+        self._tagged = {}               # tag -> keys
+        self.hits = 0
+        self.misses = 0
+
+    def _untag(self, key):
+        tag = self._tags.pop(key, _MISSING)
+        if tag is not _MISSING:
+            keys = self._tagged[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tagged[tag]
+
+    def _delete(self, key):
+        del self._entries[key]
+        self._untag(key)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._delete(key)
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None, tag=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            self._untag(key)
+            if tag is not None:
+                self._tags[key] = tag
+                self._tagged.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._delete(next(iter(self._entries)))
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                self._delete(key)
+        return default if entry is _MISSING else entry[0]
+
+    def discard_tag(self, tag):
+        """Drop every entry set with `tag`; returns how many."""
+        with self._lock:
+            keys = self._tagged.pop(tag, ())
+            for key in keys:
+                del self._entries[key]
+                del self._tags[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._tagged.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
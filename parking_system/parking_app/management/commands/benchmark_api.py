@@ -0,0 +1,90 @@
+import json
+import random
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from parking_app.benchmark import DEFAULT_MIX, compare, run, seed, summarise, throwaway_database, use_sqlite_profile
+
+
+class Command(BaseCommand):
+    help = ('Seeds a throwaway test database with synthetic data, replays a mix of API calls against it '
+            'and reports latency percentiles, queries per request and throughput per endpoint.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owners', type=int, default=500)
+        parser.add_argument('--vehicles', type=int, default=1500)
+        parser.add_argument('--passes', type=int, default=300)
+        parser.add_argument('--days', type=int, default=730, help='Days of transaction history to seed.')
+        parser.add_argument('--per-day', type=int, default=60, help='Average completed stays per seeded day.')
+        parser.add_argument('--parked', type=int, default=40, help='Vehicles inside when the replay starts.')
+        parser.add_argument('--requests', type=int, default=2000, help='API calls to replay.')
+        parser.add_argument('--mix', help='Operation weights, e.g. "entry=30,exit=25,dashboard=40" '
+                                          f'(operations: {", ".join(DEFAULT_MIX)}).')
+        parser.add_argument('--workers', type=int, default=1, help='Concurrent client threads, one connection each.')
+        parser.add_argument('--sqlite-profile', choices=list(settings.SQLITE_PROFILES),
+                            help='SQLite PRAGMA profile to run under (default: settings.SQLITE_PROFILE).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for data and traffic.')
+        parser.add_argument('--output', '-o', help='Write the JSON summary to this file.')
+        parser.add_argument('--compare', help='Baseline JSON summary to check for regressions.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed p95 slowdown against the baseline, as a fraction.')
+
+    def handle(self, *args, **options):
+        mix = self._mix(options['mix'])
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        profile = None
+        if connection.vendor == 'sqlite':
+            profile = options['sqlite_profile'] or settings.SQLITE_PROFILE
+
+        with use_sqlite_profile(profile) if profile else nullcontext(), throwaway_database():
+            rng = random.Random(options['seed'])
+
+            started = time.perf_counter()
+            seeded = seed(owners=options['owners'], vehicles=options['vehicles'], passes=options['passes'],
+                          days=options['days'], per_day=options['per_day'], parked=options['parked'], rng=rng)
+            self.stderr.write(f'Seeded {seeded} in {time.perf_counter() - started:.1f}s.')
+
+            user = User.objects.create_user(username='benchmark')
+            started = time.perf_counter()
+            samples = run(user, options['requests'], mix, rng, workers=options['workers'])
+            summary = summarise(samples, time.perf_counter() - started)
+
+        summary['config'] = {'seed': options['seed'], 'requests': options['requests'], 'mix': mix,
+                             'workers': options['workers'], 'database': connection.vendor,
+                             'sqlite_profile': profile, 'data': seeded}
+        report = json.dumps(summary, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(report + '\n')
+        self.stdout.write(report)
+
+        if baseline is not None:
+            regressions = compare(summary, baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+            self.stderr.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    @staticmethod
+    def _mix(value):
+        if not value:
+            return dict(DEFAULT_MIX)
+        mix = {}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            name = name.strip()
+            if name not in DEFAULT_MIX:
+                raise CommandError(f'Unknown operation "{name}" in --mix.')
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f'Weight for "{name}" in --mix must be a number.')
+        return mix
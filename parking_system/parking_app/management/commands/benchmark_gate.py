@@ -0,0 +1,60 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from parking_app.benchmark import gate_phases, run_gate_async, run_gate_sync, summarise, throwaway_database
+
+
+class Command(BaseCommand):
+    help = ('Sends the same burst of concurrent entries and exits to the sync gate view (a thread per '
+            'request) and to the async gate view (through the ASGI handler) and compares their throughput.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicles', type=int, default=500, help='Plates that enter and then exit.')
+        parser.add_argument('--copies', type=int, default=1,
+                            help='Times each event is read, as by a camera re-reading a plate.')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight at once.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', '-o', help='Write the per-view JSON summaries to this file.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        runners = {'sync': run_gate_sync, 'async': run_gate_async}
+
+        results = {}
+        with throwaway_database():
+            token = Token.objects.create(user=User.objects.create_user(username='benchmark')).key
+            for prefix, (mode, runner) in zip(['GS', 'GA'], runners.items()):
+                self.stderr.write(f'Benchmarking the {mode} gate view...')
+                phases = gate_phases(prefix, options['vehicles'], options['copies'], rng)
+                started = time.perf_counter()
+                samples = runner(token, phases, options['concurrency'])
+                summary = summarise(samples, time.perf_counter() - started)
+                summary['overall']['coalesced'] = sum(1 for sample in samples if sample['coalesced'])
+                summary['overall']['overloaded'] = sum(1 for sample in samples if sample['status'] == 503)
+                results[mode] = summary
+
+        config = {'vehicles': options['vehicles'], 'copies': options['copies'],
+                  'concurrency': options['concurrency'], 'database': connection.vendor,
+                  'async_concurrency': settings.GATE_ASYNC_CONCURRENCY}
+        header = (f'{"view":<8}{"requests":>10}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+                  f'{"errors":>8}{"coalesced":>11}{"503s":>6}')
+        self.stdout.write(header)
+        for mode, summary in results.items():
+            stats = summary['overall']
+            self.stdout.write(
+                f'{mode:<8}{stats["requests"]:>10}{stats["wall_throughput_rps"]:>10.1f}{stats["p50_ms"]:>10.2f}'
+                f'{stats["p95_ms"]:>10.2f}{stats["p99_ms"]:>10.2f}{stats["errors"]:>8}'
+                f'{stats["coalesced"]:>11}{stats["overloaded"]:>6}'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'config': config, **results}, f, indent=2)
+            self.stderr.write(self.style.SUCCESS(f'Wrote {options["output"]}.'))
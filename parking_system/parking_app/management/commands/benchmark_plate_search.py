@@ -0,0 +1,36 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parking_app.benchmark import time_plate_search
+
+
+class Command(BaseCommand):
+    help = ('Builds the fuzzy plate index over synthetic plates in memory and times searching it for camera '
+            'misreads, against a linear scan of every plate.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicles', type=int, default=1_000_000, help='Registered plates to index.')
+        parser.add_argument('--queries', type=int, default=10000, help='Misread plates to search for.')
+        parser.add_argument('--scans', type=int, default=20, help='Queries also answered by a linear scan.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', '-o', help='Write the JSON results to this file.')
+
+    def handle(self, *args, **options):
+        self.stderr.write(f'Indexing {options["vehicles"]} plates...')
+        result = time_plate_search(options['vehicles'], options['queries'], options['scans'],
+                                   random.Random(options['seed']))
+
+        self.stdout.write(
+            f'{result["plates"]} plates indexed in {result["build_s"]:.1f}s. Search p50 {result["p50_us"]:.0f}us, '
+            f'p99 {result["p99_us"]:.0f}us, max {result["max_us"]:.0f}us; linear scan {result["scan_ms"]:.0f}ms. '
+            f'Plate found for {result["found"]:.2%} of misreads.'
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'config': {k: options[k] for k in ('vehicles', 'queries', 'scans', 'seed')}, **result},
+                          f, indent=2)
+            self.stderr.write(self.style.SUCCESS(f'Wrote {options["output"]}.'))
+        if result['found'] is not None and result['found'] < 1:
+            raise CommandError('Some misreads did not find their plate.')
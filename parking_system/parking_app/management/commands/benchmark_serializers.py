@@ -0,0 +1,44 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from parking_app.benchmark import seed, throwaway_database, time_listings
+
+
+class Command(BaseCommand):
+    help = ('Seeds a throwaway test database and times serializing the owner, vehicle, pass and transaction '
+            'listings through their ModelSerializers and through the values() serializers the list views use.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000,
+                            help='Owners, vehicles, passes and transactions to seed (each).')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per path; the best one counts.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', '-o', help='Write the JSON results to this file.')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with throwaway_database():
+            started = time.perf_counter()
+            seeded = seed(owners=rows, vehicles=rows, passes=rows, days=730, per_day=rows / 730, parked=0,
+                          rng=random.Random(options['seed']))
+            self.stderr.write(f'Seeded {seeded} in {time.perf_counter() - started:.1f}s.')
+            results = time_listings(options['repeat'])
+
+        self.stdout.write(f'{"listing":<14}{"rows":>9}{"model ms":>11}{"values ms":>11}{"speedup":>9}')
+        for name, result in results.items():
+            self.stdout.write(f'{name:<14}{result["rows"]:>9}{result["model_ms"]:>11.1f}'
+                              f'{result["values_ms"]:>11.1f}{result["speedup"]:>8.2f}x')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'config': {'rows': rows, 'database': connection.vendor, 'data': seeded}, **results},
+                          f, indent=2)
+            self.stderr.write(self.style.SUCCESS(f'Wrote {options["output"]}.'))
+
+        different = [name for name, result in results.items() if not result['identical']]
+        if different:
+            raise CommandError(f'values() output differs from the ModelSerializer for: {", ".join(different)}')
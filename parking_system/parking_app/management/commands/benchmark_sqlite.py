@@ -0,0 +1,49 @@
+import json
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = ('Runs benchmark_api once per SQLite profile with concurrent workers '
+            'and compares read and write throughput and latency.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=list(settings.SQLITE_PROFILES),
+                            choices=list(settings.SQLITE_PROFILES))
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=365, help='Days of transaction history to seed.')
+        parser.add_argument('--output', '-o', help='Write the per-profile JSON summaries to this file.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The default database is not SQLite.')
+
+        results = {}
+        for profile in options['profiles']:
+            self.stderr.write(f'Benchmarking the "{profile}" profile...')
+            out = StringIO()
+            call_command('benchmark_api', sqlite_profile=profile, workers=options['workers'],
+                         requests=options['requests'], days=options['days'], stdout=out, stderr=StringIO())
+            results[profile] = json.loads(out.getvalue())
+
+        header = f'{"profile":<14}{"kind":<8}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}'
+        self.stdout.write(header)
+        for profile, summary in results.items():
+            for kind in ('reads', 'writes', 'overall'):
+                stats = summary.get(kind)
+                if not stats:
+                    continue
+                self.stdout.write(
+                    f'{profile:<14}{kind:<8}{stats["wall_throughput_rps"]:>10.1f}{stats["p50_ms"]:>10.2f}'
+                    f'{stats["p95_ms"]:>10.2f}{stats["p99_ms"]:>10.2f}{stats["errors"]:>8}'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stderr.write(self.style.SUCCESS(f'Wrote {options["output"]}.'))
@@ -1,63 +1,42 @@
+import time
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from parking_app.models import ParkingPass, Notification, Owner, Vehicle
+
+from parking_app.expiry import retire_reminders, sweep_expired, sweep_reminders
+from parking_app.facilities import database_facilities, facility_scope
+
 
 class Command(BaseCommand):
-    help = 'Checks for expired parking passes and creates notifications.'
+    help = ('Checks for expired parking passes and creates notifications, in the default database and in each '
+            'facility database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reminder-days', type=int, default=getattr(settings, 'EXPIRY_REMINDER_DAYS', 3),
+                            help='Remind owners whose pass expires within this many days.')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Passes processed per batch.')
 
     def handle(self, *args, **options):
         now = timezone.now()
-
-        expired_passes = ParkingPass.objects.filter(
-            is_active=True,
-            expiry_date__lt=now
-        )
-
-        notification_count = 0
-        for parking_pass in expired_passes:
-
-            parking_pass.is_active = False
-            parking_pass.save()
-
-            vehicle = parking_pass.vehicle
-            owner = vehicle.owner
-
-            if not Notification.objects.filter(pass_notified=parking_pass, notification_type='pass_expiry').exists():
-                Notification.objects.create(
-                    recipient=owner,
-                    pass_notified=parking_pass,
-                    message=f"Your parking pass for vehicle {vehicle.vehicle_number} expired on {parking_pass.expiry_date.strftime('%Y-%m-%d %H:%M')}.",
-                    notification_type='pass_expiry'
-                )
-                notification_count += 1
-                self.stdout.write(self.style.SUCCESS(f"Generated expiry notification for {vehicle.vehicle_number}."))
-
-            else:
-                self.stdout.write(self.style.WARNING(f"Notification already exists for expired pass {vehicle.vehicle_number}."))
-
-        upcoming_expiries = ParkingPass.objects.filter(
-            is_active=True,
-            expiry_date__gt=now,
-            expiry_date__lt=now + timezone.timedelta(days=3) 
-        )
-
-        for parking_pass in upcoming_expiries:
-            vehicle = parking_pass.vehicle
-            owner = vehicle.owner
-            message = f"Reminder: Your parking pass for vehicle {vehicle.vehicle_number} will expire on {parking_pass.expiry_date.strftime('%Y-%m-%d %H:%M')}."
-
-            if not Notification.objects.filter(
-                pass_notified=parking_pass,
-                notification_type='pass_expiry',
-                message__icontains="Reminder"
-            ).exists():
-                Notification.objects.create(
-                    recipient=owner,
-                    pass_notified=parking_pass,
-                    message=message,
-                    notification_type='pass_expiry'
-                )
-                notification_count += 1
-                self.stdout.write(self.style.SUCCESS(f"Generated reminder notification for {vehicle.vehicle_number}."))
-
-        self.stdout.write(self.style.SUCCESS(f'Finished checking for expired passes. {notification_count} new notifications created.'))
\ No newline at end of file
+        chunk_size = options['chunk_size']
+        started = time.perf_counter()
+
+        steps = [
+            ('expiry notifications created', lambda: sweep_expired(now, chunk_size)),
+            ('reminder notifications created', lambda: sweep_reminders(now, options['reminder_days'], chunk_size)),
+            ('reminders retired for expired passes', lambda: retire_reminders(now)),
+        ]
+        total = 0
+        for alias, facility in database_facilities().items():
+            # Passes of every facility stored in this database
+            with facility_scope(facility):
+                for label, step in steps:
+                    step_started = time.perf_counter()
+                    count = step()
+                    total += count
+                    self.stdout.write(f'{alias}: {count} {label} ({time.perf_counter() - step_started:.2f}s).')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished checking for expired passes in {time.perf_counter() - started:.2f}s. {total} rows written.'
+        ))
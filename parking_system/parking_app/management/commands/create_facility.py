@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from parking_app.facilities import reset_facilities
+from parking_app.models import Facility
+
+
+class Command(BaseCommand):
+    help = ('Adds a facility (parking lot). A facility listed in FACILITY_DATABASES also gets its row copied '
+            'to its own database, which must be migrated first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('code', help='Short code clients send in X-Facility, e.g. "north".')
+        parser.add_argument('name', help='Display name, e.g. "North Car Park".')
+
+    def handle(self, *args, **options):
+        facility, created = Facility.objects.using('default').update_or_create(
+            code=options['code'], defaults={'name': options['name']}
+        )
+        database = settings.FACILITY_DATABASES.get(facility.code)
+        if database:
+            if database not in settings.DATABASES:
+                raise CommandError(f'Database "{database}" of facility "{facility.code}" is not configured.')
+            # Same primary key, so the facility's rows there point at it
+            facility.save(using=database)
+        reset_facilities()
+
+        action = 'Created' if created else 'Updated'
+        where = f' (database "{database}")' if database else ''
+        self.stdout.write(self.style.SUCCESS(f'{action} facility "{facility.code}": {facility.name}{where}.'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from parking_app.facilities import facility_alias, facility_or_default, facility_scope
+from parking_app.models import Slot, Zone
+
+
+class Command(BaseCommand):
+    help = ('Adds car and bike bays to a zone of a facility, creating the zone if needed. Bays are labelled C0001, C0002, ... '
+            'and B0001, ... and numbering continues after the zone\'s existing bays.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('zone', help='Zone name, e.g. "Level 1".')
+        parser.add_argument('--car', type=int, default=0, help='Car bays to add.')
+        parser.add_argument('--bike', type=int, default=0, help='Bike bays to add.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--facility', help='Facility code (default: DEFAULT_FACILITY).')
+
+    def handle(self, *args, **options):
+        if options['car'] < 0 or options['bike'] < 0:
+            raise CommandError('Bay counts cannot be negative.')
+        facility = facility_or_default(options['facility'])
+        if facility is None:
+            raise CommandError(f'Unknown facility "{options["facility"]}".')
+
+        with facility_scope(facility), transaction.atomic(using=facility_alias()):
+            zone, created = Zone.objects.get_or_create(facility_id=facility.id, name=options['zone'])
+            bays = []
+            for slot_type, prefix in [('car', 'C'), ('bike', 'B')]:
+                numbers = [label[1:] for label in zone.slots.filter(label__startswith=prefix)
+                           .values_list('label', flat=True)]
+                start = max([int(n) for n in numbers if n.isdigit()], default=0)
+                bays += [Slot(zone=zone, slot_type=slot_type, label=f'{prefix}{n:04d}')
+                         for n in range(start + 1, start + options[slot_type] + 1)]
+            Slot.objects.bulk_create(bays, batch_size=options['batch_size'])
+
+        action = 'Created' if created else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} zone "{zone.name}" at {facility.name}: added {options["car"]} car and {options["bike"]} bike bays.'
+        ))
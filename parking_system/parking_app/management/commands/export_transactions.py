@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from parking_app.exports import export_rows, iter_export
+from parking_app.facilities import facility_or_default, facility_scope
+
+
+class Command(BaseCommand):
+    help = "Streams a facility's parking transaction history to CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv', dest='output_format')
+        parser.add_argument('--start', help='First entry date to include (YYYY-MM-DD).')
+        parser.add_argument('--end', help='Last entry date to include (YYYY-MM-DD).')
+        parser.add_argument('--vehicle-type', choices=['car', 'bike', 'other'])
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows fetched per round trip.')
+        parser.add_argument('--output', '-o', help='File to write to (default: stdout).')
+        parser.add_argument('--facility', help='Facility code (default: DEFAULT_FACILITY).')
+
+    def handle(self, *args, **options):
+        start = self._date(options['start'], '--start')
+        end = self._date(options['end'], '--end')
+        facility = facility_or_default(options['facility'])
+        if facility is None:
+            raise CommandError(f'Unknown facility "{options["facility"]}".')
+        with facility_scope(facility):
+            rows = export_rows(start, end, options['vehicle_type'], options['chunk_size'])
+        lines = iter_export(options['output_format'], rows)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                count = self._write(f.write, lines)
+            if options['output_format'] == 'csv':
+                count -= 1  # header row
+            self.stderr.write(self.style.SUCCESS(f'Exported {count} transactions to {options["output"]}.'))
+        else:
+            self._write(lambda line: self.stdout.write(line, ending=''), lines)
+
+    @staticmethod
+    def _date(value, flag):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'{flag} must be a date in YYYY-MM-DD format.')
+        return day
+
+    @staticmethod
+    def _write(write, lines):
+        count = 0
+        for line in lines:
+            write(line)
+            count += 1
+        return count
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from parking_app.facilities import facility_or_default, facility_scope
+from parking_app.models import ParkingTransaction
+from parking_app.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Backfills a facility's hourly and daily report rollups from the transaction table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First exit date to rebuild (YYYY-MM-DD, default: earliest exit).')
+        parser.add_argument('--end', help='Last exit date to rebuild (YYYY-MM-DD, default: latest exit).')
+        parser.add_argument('--facility', help='Facility code (default: DEFAULT_FACILITY).')
+
+    def handle(self, *args, **options):
+        facility = facility_or_default(options['facility'])
+        if facility is None:
+            raise CommandError(f'Unknown facility "{options["facility"]}".')
+        with facility_scope(facility):
+            self._rebuild(facility, options)
+
+    def _rebuild(self, facility, options):
+        bounds = ParkingTransaction.objects.filter(facility_id=facility.id).aggregate(first=Min('exit_time'), last=Max('exit_time'))
+        if bounds['first'] is None:
+            self.stdout.write('No completed transactions to roll up.')
+            return
+
+        start = self._date(options['start'], '--start') or timezone.localdate(bounds['first'])
+        end = self._date(options['end'], '--end') or timezone.localdate(bounds['last'])
+
+        started = time.perf_counter()
+        counts = rebuild_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rollups of {facility.name} for {start} to {end} in {time.perf_counter() - started:.2f}s: '
+            f'{counts["HourlyRollup"]} hourly rows, {counts["DailyRollup"]} daily rows.'
+        ))
+
+    @staticmethod
+    def _date(value, flag):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'{flag} must be a date in YYYY-MM-DD format.')
+        return day
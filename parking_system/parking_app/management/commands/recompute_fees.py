@@ -0,0 +1,84 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.dateparse import parse_date
+
+from parking_app.facilities import facility_alias, facility_or_default, facility_scope
+from parking_app.models import ParkingPass, ParkingTransaction
+from parking_app.rollups import rebuild_rollups
+from parking_app.stats import start_of_day
+from parking_app.tariffs import compute_fees
+
+
+class Command(BaseCommand):
+    help = "Re-prices a facility's closed transactions in a period with the current tariffs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help='First exit date to re-price (YYYY-MM-DD).')
+        parser.add_argument('--end', required=True, help='Last exit date to re-price (YYYY-MM-DD).')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Transactions priced per batch.')
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without saving them.')
+        parser.add_argument('--facility', help='Facility code (default: DEFAULT_FACILITY).')
+
+    def handle(self, *args, **options):
+        start, end = parse_date(options['start']), parse_date(options['end'])
+        if not start or not end:
+            raise CommandError('--start and --end must be dates in YYYY-MM-DD format.')
+        facility = facility_or_default(options['facility'])
+        if facility is None:
+            raise CommandError(f'Unknown facility "{options["facility"]}".')
+        with facility_scope(facility):
+            self._reprice(facility, start, end, options)
+
+    def _reprice(self, facility, start, end, options):
+        # Pass holders were not charged if a pass covered the moment they left
+        covered_by_pass = Exists(ParkingPass.objects.filter(
+            facility=OuterRef('facility'),
+            vehicle=OuterRef('vehicle'),
+            issue_date__lte=OuterRef('exit_time'),
+            expiry_date__gt=OuterRef('exit_time'),
+        ))
+        closed = (
+            ParkingTransaction.objects
+            .filter(facility_id=facility.id, exit_time__gte=start_of_day(start),
+                    exit_time__lt=start_of_day(end + timedelta(days=1)))
+            .annotate(covered_by_pass=covered_by_pass)
+            .order_by('id')
+            .values_list('id', 'entry_time', 'exit_time', 'vehicle__vehicle_type', 'fees_paid', 'covered_by_pass')
+        )
+
+        started = time.perf_counter()
+        priced = changed = 0
+        last_id = 0
+        while True:
+            rows = list(closed.filter(id__gt=last_id)[:options['chunk_size']])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            ids, entries, exits, types, current, covered = zip(*rows)
+
+            fees = compute_fees(entries, exits, types)
+            updates = []
+            for txn_id, old, fee, has_pass in zip(ids, current, fees.tolist(), covered):
+                new = Decimal('0.00') if has_pass else Decimal(f'{fee:.2f}')
+                if old != new:
+                    updates.append(ParkingTransaction(id=txn_id, fees_paid=new))
+
+            if updates and not options['dry_run']:
+                with transaction.atomic(using=facility_alias()):
+                    ParkingTransaction.objects.bulk_update(updates, ['fees_paid'], batch_size=1000)
+            priced += len(rows)
+            changed += len(updates)
+
+        if changed and not options['dry_run']:
+            rebuild_rollups(start, end)
+
+        elapsed = time.perf_counter() - started
+        verb = 'would change' if options['dry_run'] else 'changed'
+        self.stdout.write(self.style.SUCCESS(
+            f'Re-priced {priced} transactions of {facility.name} in {elapsed:.2f}s; {changed} fees {verb}.'
+        ))
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from parking_app.journal import GateJournal, JournalInUse
+
+
+class Command(BaseCommand):
+    help = ('Applies every gate event in the write-behind journal past its checkpoint, e.g. after a crash '
+            'and before the gate process is restarted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.GATE_JOURNAL_PATH, help='Journal file to replay.')
+
+    def handle(self, *args, **options):
+        journal = GateJournal(options['path'], batch_size=settings.GATE_JOURNAL_BATCH_SIZE)
+        started = time.perf_counter()
+        try:
+            journal.open()
+        except JournalInUse as exc:
+            raise CommandError(f'{exc} Stop it before replaying.')
+        try:
+            journal.apply_all()
+        finally:
+            journal.stop()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Applied {journal.applied} events ({journal.failed} rejected) from {options["path"]} '
+            f'up to sequence {journal.applied_sequence} in {time.perf_counter() - started:.2f}s.'
+        ))
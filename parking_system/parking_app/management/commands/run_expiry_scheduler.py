@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from parking_app.expiry_scheduler import EXPIRY, REMINDER, expiry_scheduler
+
+
+class Command(BaseCommand):
+    help = ('Runs the pass expiry scheduler in the foreground: catches up on overdue notifications, then sends '
+            'each expiry and reminder notification as it falls due. Replaces the check_expiry cron job.')
+
+    def handle(self, *args, **options):
+        scheduler = expiry_scheduler()
+        self.stdout.write(
+            f'Expiry scheduler running: reminders {scheduler.reminder_days} days ahead, '
+            f'new passes checked every {scheduler.poll}s. Press Ctrl+C to stop.'
+        )
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Expiry scheduler stopped after sending {scheduler.sent[EXPIRY]} expiry and '
+            f'{scheduler.sent[REMINDER]} reminder notifications.'
+        ))
@@ -0,0 +1,180 @@
+"""
+Per-request query and timing instrumentation.
+
+While metrics are enabled, QueryMetricsMiddleware records for every request
+its wall time, number of queries, time spent in SQL and time spent rendering
+the response (where DRF turns serializer data into JSON). It also notes any
+SELECT shape repeated REQUEST_METRICS_N_PLUS_ONE_THRESHOLD or more times in
+one request, which is the signature of an N+1 loop. Each response gets a
+Server-Timing header. Per-endpoint aggregates are kept in memory for the
+admin-only /api/metrics/ endpoint.
+
+Metrics start enabled when REQUEST_METRICS_ENABLED is set and can be switched
+on and off at runtime through the metrics endpoint. While they are off the
+middleware costs one attribute check per request. Like the occupancy ledger,
+the aggregates are per process.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Collapse IN (...) lists and literals so queries differing only in values share a shape
+_PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def sql_shape(sql):
+    return _LITERAL.sub("?", _PLACEHOLDER_LIST.sub("%s, ...", sql))
+
+
+class RequestRecorder:
+    """Database execute wrapper that counts and times the queries of one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.queries += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def repeated(self, threshold):
+        """SELECT shapes run at least `threshold` times."""
+        return {
+            shape: count for shape, count in self.shapes.items()
+            if count >= threshold and shape.lstrip().upper().startswith("SELECT")
+        }
+
+
+# ======================================================
+# ========== AGGREGATES ================================
+# ======================================================
+class MetricsRegistry:
+    """Per-endpoint totals of the recorded requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = getattr(settings, "REQUEST_METRICS_ENABLED", False)
+        self._endpoints = {}
+
+    def record(self, endpoint, wall_seconds, recorder, repeated):
+        with self._lock:
+            totals = self._endpoints.setdefault(endpoint, {
+                "requests": 0, "wall": 0.0, "wall_max": 0.0, "sql": 0.0, "render": 0.0,
+                "queries": 0, "queries_max": 0, "n_plus_one": 0, "repeated_sql": Counter(),
+            })
+            totals["requests"] += 1
+            totals["wall"] += wall_seconds
+            totals["wall_max"] = max(totals["wall_max"], wall_seconds)
+            totals["sql"] += recorder.sql_seconds
+            totals["render"] += recorder.render_seconds
+            totals["queries"] += recorder.queries
+            totals["queries_max"] = max(totals["queries_max"], recorder.queries)
+            if repeated:
+                totals["n_plus_one"] += 1
+                totals["repeated_sql"].update(repeated)
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, totals in sorted(self._endpoints.items()):
+                n = totals["requests"]
+                endpoints[endpoint] = {
+                    "requests": n,
+                    "wall_ms_avg": round(totals["wall"] / n * 1000, 3),
+                    "wall_ms_max": round(totals["wall_max"] * 1000, 3),
+                    "sql_ms_avg": round(totals["sql"] / n * 1000, 3),
+                    "render_ms_avg": round(totals["render"] / n * 1000, 3),
+                    "queries_avg": round(totals["queries"] / n, 2),
+                    "queries_max": totals["queries_max"],
+                    "n_plus_one_requests": totals["n_plus_one"],
+                    "repeated_sql": [
+                        {"sql": shape, "executions": count}
+                        for shape, count in totals["repeated_sql"].most_common(5)
+                    ],
+                }
+        return {"enabled": self.enabled, "endpoints": endpoints}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+
+registry = MetricsRegistry()
+
+
+# ======================================================
+# ========== MIDDLEWARE ================================
+# ======================================================
+class QueryMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, "REQUEST_METRICS_N_PLUS_ONE_THRESHOLD", 5)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not registry.enabled:
+            return self.get_response(request)
+
+        recorder = request._query_metrics = RequestRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall_seconds = time.perf_counter() - started
+
+        match = request.resolver_match
+        endpoint = f"{request.method} /{match.route}" if match else f"{request.method} (unresolved)"
+        repeated = recorder.repeated(self.threshold)
+        if repeated:
+            logger.warning("Possible N+1 on %s: %s", endpoint,
+                           "; ".join(f"{count}x {shape[:200]}" for shape, count in repeated.items()))
+        if registry.enabled:  # not switched off (and reset) by this very request
+            registry.record(endpoint, wall_seconds, recorder, repeated)
+
+        response["Server-Timing"] = (
+            f'db;dur={recorder.sql_seconds * 1000:.2f};desc="{recorder.queries} queries", '
+            f"render;dur={recorder.render_seconds * 1000:.2f}, "
+            f"total;dur={wall_seconds * 1000:.2f}"
+        )
+        return response
+
+    async def __acall__(self, request):
+        # Async views run their queries on worker threads' connections, out of the recorder's reach
+        return await self.get_response(request)
+
+    def process_template_response(self, request, response):
+        """Time DRF/template rendering, which runs after the view returns."""
+        recorder = getattr(request, "_query_metrics", None)
+        if recorder is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                recorder.render_seconds += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
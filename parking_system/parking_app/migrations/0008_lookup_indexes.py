@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0007_alter_parkingtransaction_entry_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkingpass',
+            index=models.Index(fields=['vehicle', 'expiry_date'], name='pass_vehicle_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingpass',
+            index=models.Index(fields=['expiry_date'], name='pass_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingpass',
+            index=models.Index(fields=['issue_date'], name='pass_issue_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingtransaction',
+            index=models.Index(condition=models.Q(('exit_time__isnull', True)), fields=['vehicle'], name='txn_open_vehicle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingtransaction',
+            index=models.Index(fields=['entry_time'], name='txn_entry_time_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0008_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='parkingpass',
+            name='pass_issue_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='parkingtransaction',
+            name='txn_entry_time_idx',
+        ),
+        migrations.AddIndex(
+            model_name='owner',
+            index=models.Index(fields=['name', 'id'], name='owner_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingpass',
+            index=models.Index(fields=['issue_date', 'id'], name='pass_issue_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingtransaction',
+            index=models.Index(fields=['entry_time', 'id'], name='txn_entry_time_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0009_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField()),
+                ('notification_type', models.CharField(choices=[('pass_expiry', 'Pass Expired'), ('pass_reminder', 'Pass Expiry Reminder')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('is_read', models.BooleanField(default=False)),
+                ('pass_notified', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='parking_app.parkingpass')),
+                ('recipient', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='parking_app.owner')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('pass_notified', 'notification_type'), name='unique_notification_per_pass')],
+            },
+        ),
+    ]
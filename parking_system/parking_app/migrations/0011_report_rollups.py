@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0010_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehicle_type', models.CharField(choices=[('car', 'Car'), ('bike', 'Bike'), ('other', 'Other')], max_length=10)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('dwell_seconds', models.BigIntegerField(default=0)),
+                ('bucket', models.DateField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'vehicle_type'), name='unique_daily_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehicle_type', models.CharField(choices=[('car', 'Car'), ('bike', 'Bike'), ('other', 'Other')], max_length=10)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('dwell_seconds', models.BigIntegerField(default=0)),
+                ('bucket', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'vehicle_type'), name='unique_hourly_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:39
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_owners(apps, schema_editor):
+    """Fold owners sharing a name into the oldest one before the name becomes unique."""
+    Owner = apps.get_model('parking_app', 'Owner')
+    Vehicle = apps.get_model('parking_app', 'Vehicle')
+    Notification = apps.get_model('parking_app', 'Notification')
+
+    duplicates = Owner.objects.values('name').annotate(keep=Min('id'), n=Count('id')).filter(n__gt=1)
+    for row in duplicates:
+        others = Owner.objects.filter(name=row['name']).exclude(id=row['keep'])
+        Vehicle.objects.filter(owner__in=others).update(owner_id=row['keep'])
+        Notification.objects.filter(recipient__in=others).update(recipient_id=row['keep'])
+        others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0011_report_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_owners, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='owner',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:41
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def close_duplicate_open_transactions(apps, schema_editor):
+    """Keep each vehicle's latest open transaction; void earlier ones left by past double entries."""
+    ParkingTransaction = apps.get_model('parking_app', 'ParkingTransaction')
+    latest = (
+        ParkingTransaction.objects.filter(exit_time__isnull=True)
+        .values('vehicle_id').annotate(keep=Max('id')).values_list('keep', flat=True)
+    )
+    ParkingTransaction.objects.filter(exit_time__isnull=True).exclude(id__in=list(latest)).update(
+        exit_time=F('entry_time'), fees_paid=0, status='Duplicate',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0012_unique_owner_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_open_transactions, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='parkingtransaction',
+            name='txn_open_vehicle_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='parkingtransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('exit_time__isnull', True)), fields=('vehicle',), name='one_open_txn_per_vehicle'),
+        ),
+    ]
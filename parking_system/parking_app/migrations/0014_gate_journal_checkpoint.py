@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0013_one_open_transaction_per_vehicle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GateJournalCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sequence', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0014_gate_journal_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Slot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=20)),
+                ('slot_type', models.CharField(choices=[('car', 'Car'), ('bike', 'Bike')], default='car', max_length=10)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Zone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='parkingtransaction',
+            name='slot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='parking_app.slot'),
+        ),
+        migrations.AddConstraint(
+            model_name='parkingtransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('exit_time__isnull', True)), fields=('slot',), name='one_open_txn_per_slot'),
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='zone',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='parking_app.zone'),
+        ),
+        migrations.AddConstraint(
+            model_name='slot',
+            constraint=models.UniqueConstraint(fields=('zone', 'label'), name='unique_slot_label_per_zone'),
+        ),
+    ]
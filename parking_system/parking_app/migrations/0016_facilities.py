@@ -0,0 +1,134 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:34
+
+import django.db.models.deletion
+import parking_app.models
+from django.conf import settings
+from django.db import migrations, models
+
+PARTITIONED = ['dailyrollup', 'hourlyrollup', 'parkingpass', 'parkingtransaction', 'zone']
+
+
+def assign_default_facility(apps, schema_editor):
+    """Existing passes, stays, bays and rollups all belong to the one lot there was."""
+    Facility = apps.get_model('parking_app', 'Facility')
+    code = settings.DEFAULT_FACILITY
+    facility, _ = Facility.objects.get_or_create(code=code, defaults={'name': code.title()})
+    for model_name in PARTITIONED:
+        apps.get_model('parking_app', model_name).objects.update(facility=facility)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0015_slot_inventory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Facility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(max_length=30, unique=True)),
+                ('name', models.CharField(max_length=255)),
+            ],
+            options={
+                'verbose_name_plural': 'facilities',
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailyrollup',
+            name='unique_daily_rollup',
+        ),
+        migrations.RemoveConstraint(
+            model_name='hourlyrollup',
+            name='unique_hourly_rollup',
+        ),
+        migrations.RemoveIndex(
+            model_name='parkingpass',
+            name='pass_issue_date_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='parkingtransaction',
+            name='txn_entry_time_id_idx',
+        ),
+        migrations.AlterField(
+            model_name='zone',
+            name='name',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='facility',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='parking_app.facility'),
+        ),
+        migrations.AddField(
+            model_name='hourlyrollup',
+            name='facility',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='parking_app.facility'),
+        ),
+        migrations.AddField(
+            model_name='parkingpass',
+            name='facility',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='passes', to='parking_app.facility'),
+        ),
+        migrations.AddField(
+            model_name='parkingtransaction',
+            name='facility',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transactions', to='parking_app.facility'),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='facility',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='zones', to='parking_app.facility'),
+        ),
+        migrations.RunPython(assign_default_facility, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dailyrollup',
+            name='facility',
+            field=models.ForeignKey(default=parking_app.models.current_facility_id, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='parking_app.facility'),
+        ),
+        migrations.AlterField(
+            model_name='hourlyrollup',
+            name='facility',
+            field=models.ForeignKey(default=parking_app.models.current_facility_id, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='parking_app.facility'),
+        ),
+        migrations.AlterField(
+            model_name='parkingpass',
+            name='facility',
+            field=models.ForeignKey(default=parking_app.models.current_facility_id, on_delete=django.db.models.deletion.PROTECT, related_name='passes', to='parking_app.facility'),
+        ),
+        migrations.AlterField(
+            model_name='parkingtransaction',
+            name='facility',
+            field=models.ForeignKey(default=parking_app.models.current_facility_id, on_delete=django.db.models.deletion.PROTECT, related_name='transactions', to='parking_app.facility'),
+        ),
+        migrations.AlterField(
+            model_name='zone',
+            name='facility',
+            field=models.ForeignKey(default=parking_app.models.current_facility_id, on_delete=django.db.models.deletion.PROTECT, related_name='zones', to='parking_app.facility'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingpass',
+            index=models.Index(fields=['facility', 'expiry_date'], name='pass_facility_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingpass',
+            index=models.Index(fields=['facility', 'issue_date', 'id'], name='pass_facility_issue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingtransaction',
+            index=models.Index(fields=['facility', 'entry_time', 'id'], name='txn_facility_entry_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('facility', 'bucket', 'vehicle_type'), name='unique_daily_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlyrollup',
+            constraint=models.UniqueConstraint(fields=('facility', 'bucket', 'vehicle_type'), name='unique_hourly_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='zone',
+            constraint=models.UniqueConstraint(fields=('facility', 'name'), name='unique_zone_name_per_facility'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0016_facilities'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkingtransaction',
+            index=models.Index(condition=models.Q(('exit_time__isnull', True)), fields=['facility', 'vehicle', 'slot'], name='txn_facility_open_idx'),
+        ),
+    ]
@@ -2,15 +2,44 @@ from django.db import models
 from django.utils import timezone
 from datetime import timedelta
 
+from .tariffs import calculate_fee
+
+
+# =========================
+#  FACILITY MODEL
+# =========================
+class Facility(models.Model):
+    """One parking lot; transactions, passes, bays and rollups belong to one (see facilities.py)."""
+    code = models.SlugField(max_length=30, unique=True)
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        verbose_name_plural = "facilities"
+
+    def __str__(self):
+        return self.name
+
+
+def current_facility_id():
+    """Default for the facility columns: the facility of the current request, see facilities.py."""
+    from .facilities import current_facility
+    return current_facility().id
+
 
 # =========================
 #  OWNER MODEL
 # =========================
 class Owner(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
     contact_number = models.CharField(max_length=20, blank=True, null=True)
     email = models.EmailField(blank=True, null=True, unique=False)
 
+    class Meta:
+        indexes = [
+            # Owner listings paginated on (name, id)
+            models.Index(fields=['name', 'id'], name='owner_name_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -44,11 +73,25 @@ class ParkingPass(models.Model):
         ('yearly', 'Yearly'),
     ]
 
+    facility = models.ForeignKey(Facility, on_delete=models.PROTECT, related_name="passes",
+                                 default=current_facility_id)
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name="passes")
     pass_type = models.CharField(max_length=10, choices=PASS_TYPE_CHOICES)
     issue_date = models.DateTimeField(auto_now_add=True)
     expiry_date = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Active-pass check for one vehicle: vehicle = ? AND expiry_date > now
+            models.Index(fields=['vehicle', 'expiry_date'], name='pass_vehicle_expiry_idx'),
+            # Expiry sweeps, which cover every facility
+            models.Index(fields=['expiry_date'], name='pass_expiry_idx'),
+            # A facility's active-pass count and expiry window
+            models.Index(fields=['facility', 'expiry_date'], name='pass_facility_expiry_idx'),
+            # A facility's pass listing, paginated on (-issue_date, -id)
+            models.Index(fields=['facility', 'issue_date', 'id'], name='pass_facility_issue_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         """Automatically calculate expiry_date based on pass_type"""
         if not self.expiry_date:
@@ -70,33 +113,167 @@ class ParkingPass(models.Model):
         return f"Pass for {self.vehicle.vehicle_number} ({self.pass_type})"
 
 
+# =========================
+#  ZONE & SLOT MODELS
+# =========================
+class Zone(models.Model):
+    facility = models.ForeignKey(Facility, on_delete=models.PROTECT, related_name="zones",
+                                 default=current_facility_id)
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facility', 'name'], name='unique_zone_name_per_facility'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Slot(models.Model):
+    """One bay; car bays also take 'other' vehicles (see slots.py)."""
+    SLOT_TYPE_CHOICES = [
+        ('car', 'Car'),
+        ('bike', 'Bike'),
+    ]
+
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name="slots")
+    label = models.CharField(max_length=20)
+    slot_type = models.CharField(max_length=10, choices=SLOT_TYPE_CHOICES, default="car")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zone', 'label'], name='unique_slot_label_per_zone'),
+        ]
+
+    def __str__(self):
+        return f"{self.zone.name}-{self.label} ({self.slot_type})"
+
+
 # =========================
 #  PARKING TRANSACTION MODEL
 # =========================
 class ParkingTransaction(models.Model):
+    facility = models.ForeignKey(Facility, on_delete=models.PROTECT, related_name="transactions",
+                                 default=current_facility_id)
     vehicle = models.ForeignKey('Vehicle', on_delete=models.CASCADE)
+    # The bay held while the stay is open; null when no bays of the vehicle's type are configured
+    slot = models.ForeignKey(Slot, on_delete=models.SET_NULL, null=True, blank=True, related_name="transactions")
     entry_time = models.DateTimeField(default=timezone.now)
     exit_time = models.DateTimeField(null=True, blank=True)
     fees_paid = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     status = models.CharField(max_length=20, default="Parked")
 
-    def calculate_fees(self):
+    class Meta:
+        constraints = [
+            # At most one open transaction per vehicle, across facilities; also
+            # the index behind entry/exit checks and occupancy counts
+            models.UniqueConstraint(fields=['vehicle'], condition=models.Q(exit_time__isnull=True),
+                                    name='one_open_txn_per_vehicle'),
+            # A bay holds at most one open stay, even when two processes hand out the same bay
+            models.UniqueConstraint(fields=['slot'], condition=models.Q(exit_time__isnull=True),
+                                    name='one_open_txn_per_slot'),
+        ]
+        indexes = [
+            # A facility's transactions today, and its listings paginated on (-entry_time, -id)
+            models.Index(fields=['facility', 'entry_time', 'id'], name='txn_facility_entry_idx'),
+            # A facility's open stays (occupancy counts and held bays), without reading its history
+            models.Index(fields=['facility', 'vehicle', 'slot'], condition=models.Q(exit_time__isnull=True),
+                         name='txn_facility_open_idx'),
+        ]
+
+    def calculate_fees(self, vehicle_type=None):
+        """Fee for this stay under the configured tariffs (see tariffs.py).
+
+        Pass `vehicle_type` when it is already known to avoid loading the vehicle.
+        """
         if not self.exit_time:
             self.exit_time = timezone.now()
 
-        duration = self.exit_time - self.entry_time
-        hours = duration.total_seconds() / 3600
+        return calculate_fee(self.entry_time, self.exit_time, vehicle_type or self.vehicle.vehicle_type)
+
+    def __str__(self):
+        return f"{self.vehicle.vehicle_number} - {self.status}"
+
+
+# =========================
+#  NOTIFICATION MODEL
+# =========================
+class Notification(models.Model):
+    NOTIFICATION_TYPE_CHOICES = [
+        ('pass_expiry', 'Pass Expired'),
+        ('pass_reminder', 'Pass Expiry Reminder'),
+    ]
 
-        # fee per hour depending on vehicle type
-        if self.vehicle.vehicle_type == "car":
-            rate = 20
-        elif self.vehicle.vehicle_type == "bike":
-            rate = 10
-        else:
-            rate = 15
+    recipient = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name="notifications", null=True, blank=True)
+    pass_notified = models.ForeignKey(ParkingPass, on_delete=models.CASCADE, related_name="notifications")
+    message = models.TextField()
+    notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPE_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    is_read = models.BooleanField(default=False)
 
-        # round up minimum 1 hour
-        return round(max(1, hours) * rate, 2)
+    class Meta:
+        constraints = [
+            # One notification of each type per pass, so sweeps can insert with ignore_conflicts
+            models.UniqueConstraint(fields=['pass_notified', 'notification_type'],
+                                    name='unique_notification_per_pass'),
+        ]
 
     def __str__(self):
-        return f"{self.vehicle.vehicle_number} - {self.status}"
+        return f"{self.get_notification_type_display()} for pass {self.pass_notified_id}"
+
+
+# =========================
+#  REPORT ROLLUP MODELS
+# =========================
+class Rollup(models.Model):
+    """Completed stays per facility, time bucket and vehicle type, maintained on exit (see rollups.py)."""
+    facility = models.ForeignKey(Facility, on_delete=models.PROTECT, related_name="+", default=current_facility_id)
+    vehicle_type = models.CharField(max_length=10, choices=Vehicle.VEHICLE_TYPE_CHOICES)
+    transactions = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    dwell_seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average_dwell_minutes(self):
+        return round(self.dwell_seconds / self.transactions / 60, 1) if self.transactions else 0.0
+
+
+class HourlyRollup(Rollup):
+    bucket = models.DateTimeField()  # start of the local hour the vehicles left in
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facility', 'bucket', 'vehicle_type'], name='unique_hourly_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket:%Y-%m-%d %H:00} {self.vehicle_type}"
+
+
+class DailyRollup(Rollup):
+    bucket = models.DateField()  # local date the vehicles left on
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facility', 'bucket', 'vehicle_type'], name='unique_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket} {self.vehicle_type}"
+
+
+# =========================
+#  GATE JOURNAL CHECKPOINT
+# =========================
+class GateJournalCheckpoint(models.Model):
+    """Last journal sequence number applied to the database, per journal file (see journal.py)."""
+    name = models.CharField(max_length=255, unique=True)
+    sequence = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.sequence}"
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .facilities import current_facility, facility_alias
+from .models import ParkingTransaction, Vehicle
+from .routers import primary
+
+logger = logging.getLogger(__name__)
+
+VEHICLE_TYPES = [choice for choice, _ in Vehicle.VEHICLE_TYPE_CHOICES]
+
+
+# ======================================================
+# ========== OCCUPANCY LEDGER ==========================
+# ======================================================
+class OccupancyLedger:
+    """
+    In-memory count of parked vehicles per facility and vehicle type.
+
+    Every method works on the current facility (see facilities.py). The
+    counts are rebuilt from the open transactions on first use and are then
+    adjusted by the entry/exit paths once their writes commit. Every
+    OCCUPANCY_CHECK_INTERVAL seconds a read re-counts the open transactions,
+    logs any drift and adopts the database figures.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}       # facility id -> {vehicle type: parked vehicles}
+        self._checked_at = {}   # facility id -> when its counts were last taken from the database
+        self.last_drift = {}    # facility id -> the drift its last check found
+
+    @staticmethod
+    def count_from_db():
+        counts = dict.fromkeys(VEHICLE_TYPES, 0)
+        # The ledger is the source of truth for every request, so never count a lagging replica
+        with primary():
+            rows = list(
+                ParkingTransaction.objects.filter(facility_id=current_facility().id, exit_time__isnull=True)
+                .values_list("vehicle__vehicle_type")
+                .annotate(n=Count("id"))
+                .order_by()
+            )
+        for vehicle_type, n in rows:
+            counts[vehicle_type] = n
+        return counts
+
+    def rebuild(self):
+        facility_id = current_facility().id
+        counts = self.count_from_db()
+        with self._lock:
+            self._counts[facility_id] = counts
+            self._checked_at[facility_id] = time.monotonic()
+        return dict(counts)
+
+    def check(self):
+        """Compare the ledger with the database and return the drift per type."""
+        facility_id = current_facility().id
+        fresh = self.count_from_db()
+        with self._lock:
+            current = self._counts.get(facility_id) or {}
+            drift = {
+                vehicle_type: current.get(vehicle_type, 0) - n
+                for vehicle_type, n in fresh.items()
+                if current.get(vehicle_type, 0) != n
+            }
+            self._counts[facility_id] = fresh
+            self._checked_at[facility_id] = time.monotonic()
+            self.last_drift[facility_id] = drift
+
+        if drift:
+            logger.warning("Occupancy ledger drifted from the database: %s", drift)
+        return drift
+
+    def reset(self):
+        with self._lock:
+            self._counts = {}
+            self._checked_at = {}
+            self.last_drift = {}
+
+    def _ensure_fresh(self, facility_id):
+        interval = getattr(settings, "OCCUPANCY_CHECK_INTERVAL", 60)
+        if facility_id not in self._counts:
+            self.rebuild()
+        elif time.monotonic() - self._checked_at[facility_id] >= interval:
+            self.check()
+
+    def snapshot(self):
+        facility_id = current_facility().id
+        self._ensure_fresh(facility_id)
+        with self._lock:
+            return dict(self._counts[facility_id])
+
+    def occupied(self, *vehicle_types):
+        counts = self.snapshot()
+        if not vehicle_types:
+            return sum(counts.values())
+        return sum(counts.get(vehicle_type, 0) for vehicle_type in vehicle_types)
+
+    def _adjust(self, facility_id, vehicle_type, delta):
+        with self._lock:
+            counts = self._counts.get(facility_id)
+            # Not loaded yet: the first read will count this row from the table.
+            if counts is None:
+                return
+            counts[vehicle_type] = max(0, counts.get(vehicle_type, 0) + delta)
+
+    def record_entry(self, vehicle_type, count=1):
+        facility_id = current_facility().id
+        transaction.on_commit(lambda: self._adjust(facility_id, vehicle_type, count), using=facility_alias())
+
+    def record_exit(self, vehicle_type, count=1):
+        facility_id = current_facility().id
+        transaction.on_commit(lambda: self._adjust(facility_id, vehicle_type, -count), using=facility_alias())
+
+
+ledger = OccupancyLedger()
@@ -0,0 +1,34 @@
+from django.db import transaction
+
+from .facilities import facility_alias
+from .models import Owner
+
+GUEST_OWNER_NAME = 'Guest'
+
+_guest_owner_ids = {}  # database alias -> id of its Guest owner
+
+
+def upsert_owner(name):
+    """
+    The owner called `name`, created if missing. A single INSERT .. ON CONFLICT
+    on the unique name, so concurrent requests can neither duplicate the row
+    nor race each other's get().
+    """
+    owner = Owner(name=name)
+    Owner.objects.bulk_create([owner], update_conflicts=True, unique_fields=['name'], update_fields=['name'])
+    return owner
+
+
+def guest_owner_id():
+    """Id of the shared Guest owner for walk-in vehicles, resolved once per process and database."""
+    alias = facility_alias()
+    owner_id = _guest_owner_ids.get(alias)
+    if owner_id is None:
+        owner_id = upsert_owner(GUEST_OWNER_NAME).pk
+        # Remember it only once committed, so a rolled-back insert is never reused
+        transaction.on_commit(lambda: _guest_owner_ids.setdefault(alias, owner_id), using=alias)
+    return owner_id
+
+
+def reset_guest_owner():
+    _guest_owner_ids.clear()
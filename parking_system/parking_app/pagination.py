@@ -0,0 +1,157 @@
+import base64
+import json
+import operator
+from collections import OrderedDict
+from functools import reduce
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# =====================================================
+# ========== KEYSET PAGINATION ========================
+# =====================================================
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on a unique, indexed ordering such as
+    (entry_time, id).
+
+    The cursor carries the key of the last row served, and the next page is
+    fetched with `WHERE (entry_time, id) < (last_entry_time, last_id)`, so a
+    page deep into the history costs the same as the first one.
+    """
+    ordering = ('-id',)
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        self.model = queryset.model
+
+        position, reverse = self.decode_cursor(request)
+        ordering = [self._invert(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position, ordering))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.first_position = self._position(rows[0]) if rows else position
+        self.last_position = self._position(rows[-1]) if rows else position
+        return rows
+
+    def get_page_size(self, request):
+        default = self.page_size or getattr(settings, 'API_PAGE_SIZE', 50)
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return default
+        return min(max(size, 1), self.max_page_size)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self._link(self.last_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self._link(self.first_position, reverse=True)
+
+    # --- cursor encoding -------------------------------------------------
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            values = payload['p']
+            if len(values) != len(self.fields):
+                raise ValueError(values)
+            position = [
+                self.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+            return position, bool(payload.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _link(self, position, reverse):
+        url = self.request.build_absolute_uri()
+        if position is None:
+            return remove_query_param(url, self.cursor_query_param)
+        payload = {'p': [self._encode_value(value) for value in position]}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode('ascii')
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    @staticmethod
+    def _encode_value(value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    # --- keyset helpers --------------------------------------------------
+
+    def _position(self, row):
+        if isinstance(row, dict):
+            return [row[field] for field in self.fields]
+        return [getattr(row, field) for field in self.fields]
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def _after(self, position, ordering):
+        """Rows strictly after `position` in `ordering`, compared lexicographically."""
+        conditions = []
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            conditions.append(equal & Q(**{f'{name}__{lookup}': value}))
+            equal &= Q(**{name: value})
+        return reduce(operator.or_, conditions)
+
+
+class TransactionPagination(KeysetPagination):
+    ordering = ('-entry_time', '-id')
+
+
+class PassPagination(KeysetPagination):
+    ordering = ('-issue_date', '-id')
+
+
+class OwnerPagination(KeysetPagination):
+    ordering = ('name', 'id')
+
+
+class VehiclePagination(KeysetPagination):
+    ordering = ('vehicle_number', 'id')
@@ -0,0 +1,267 @@
+"""
+Fuzzy plate search for ANPR misreads.
+
+Cameras confuse look-alike characters (O/0, I/1, B/8, ...) and now and then
+drop, add or swap a character. canonical() folds each group of look-alikes
+onto one character. A plate misread only in look-alikes therefore has the
+same canonical form as the real plate.
+
+PlateIndex finds the registered plates whose canonical form is within one
+edit of a query's: a substitution, an insertion, a deletion or a swap of
+two neighbouring characters. Each canonical form is split into three
+segments. A single edit changes at most one segment, so the other two stay
+aligned with the query. The index keeps three keys per form: the first two
+segments, the last two, and the outer two. A query of length m looks up those
+keys for lengths m-1, m and m+1, and tries its m-1 swaps as exact forms.
+It then checks the handful of candidates with an edit-distance test. A
+search is a few dozen dict lookups whatever the number of plates.
+
+The index holds the plates of one database and is loaded on first use.
+Plates registered through the ORM in this process are added when they commit
+(see apps.ready). Plates registered elsewhere, or by bulk inserts, are
+picked up every PLATE_INDEX_REFRESH seconds by loading the vehicles past the
+highest id seen. A renamed or deleted plate may linger until the index is
+reset. Matches against parked vehicles are always checked against the
+transaction table.
+"""
+import re
+import threading
+import time
+from itertools import islice
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import plates
+from .facilities import current_facility, facility_alias
+from .models import ParkingTransaction, Vehicle
+from .routers import primary
+
+# Each look-alike letter maps to the digit cameras confuse it with
+CONFUSABLES = str.maketrans('ODQIL|BSZG', '0001118526')
+_NOT_ALNUM = re.compile(r'[^A-Z0-9]')
+
+
+def canonical(plate):
+    """`plate` upper-cased, without spaces or punctuation, and with look-alikes folded."""
+    return _NOT_ALNUM.sub('', plate.upper()).translate(CONFUSABLES)
+
+
+def within_one_edit(a, b):
+    """Whether a and b differ by at most one substitution, insertion, deletion or adjacent swap."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return a[i + 1:] == b[i + 1:] or (a[i + 1:i + 2] == b[i:i + 1] and a[i] == b[i + 1] and a[i + 2:] == b[i + 2:])
+
+
+def _segment_keys(form):
+    n = len(form)
+    a = n // 3
+    if not a:
+        return [f'{n}={form}']
+    return [f'{n}<{form[:n - a]}', f'{n}>{form[a:]}', f'{n}|{form[:a]}|{form[n - a:]}']
+
+
+def _query_keys(form):
+    m = len(form)
+    keys = []
+    for n in (m - 1, m, m + 1):
+        a = n // 3
+        if n <= 0:
+            continue
+        if not a:
+            keys.append(f'{n}={form}')
+            continue
+        keys += [f'{n}<{form[:n - a]}', f'{n}>{form[m - (n - a):]}', f'{n}|{form[:a]}|{form[m - a:]}']
+    return keys
+
+
+def _add(bucket, key, value):
+    # A single value is stored bare; most keys hold one plate, and a list each would triple the memory
+    current = bucket.get(key)
+    if current is None:
+        bucket[key] = value
+    elif isinstance(current, list):
+        if value not in current:
+            current.append(value)
+    elif current != value:
+        bucket[key] = [current, value]
+
+
+def _remove(bucket, key, value):
+    current = bucket.get(key)
+    if current == value:
+        del bucket[key]
+    elif isinstance(current, list) and value in current:
+        current.remove(value)
+        if len(current) == 1:
+            bucket[key] = current[0]
+
+
+def _values(bucket, key):
+    current = bucket.get(key)
+    if current is None:
+        return ()
+    return current if isinstance(current, list) else (current,)
+
+
+class PlateMatch(NamedTuple):
+    vehicle_number: str
+    distance: int  # 0: same canonical form, 1: one edit apart
+
+
+# ======================================================
+# ========== PLATE INDEX ===============================
+# ======================================================
+class PlateIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._plates = {}   # canonical form -> plate(s)
+        self._forms = {}    # segment key -> canonical form(s)
+        self.max_id = 0
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self._plates)
+
+    def add(self, plate):
+        self.add_many([plate])
+
+    def add_many(self, plates):
+        with self._lock:
+            for plate in plates:
+                form = canonical(plate)
+                if form not in self._plates:
+                    for key in _segment_keys(form):
+                        _add(self._forms, key, form)
+                _add(self._plates, form, plate)
+
+    def discard(self, plate):
+        form = canonical(plate)
+        with self._lock:
+            _remove(self._plates, form, plate)
+            if form not in self._plates:
+                for key in _segment_keys(form):
+                    _remove(self._forms, key, form)
+
+    def search(self, plate, max_distance=1, limit=10):
+        """Registered plates within `max_distance` (0 or 1) edits of `plate`'s canonical form, nearest first."""
+        form = canonical(plate)
+        with self._lock:
+            matches = [PlateMatch(found, 0) for found in _values(self._plates, form)]
+            if max_distance:
+                near = set()
+                for key in _query_keys(form):
+                    near.update(_values(self._forms, key))
+                near.update(form[:i] + form[i + 1] + form[i] + form[i + 2:] for i in range(len(form) - 1))
+                near.discard(form)
+                for other in near:
+                    if other in self._plates and within_one_edit(form, other):
+                        matches += [PlateMatch(found, 1) for found in _values(self._plates, other)]
+        # The plate as read first, then by distance
+        matches.sort(key=lambda match: (match.vehicle_number != plate, match.distance, match.vehicle_number))
+        return matches[:limit]
+
+    # ---------- loading ----------
+    def refresh(self, chunk_size=10000):
+        """Add the vehicles registered since the last load; returns how many."""
+        # A lagging replica would only delay new plates, but the primary is what the gates write
+        with primary():
+            rows = (
+                Vehicle.objects.filter(id__gt=self.max_id).order_by('id')
+                .values_list('id', 'vehicle_number').iterator(chunk_size=chunk_size)
+            )
+            added = 0
+            for chunk in iter(lambda: list(islice(rows, chunk_size)), []):
+                self.add_many(plate for _, plate in chunk)
+                self.max_id = chunk[-1][0]
+                added += len(chunk)
+        self.loaded_at = time.monotonic()
+        return added
+
+    def ensure_fresh(self):
+        interval = getattr(settings, 'PLATE_INDEX_REFRESH', 60)
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= interval:
+            self.refresh()
+        return self
+
+
+_indexes = {}  # database alias -> PlateIndex
+_indexes_lock = threading.Lock()
+
+
+def plate_index():
+    """The index of the current facility's database, loaded on first use."""
+    alias = facility_alias()
+    with _indexes_lock:
+        index = _indexes.get(alias)
+        if index is None:
+            index = _indexes[alias] = PlateIndex()
+    return index.ensure_fresh()
+
+
+def reset_plate_index():
+    with _indexes_lock:
+        _indexes.clear()
+
+
+# ======================================================
+# ========== PARKED VEHICLES ===========================
+# ======================================================
+def parked_matches(plate, max_distance=1, limit=5):
+    """Matches for `plate` among the vehicles parked at the current facility; one query."""
+    matches = plate_index().search(plate, max_distance, limit=50)
+    if not matches:
+        return []
+    parked = set(
+        ParkingTransaction.objects.filter(
+            facility_id=current_facility().id, exit_time__isnull=True,
+            vehicle__vehicle_number__in=[match.vehicle_number for match in matches],
+        ).values_list('vehicle__vehicle_number', flat=True)
+    )
+    return [match for match in matches if match.vehicle_number in parked][:limit]
+
+
+def match_parked(plate):
+    """
+    The parked vehicle a misread exit most likely belongs to: the only one
+    at the current facility whose canonical form equals the read's. None if
+    there is no such vehicle, or more than one, or if the read is itself a
+    registered plate: a repeated exit read of a car that has left, or a car
+    that never entered, must not close another car's stay.
+    """
+    if plates.lookup(plate) is not None:
+        return None
+    matches = [match for match in parked_matches(plate, max_distance=0) if match.vehicle_number != plate]
+    return matches[0].vehicle_number if len(matches) == 1 else None
+
+
+# ======================================================
+# ========== INVALIDATION ==============================
+# ======================================================
+def _vehicle_saved(sender, instance, created=False, **kwargs):
+    index = _indexes.get(facility_alias())
+    if index is not None:
+        transaction.on_commit(lambda: index.add(instance.vehicle_number), using=facility_alias())
+
+
+def _vehicle_deleted(sender, instance, **kwargs):
+    index = _indexes.get(facility_alias())
+    if index is not None:
+        transaction.on_commit(lambda: index.discard(instance.vehicle_number), using=facility_alias())
+
+
+def connect_signals():
+    post_save.connect(_vehicle_saved, sender=Vehicle, dispatch_uid='plate_search.vehicle_saved')
+    post_delete.connect(_vehicle_deleted, sender=Vehicle, dispatch_uid='plate_search.vehicle_deleted')
@@ -0,0 +1,117 @@
+"""
+Hot plate lookups for the gate paths.
+
+A bounded LRU maps (facility id, plate number) -> (vehicle id, vehicle type,
+latest pass expiry at that facility), so a regular's entry or exit needs no vehicle or pass read. An
+entry lives for PLATE_CACHE_TTL seconds, or only until the pass expires if
+that is sooner, so the pass decision never outlives the pass. Saving or
+deleting a vehicle or pass through the ORM evicts the vehicle's entry (see
+apps.ready). Queryset .update()/bulk writes bypass those signals and are
+bounded by the TTL.
+"""
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .facilities import current_facility, facility_alias
+from .lru import LRUCache
+from .models import Vehicle, ParkingPass
+from .owners import guest_owner_id
+
+
+class PlateInfo(NamedTuple):
+    vehicle_id: int
+    vehicle_type: str
+    pass_expiry: Optional[datetime]
+
+    def has_pass(self, at=None):
+        return self.pass_expiry is not None and self.pass_expiry > (at or timezone.now())
+
+
+plate_cache = LRUCache(
+    maxsize=getattr(settings, 'PLATE_CACHE_SIZE', 10000),
+    default_ttl=getattr(settings, 'PLATE_CACHE_TTL', 300),
+)
+
+
+def _remember(key, info):
+    ttl = plate_cache.default_ttl
+    if info.has_pass():
+        ttl = min(ttl, (info.pass_expiry - timezone.now()).total_seconds())
+    # Only cache what has committed, so a rolled-back vehicle is never served
+    # Tagged with the vehicle, so its entries at every facility can be evicted without a scan
+    transaction.on_commit(lambda: plate_cache.set(key, info, ttl, tag=info.vehicle_id), using=facility_alias())
+
+
+def lookup(vehicle_number):
+    """Cached PlateInfo for an upper-cased plate at the current facility, or None if the vehicle is unknown."""
+    facility_id = current_facility().id
+    key = (facility_id, vehicle_number)
+    info = plate_cache.get(key)
+    if info is not None:
+        return info
+    row = (
+        Vehicle.objects.filter(vehicle_number=vehicle_number)
+        .annotate(pass_expiry=Max('passes__expiry_date', filter=Q(passes__facility_id=facility_id)))
+        .values_list('id', 'vehicle_type', 'pass_expiry')
+        .first()
+    )
+    if row is None:
+        return None
+    info = PlateInfo(*row)
+    _remember(key, info)
+    return info
+
+
+def resolve(vehicle_number, vehicle_type='car', guest_owner=True):
+    """
+    PlateInfo for an upper-cased plate, registering an unknown plate as a
+    new vehicle of `vehicle_type` (owned by 'Guest' unless guest_owner is False).
+    """
+    info = lookup(vehicle_number)
+    if info is not None:
+        return info
+    vehicle, created = Vehicle.objects.get_or_create(
+        vehicle_number=vehicle_number,
+        defaults={'owner_id': guest_owner_id() if guest_owner else None, 'vehicle_type': vehicle_type}
+    )
+    if not created:
+        # Registered concurrently; it may already hold a pass
+        return lookup(vehicle_number)
+    info = PlateInfo(vehicle.id, vehicle.vehicle_type, None)
+    _remember((current_facility().id, vehicle_number), info)
+    return info
+
+
+# ======================================================
+# ========== INVALIDATION ==============================
+# ======================================================
+def evict_vehicle(vehicle_id):
+    plate_cache.discard_tag(vehicle_id)
+
+
+def _evict(vehicle_id):
+    evict_vehicle(vehicle_id)
+    # Again at commit, in case another request re-cached the old state meanwhile
+    transaction.on_commit(lambda: evict_vehicle(vehicle_id), using=facility_alias())
+
+
+def _vehicle_saved(sender, instance, created=False, **kwargs):
+    if not created:
+        _evict(instance.pk)
+
+
+def _pass_changed(sender, instance, **kwargs):
+    _evict(instance.vehicle_id)
+
+
+def connect_signals():
+    post_save.connect(_vehicle_saved, sender=Vehicle, dispatch_uid='plates.vehicle_saved')
+    post_delete.connect(_vehicle_saved, sender=Vehicle, dispatch_uid='plates.vehicle_deleted')
+    post_save.connect(_pass_changed, sender=ParkingPass, dispatch_uid='plates.pass_saved')
+    post_delete.connect(_pass_changed, sender=ParkingPass, dispatch_uid='plates.pass_deleted')
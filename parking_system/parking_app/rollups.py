@@ -0,0 +1,108 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncHour
+from django.utils import timezone
+
+from .facilities import current_facility, facility_alias
+from .models import HourlyRollup, DailyRollup, ParkingTransaction
+from .stats import start_of_day
+
+
+def hour_bucket(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(moment):
+    return timezone.localdate(moment)
+
+
+# ======================================================
+# ========== INCREMENTAL MAINTENANCE ===================
+# ======================================================
+def record_exits(exits):
+    """
+    Fold completed stays at the current facility into the hourly and daily rollups.
+
+    `exits` is an iterable of (vehicle_type, entry_time, exit_time, fee).
+    Call it inside the transaction that closes the stays so the rollups
+    commit (or roll back) with them.
+    """
+    hourly = defaultdict(lambda: [0, Decimal('0'), 0])
+    daily = defaultdict(lambda: [0, Decimal('0'), 0])
+    for vehicle_type, entry_time, exit_time, fee in exits:
+        dwell = max(0, int((exit_time - entry_time).total_seconds()))
+        fee = Decimal(str(fee or 0))
+        for totals in (hourly[hour_bucket(exit_time), vehicle_type], daily[day_bucket(exit_time), vehicle_type]):
+            totals[0] += 1
+            totals[1] += fee
+            totals[2] += dwell
+
+    facility_id = current_facility().id
+    for model, totals in ((HourlyRollup, hourly), (DailyRollup, daily)):
+        for (bucket, vehicle_type), (count, revenue, dwell) in totals.items():
+            _increment(model, facility_id, bucket, vehicle_type, count, revenue, dwell)
+
+
+def record_exit(vehicle_type, entry_time, exit_time, fee):
+    record_exits([(vehicle_type, entry_time, exit_time, fee)])
+
+
+def _increment(model, facility_id, bucket, vehicle_type, count, revenue, dwell):
+    changes = {
+        'transactions': F('transactions') + count,
+        'revenue': F('revenue') + revenue,
+        'dwell_seconds': F('dwell_seconds') + dwell,
+    }
+    rows = model.objects.filter(facility_id=facility_id, bucket=bucket, vehicle_type=vehicle_type)
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic(using=facility_alias()):
+            model.objects.create(facility_id=facility_id, bucket=bucket, vehicle_type=vehicle_type,
+                                 transactions=count, revenue=revenue, dwell_seconds=dwell)
+    except IntegrityError:
+        # Another writer created the bucket first
+        rows.update(**changes)
+
+
+# ======================================================
+# ========== BACKFILL ==================================
+# ======================================================
+def rebuild_rollups(first_day, last_day):
+    """
+    Recompute the current facility's rollups for exits on the local dates
+    first_day..last_day (inclusive) from the transaction table, replacing
+    what was stored.
+    """
+    facility_id = current_facility().id
+    start, end = start_of_day(first_day), start_of_day(last_day + timedelta(days=1))
+    closed = ParkingTransaction.objects.filter(facility_id=facility_id, exit_time__gte=start, exit_time__lt=end)
+    dwell = ExpressionWrapper(F('exit_time') - F('entry_time'), output_field=DurationField())
+    totals = {
+        'transactions': Count('id'),
+        'revenue': Coalesce(Sum('fees_paid'), Decimal('0')),
+        'dwell': Sum(dwell),
+    }
+
+    counts = {}
+    with transaction.atomic(using=facility_alias()):
+        for model, trunc in ((HourlyRollup, TruncHour('exit_time')), (DailyRollup, TruncDate('exit_time'))):
+            rows = closed.annotate(bucket=trunc).values('bucket', 'vehicle__vehicle_type').annotate(**totals).order_by()
+            stored = model.objects.filter(facility_id=facility_id)
+            if model is HourlyRollup:
+                stored.filter(bucket__gte=start, bucket__lt=end).delete()
+            else:
+                stored.filter(bucket__gte=first_day, bucket__lte=last_day).delete()
+            objs = [
+                model(facility_id=facility_id, bucket=row['bucket'], vehicle_type=row['vehicle__vehicle_type'],
+                      transactions=row['transactions'], revenue=row['revenue'],
+                      dwell_seconds=int(row['dwell'].total_seconds()) if row['dwell'] else 0)
+                for row in rows
+            ]
+            model.objects.bulk_create(objs, batch_size=1000)
+            counts[model.__name__] = len(objs)
+    return counts
@@ -0,0 +1,141 @@
+"""
+Primary/replica routing.
+
+Every write, and by default every read, goes to 'default'. Views that only
+list or summarise (see ReplicaReadMixin) may read from one of the aliases in
+settings.DATABASE_REPLICAS. Two things keep those reads on the primary:
+
+* a write earlier in the same request, and
+* a write by the same client within REPLICA_PIN_SECONDS.
+  ReadYourWritesMiddleware marks the client with a short-lived cookie after
+  any successful unsafe request, so it reads its own writes while the
+  replica catches up.
+
+A facility listed in FACILITY_DATABASES (see facilities.py) has its
+parking_app queries sent to its own alias, which has no replicas; that
+includes its vehicles and owners. Facility rows, users, tokens and sessions
+always live in 'default'.
+
+The routing state lives in context variables, so it is per thread and per
+async task.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .facilities import facility_database
+from .models import Facility
+
+PRIMARY = 'default'
+PIN_COOKIE = 'parking_primary_until'
+
+_replica_ok = ContextVar('replica_ok', default=False)
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _partitioned(model):
+            return PRIMARY
+        database = facility_database()
+        if database:
+            return database
+        replicas = settings.DATABASE_REPLICAS
+        if replicas and _replica_ok.get() and not _pinned.get():
+            return random.choice(replicas)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        if not _partitioned(model):
+            return PRIMARY
+        # Whatever this request reads next must see what it just wrote
+        _pinned.set(True)
+        return facility_database() or PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+def _partitioned(model):
+    """Whether a facility with its own database keeps rows of `model` there."""
+    return model._meta.app_label == 'parking_app' and model is not Facility
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside this block, whatever the view allows."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_ok.set(True)
+    try:
+        yield
+    finally:
+        _replica_ok.reset(token)
+
+
+class ReplicaReadMixin:
+    """For read-only API views whose queries may be served by a replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+
+# ======================================================
+# ========== READ-YOUR-WRITES ==========================
+# ======================================================
+class ReadYourWritesMiddleware:
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _pinned.set(self._pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._pin(request, response)
+
+    async def __acall__(self, request):
+        token = _pinned.set(self._pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._pin(request, response)
+
+    @staticmethod
+    def _pinned(request):
+        pinned_until = request.COOKIES.get(PIN_COOKIE)
+        try:
+            return float(pinned_until) > time.time()
+        except (TypeError, ValueError):
+            return False
+
+    def _pin(self, request, response):
+        if request.method not in self.SAFE_METHODS and response.status_code < 400:
+            seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+            response.set_cookie(PIN_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds,
+                                httponly=True, samesite='Lax')
+        return response
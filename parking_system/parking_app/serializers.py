@@ -1,4 +1,9 @@
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.response import Response
 from .models import Owner, Vehicle, ParkingPass, ParkingTransaction
 
 
@@ -37,6 +42,127 @@ class ParkingTransactionSerializer(serializers.ModelSerializer):
         fields = ["id", "vehicle_number", "owner_name", "entry_time", "exit_time", "fees_paid", "status"]
 
 
+# =====================================================
+# ========== FLAT SERIALIZERS (values() rows) =========
+# =====================================================
+
+class ValuesSerializer(ABC):
+    """
+    Read-only counterpart of a ModelSerializer for `queryset.values(*columns)`
+    rows.
+
+    It builds the same dicts without model instances or a serializer field
+    per value, which is most of the cost of a large listing. Dates and
+    decimals still go through DRF's own fields, so they render identically.
+    `relation` prefixes the columns when the rows come from a related model.
+    Create one per listing: it fixes the active time zone when created.
+    Subclasses name their `lookups` and build a row's dict in
+    to_representation().
+    """
+    lookups = ()
+
+    def __init__(self, relation=''):
+        self.prefix = f'{relation}__' if relation else ''
+        self.columns = [self.prefix + lookup for lookup in self.lookups]
+        # Looking the zone up once, not per value, is most of the datetime cost
+        self.datetime = serializers.DateTimeField(default_timezone=timezone.get_current_timezone()).to_representation
+
+    @abstractmethod
+    def to_representation(self, row):
+        """The dict for one values() row, as the matching ModelSerializer would render it."""
+
+    def many(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+_fee = serializers.DecimalField(max_digits=8, decimal_places=2).to_representation
+
+
+class OwnerValuesSerializer(ValuesSerializer):
+    lookups = ('id', 'name', 'contact_number', 'email')
+
+    def to_representation(self, row):
+        id_, name, contact_number, email = self.columns
+        if row[id_] is None:
+            return None  # a vehicle without an owner
+        return {'id': row[id_], 'name': row[name], 'contact_number': row[contact_number], 'email': row[email]}
+
+
+class VehicleValuesSerializer(ValuesSerializer):
+    lookups = ('id', 'vehicle_number', 'vehicle_type')
+
+    def __init__(self, relation=''):
+        super().__init__(relation)
+        self.owner = OwnerValuesSerializer(self.prefix + 'owner')
+        self.own_columns = tuple(self.columns)
+        self.columns += self.owner.columns
+
+    def to_representation(self, row):
+        id_, vehicle_number, vehicle_type = self.own_columns
+        return {
+            'id': row[id_],
+            'vehicle_number': row[vehicle_number],
+            'vehicle_type': row[vehicle_type],
+            'owner': self.owner.to_representation(row),
+        }
+
+
+class ParkingPassValuesSerializer(ValuesSerializer):
+    lookups = ('id', 'pass_type', 'issue_date', 'expiry_date')
+
+    def __init__(self, relation=''):
+        super().__init__(relation)
+        self.vehicle = VehicleValuesSerializer(self.prefix + 'vehicle')
+        self.own_columns = tuple(self.columns)
+        self.columns += self.vehicle.columns
+
+    def to_representation(self, row):
+        id_, pass_type, issue_date, expiry_date = self.own_columns
+        issued, expires = row[issue_date], row[expiry_date]
+        return {
+            'id': row[id_],
+            'vehicle': self.vehicle.to_representation(row),
+            'pass_type': row[pass_type],
+            'issue_date': self.datetime(issued) if issued is not None else None,
+            'expiry_date': self.datetime(expires) if expires is not None else None,
+        }
+
+
+class ParkingTransactionValuesSerializer(ValuesSerializer):
+    lookups = ('id', 'vehicle__vehicle_number', 'vehicle__owner__id', 'vehicle__owner__name',
+               'entry_time', 'exit_time', 'fees_paid', 'status')
+
+    def to_representation(self, row):
+        id_, vehicle_number, owner_id, owner_name, entry_time, exit_time, fees_paid, status = self.columns
+        data = {'id': row[id_], 'vehicle_number': row[vehicle_number]}
+        if row[owner_id] is not None:
+            # ParkingTransactionSerializer leaves owner_name out for a vehicle without an owner
+            data['owner_name'] = row[owner_name]
+        entered, exited, fee = row[entry_time], row[exit_time], row[fees_paid]
+        data['entry_time'] = self.datetime(entered) if entered is not None else None
+        data['exit_time'] = self.datetime(exited) if exited is not None else None
+        data['fees_paid'] = _fee(fee) if fee is not None else None
+        data['status'] = row[status]
+        return data
+
+
+class ValuesListMixin:
+    """
+    For ListAPIViews: list through `values_serializer_class`, which renders
+    the same JSON as `serializer_class` from values() rows. The keyset
+    paginators read their cursor from the row dicts.
+    """
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.values_serializer_class()
+        queryset = self.filter_queryset(self.get_queryset()).values(*serializer.columns)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(serializer.many(queryset))
+        return self.get_paginated_response(serializer.many(page))
+
+
 
 # =====================================================
 # ========== REQUEST SERIALIZERS ======================
@@ -69,3 +195,86 @@ class VehicleEntryRequestSerializer(serializers.Serializer):
 
 class VehicleExitRequestSerializer(serializers.Serializer):
     vehicle_number = serializers.CharField(max_length=20)
+
+
+class GateEventSerializer(serializers.Serializer):
+    vehicle_number = serializers.CharField(max_length=20)
+    action = serializers.ChoiceField(choices=[
+        ('entry', 'Entry'),
+        ('exit', 'Exit')
+    ])
+    vehicle_type = serializers.ChoiceField(required=False, default='car', choices=[
+        ('car', 'Car'),
+        ('bike', 'Bike'),
+        ('other', 'Other')
+    ])
+    timestamp = serializers.DateTimeField(required=False)
+
+
+class GateEventBatchRequestSerializer(serializers.Serializer):
+    events = GateEventSerializer(many=True, allow_empty=False)
+
+    def validate_events(self, events):
+        limit = getattr(settings, 'GATE_BATCH_MAX_EVENTS', 1000)
+        if len(events) > limit:
+            raise serializers.ValidationError(f'At most {limit} events per batch.')
+        return events
+
+
+class JournaledGateEventRequestSerializer(serializers.Serializer):
+    """A gate event for the write-behind journal, which stamps its own time."""
+    vehicle_number = serializers.CharField(max_length=20)
+    action = serializers.ChoiceField(choices=[
+        ('entry', 'Entry'),
+        ('exit', 'Exit')
+    ])
+    vehicle_type = serializers.ChoiceField(required=False, default='car', choices=[
+        ('car', 'Car'),
+        ('bike', 'Bike'),
+        ('other', 'Other')
+    ])
+
+
+class TransactionExportRequestSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    vehicle_type = serializers.ChoiceField(required=False, choices=[
+        ('car', 'Car'),
+        ('bike', 'Bike'),
+        ('other', 'Other')
+    ])
+    output = serializers.ChoiceField(required=False, default='csv', choices=[
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON')
+    ])
+
+
+class RevenueReportRequestSerializer(serializers.Serializer):
+    period = serializers.ChoiceField(required=False, default='day', choices=[
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+        ('year', 'Year')
+    ])
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    vehicle_type = serializers.ChoiceField(required=False, choices=[
+        ('car', 'Car'),
+        ('bike', 'Bike'),
+        ('other', 'Other')
+    ])
+
+
+class HourlyReportRequestSerializer(serializers.Serializer):
+    date = serializers.DateField(required=False)
+
+
+class PlateSearchRequestSerializer(serializers.Serializer):
+    plate = serializers.CharField(max_length=20)
+    parked = serializers.BooleanField(required=False, default=False)
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=50)
+
+
+class MetricsToggleRequestSerializer(serializers.Serializer):
+    enabled = serializers.BooleanField(required=False)
+    reset = serializers.BooleanField(required=False, default=False)
@@ -0,0 +1,231 @@
+"""
+Bay inventory and allocation.
+
+Each facility is split into Zones of Slots (bays). Each bay is a 'car' or 'bike'
+bay, and 'other' vehicles park in car bays. An entry is given a free bay of
+its slot type, stored on its ParkingTransaction. A bay is therefore occupied
+exactly while the stay holding it is open, and an exit frees it without a
+write of its own.
+
+SlotAllocator keeps, per facility and slot type, a FIFO free list of bay ids and a free
+flag per bay. Allocating pops the list and releasing appends to it, so both
+are O(1) however many bays the lot has. An id left in a list after its bay
+was taken is skipped when it reaches the front. Each facility's inventory
+is loaded from the database on first use and re-loaded every
+SLOT_CHECK_INTERVAL seconds, like the occupancy ledger. Every method works
+on the current facility (see facilities.py).
+
+Like the ledger, the allocator belongs to one process. When two processes
+hand out the same bay, the one-open-transaction-per-slot constraint rejects
+the second insert, and that gate moves on to the next bay.
+
+A vehicle type with no bays configured parks without one. So does every
+vehicle in a facility that has no bays at all. For those types the slot totals
+fall back to TOTAL_CAR_SLOTS / TOTAL_BIKE_SLOTS.
+"""
+import logging
+import threading
+import time
+from collections import Counter, deque
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .facilities import current_facility, facility_alias
+from .models import ParkingTransaction, Slot, Zone
+from .routers import primary
+
+logger = logging.getLogger(__name__)
+
+SLOT_TYPES = [choice for choice, _ in Slot.SLOT_TYPE_CHOICES]
+# The bays each vehicle type parks in
+SLOT_TYPE_FOR_VEHICLE = {'car': 'car', 'bike': 'bike', 'other': 'car'}
+
+
+class ParkingFull(Exception):
+    """Every bay of the vehicle's slot type is taken."""
+
+    def __init__(self, slot_type):
+        super().__init__(f'No free {slot_type} bay.')
+        self.slot_type = slot_type
+
+
+class Bay(NamedTuple):
+    id: int
+    zone_id: int
+    zone: str
+    label: str
+    slot_type: str
+
+    def payload(self):
+        return {'id': self.id, 'zone': self.zone, 'label': self.label}
+
+
+# ======================================================
+# ========== SLOT ALLOCATOR ============================
+# ======================================================
+class _Inventory:
+    """One facility's bays and which of them are free."""
+
+    def __init__(self, zones, bays, taken):
+        self.bays = {bay.id: bay for bay in bays}  # bay id -> Bay
+        self.is_free = {bay.id: bay.id not in taken for bay in bays}
+        self.free = {}                  # slot type -> deque of bay ids, possibly with taken ones
+        self.zones = zones              # zone id -> name
+        self.zone_totals = Counter()    # (zone id, slot type) -> bays
+        self.zone_free = Counter()      # (zone id, slot type) -> free bays
+        self.checked_at = time.monotonic()
+        for bay in bays:
+            self.free.setdefault(bay.slot_type, deque())
+            self.zone_totals[bay.zone_id, bay.slot_type] += 1
+            if self.is_free[bay.id]:
+                self.free[bay.slot_type].append(bay.id)
+                self.zone_free[bay.zone_id, bay.slot_type] += 1
+
+
+class SlotAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inventories = {}  # facility id -> _Inventory
+        self.last_drift = 0
+
+    @staticmethod
+    def load_from_db():
+        facility_id = current_facility().id
+        # Handing out bays from a lagging replica would only collide on the constraint
+        with primary():
+            zones = dict(Zone.objects.filter(facility_id=facility_id).values_list('id', 'name'))
+            # Sorted here: ordering in SQL would need a temporary sort of the whole inventory
+            bays = sorted(
+                (Bay(bay_id, zone_id, zones[zone_id], label, slot_type)
+                 for bay_id, zone_id, label, slot_type in
+                 Slot.objects.filter(zone_id__in=list(zones)).values_list('id', 'zone_id', 'label', 'slot_type')),
+                key=lambda bay: (bay.zone_id, bay.id),
+            )
+            taken = set(
+                ParkingTransaction.objects.filter(facility_id=facility_id, exit_time__isnull=True, slot__isnull=False)
+                .values_list('slot_id', flat=True)
+            )
+        return zones, bays, taken
+
+    def rebuild(self):
+        """Load the inventory; returns how many bays the database showed in a different state."""
+        facility_id = current_facility().id
+        inventory = _Inventory(*self.load_from_db())
+
+        with self._lock:
+            drift = 0
+            previous = self._inventories.get(facility_id)
+            if previous is not None:
+                drift = sum(1 for bay_id, state in inventory.is_free.items()
+                            if previous.is_free.get(bay_id, state) != state)
+            self._inventories[facility_id] = inventory
+            self.last_drift = drift
+
+        if drift:
+            logger.warning("Slot allocator disagreed with the database on %d bays", drift)
+        return drift
+
+    def reset(self):
+        with self._lock:
+            self._inventories = {}
+            self.last_drift = 0
+
+    def _inventory(self):
+        facility_id = current_facility().id
+        inventory = self._inventories.get(facility_id)
+        interval = getattr(settings, 'SLOT_CHECK_INTERVAL', 60)
+        if inventory is None or time.monotonic() - inventory.checked_at >= interval:
+            self.rebuild()
+            inventory = self._inventories[facility_id]
+        return inventory
+
+    # ---------- allocation ----------
+    def allocate(self, vehicle_type):
+        """
+        Take the next free bay for `vehicle_type`. Returns None if the facility
+        has no bays of its slot type, and raises ParkingFull if all of them are taken.
+        """
+        inventory = self._inventory()
+        slot_type = SLOT_TYPE_FOR_VEHICLE.get(vehicle_type, 'car')
+        with self._lock:
+            free = inventory.free.get(slot_type)
+            if free is None:
+                return None
+            while free:
+                bay_id = free.popleft()
+                if inventory.is_free.get(bay_id):
+                    bay = inventory.bays[bay_id]
+                    inventory.is_free[bay_id] = False
+                    inventory.zone_free[bay.zone_id, bay.slot_type] -= 1
+                    return bay
+        raise ParkingFull(slot_type)
+
+    def release(self, bay_id, facility_id=None):
+        """Put a bay back at the end of its free list; releasing a free bay is a no-op."""
+        with self._lock:
+            inventory = self._inventories.get(facility_id or current_facility().id)
+            bay = inventory.bays.get(bay_id) if inventory is not None else None
+            # Not loaded yet, or deleted since: the next load counts it from the tables
+            if bay is None or inventory.is_free[bay_id]:
+                return
+            inventory.is_free[bay_id] = True
+            inventory.free[bay.slot_type].append(bay_id)
+            inventory.zone_free[bay.zone_id, bay.slot_type] += 1
+
+    def release_on_commit(self, bay_id):
+        if bay_id is not None:
+            facility_id = current_facility().id
+            transaction.on_commit(lambda: self.release(bay_id, facility_id), using=facility_alias())
+
+    # ---------- reads ----------
+    def bay(self, bay_id):
+        inventory = self._inventory()
+        with self._lock:
+            return inventory.bays.get(bay_id)
+
+    def totals(self):
+        """{slot type: (bays, free bays)} for the slot types that have bays."""
+        inventory = self._inventory()
+        with self._lock:
+            totals = Counter()
+            free = Counter()
+            for (_, slot_type), n in inventory.zone_totals.items():
+                totals[slot_type] += n
+            for (_, slot_type), n in inventory.zone_free.items():
+                free[slot_type] += n
+        return {slot_type: (n, free[slot_type]) for slot_type, n in totals.items()}
+
+    def zones(self):
+        """Bays, occupied bays and free bays per zone and slot type, without a query."""
+        inventory = self._inventory()
+        with self._lock:
+            return [
+                {
+                    'id': zone_id,
+                    'name': name,
+                    'slots': {
+                        slot_type: {
+                            'total': inventory.zone_totals[zone_id, slot_type],
+                            'occupied': (inventory.zone_totals[zone_id, slot_type]
+                                         - inventory.zone_free[zone_id, slot_type]),
+                            'available': inventory.zone_free[zone_id, slot_type],
+                        }
+                        for slot_type in SLOT_TYPES if inventory.zone_totals[zone_id, slot_type]
+                    },
+                }
+                for zone_id, name in sorted(inventory.zones.items(), key=lambda zone: zone[1])
+            ]
+
+
+allocator = SlotAllocator()
+
+
+def slot_totals():
+    """Total bays per slot type, from the inventory or else from the TOTAL_*_SLOTS settings."""
+    inventory = allocator.totals()
+    return {
+        'car': inventory['car'][0] if 'car' in inventory else getattr(settings, 'TOTAL_CAR_SLOTS', 50),
+        'bike': inventory['bike'][0] if 'bike' in inventory else getattr(settings, 'TOTAL_BIKE_SLOTS', 50),
+    }
@@ -33,6 +33,7 @@ function attachSidebarListeners() {
 }
 
 async function setView(viewName) {
+  closeLiveStream();
   mainContent.innerHTML = `<div class='p-6 text-gray-500'>Loading ${viewName}...</div>`;
 
   try {
@@ -76,6 +77,38 @@ function authHeaders() {
     ...(token ? { Authorization: `Token ${token}` } : {}),
   };
 }
+// Paginated listings return { next, previous, results }
+async function fetchPage(url) {
+  const res = await fetch(url, { headers: authHeaders() });
+  if (!res.ok) throw new Error(`HTTP ${res.status}`);
+  const page = await res.json();
+  return { results: page.results ?? page, next: page.next ?? null };
+}
+// Renders a paginated listing into `div`, with a "Load more" button while the API reports a next page
+async function loadPaged(div, url, render, empty, error) {
+  const items = [];
+  async function load(pageUrl) {
+    try {
+      const { results, next } = await fetchPage(pageUrl);
+      items.push(...results);
+      div.innerHTML = items.length ? render(items) : empty;
+      if (next) {
+        const more = document.createElement("button");
+        more.className = "mt-2 bg-indigo-100 hover:bg-indigo-200 text-indigo-700 px-3 py-1 rounded text-sm";
+        more.textContent = "Load more";
+        more.addEventListener("click", () => {
+          more.disabled = true;
+          load(next);
+        });
+        div.appendChild(more);
+      }
+    } catch {
+      if (items.length) div.insertAdjacentHTML("beforeend", `<p class='text-red-600 text-sm'>${error}</p>`);
+      else div.innerHTML = error;
+    }
+  }
+  await load(url);
+}
 function showMessage(id, msg, color = "text-green-600") {
   const el = document.getElementById(id);
   if (el) el.innerHTML = `<span class="${color}">${msg}</span>`;
@@ -84,30 +117,15 @@ function showMessage(id, msg, color = "text-green-600") {
 // ===================================================
 // ================== 1. OVERVIEW ====================
 // ===================================================
+// Stats, occupancy and recent transactions are pushed over one SSE stream;
+// only the expiry list (which changes daily) is fetched.
+let liveStream = null;
+let recentTxns = [];
+
 async function loadOverview() {
+  openLiveStream();
   try {
-    const [statsRes, txnRes, expRes] = await Promise.all([
-      fetch(`${BASE_API}dashboard/stats/`, { headers: authHeaders() }),
-      fetch(`${BASE_API}transactions/recent/`, { headers: authHeaders() }),
-      fetch(`${BASE_API}expiry/notifications/`, { headers: authHeaders() }),
-    ]);
-
-    const stats = await statsRes.json();
-    document.querySelectorAll(".stat-card .value")[0].textContent = stats.active_passes_count ?? 0;
-    document.querySelectorAll(".stat-card .value")[1].textContent = stats.vehicles_today ?? 0;
-    document.querySelectorAll(".stat-card .value")[2].textContent = `₹${stats.earnings_today ?? 0}`;
-    document.querySelectorAll(".stat-card .value")[3].textContent = stats.slots_filled ?? "0 / 100";
-
-    // Recent transactions
-    const txns = await txnRes.json();
-    const txnDiv = document.getElementById("recentTransactionsList");
-    txnDiv.innerHTML = txns.length
-      ? txns.map(
-          (t) => `<div class="flex justify-between border-b py-2 text-sm">
-                  <span>${t.vehicle.vehicle_number || t.vehicle_number}</span>
-                  <span>₹${t.fees_paid || 0}</span></div>`
-        ).join("")
-      : "<p class='text-gray-400 text-sm'>No transactions today</p>";
+    const expRes = await fetch(`${BASE_API}expiry/notifications/`, { headers: authHeaders() });
 
     // Expiry notifications
     const exps = await expRes.json();
@@ -126,6 +144,61 @@ async function loadOverview() {
   }
 }
 
+function openLiveStream() {
+  closeLiveStream();
+  const token = localStorage.getItem("authToken");
+  liveStream = new EventSource(`${BASE_API}dashboard/stream/?token=${encodeURIComponent(token ?? "")}`);
+
+  liveStream.addEventListener("snapshot", (e) => {
+    const data = JSON.parse(e.data);
+    renderStats(data.stats);
+    recentTxns = data.recent;
+    renderRecentTransactions();
+  });
+  liveStream.addEventListener("stats", (e) => renderStats(JSON.parse(e.data)));
+  liveStream.addEventListener("gate", (e) => {
+    const data = JSON.parse(e.data);
+    const earnings = document.querySelectorAll(".stat-card .value")[2];
+    const current = parseFloat(earnings.textContent.replace("₹", "")) || 0;
+    renderStats({ slots_filled: data.slots_filled, earnings_today: +(current + data.earnings_delta).toFixed(2) });
+
+    // Replace a stay already listed (an exit), otherwise put it on top
+    data.transactions.forEach((t) => {
+      const i = recentTxns.findIndex((r) => r.id === t.id);
+      if (i >= 0) recentTxns[i] = t;
+      else recentTxns.unshift(t);
+    });
+    recentTxns = recentTxns.slice(0, 5);
+    renderRecentTransactions();
+  });
+}
+
+function closeLiveStream() {
+  liveStream?.close();
+  liveStream = null;
+}
+
+function renderStats(stats) {
+  const values = document.querySelectorAll(".stat-card .value");
+  if (!values.length) return;
+  if ("active_passes_count" in stats) values[0].textContent = stats.active_passes_count ?? 0;
+  if ("vehicles_today" in stats) values[1].textContent = stats.vehicles_today ?? 0;
+  if ("earnings_today" in stats) values[2].textContent = `₹${stats.earnings_today ?? 0}`;
+  if ("slots_filled" in stats) values[3].textContent = stats.slots_filled ?? 0;
+}
+
+function renderRecentTransactions() {
+  const txnDiv = document.getElementById("recentTransactionsList");
+  if (!txnDiv) return;
+  txnDiv.innerHTML = recentTxns.length
+    ? recentTxns.map(
+        (t) => `<div class="flex justify-between border-b py-2 text-sm">
+                <span>${t.vehicle?.vehicle_number ?? t.vehicle_number}</span>
+                <span>₹${t.fees_paid || 0}</span></div>`
+      ).join("")
+    : "<p class='text-gray-400 text-sm'>No transactions today</p>";
+}
+
 // ===================================================
 // ================== 2. ENTRY / EXIT ================
 // ===================================================
@@ -195,43 +268,36 @@ async function createPass() {
 // ================== 4. MANAGE PASSES ===============
 // ===================================================
 async function loadManagePasses() {
-  const div = document.getElementById("managePassesList");
-  try {
-    const res = await fetch(`${BASE_API}passes/`, { headers: authHeaders() });
-    if (!res.ok) return (div.innerHTML = "Cannot load passes");
-    const passes = await res.json();
-    div.innerHTML = passes.length
-      ? passes.map(
-          (p) => `<div class="border-b py-2">
-                    <div class="font-medium">${p.vehicle.vehicle_number}</div>
-                    <div class="text-xs text-gray-500">${p.pass_type} | Expires: ${new Date(p.expiry_date).toLocaleDateString()}</div>
-                  </div>`
-        ).join("")
-      : "<p class='text-gray-400 text-sm'>No passes</p>";
-  } catch {
-    div.innerHTML = "Error loading passes";
-  }
+  await loadPaged(
+    document.getElementById("managePassesList"),
+    `${BASE_API}passes/`,
+    (passes) => passes.map(
+      (p) => `<div class="border-b py-2">
+                <div class="font-medium">${p.vehicle.vehicle_number}</div>
+                <div class="text-xs text-gray-500">${p.pass_type} | Expires: ${new Date(p.expiry_date).toLocaleDateString()}</div>
+              </div>`
+    ).join(""),
+    "<p class='text-gray-400 text-sm'>No passes</p>",
+    "Error loading passes"
+  );
 }
 
 // ===================================================
 // ================== 5. PASS HISTORY ================
 // ===================================================
 async function loadPassHistory() {
-  const div = document.getElementById("passHistoryList");
-  try {
-    const res = await fetch(`${BASE_API}passes/`, { headers: authHeaders() });
-    const passes = await res.json();
-    div.innerHTML = passes.length
-      ? passes.map(
-          (p) => `<div class="border-b py-2">
-                    <div class="font-medium">${p.vehicle.vehicle_number}</div>
-                    <div class="text-xs text-gray-500">${p.pass_type} | ${new Date(p.issue_date).toLocaleString()}</div>
-                  </div>`
-        ).join("")
-      : "<p class='text-gray-400 text-sm'>No history</p>";
-  } catch {
-    div.innerHTML = "Error fetching history";
-  }
+  await loadPaged(
+    document.getElementById("passHistoryList"),
+    `${BASE_API}passes/`,
+    (passes) => passes.map(
+      (p) => `<div class="border-b py-2">
+                <div class="font-medium">${p.vehicle.vehicle_number}</div>
+                <div class="text-xs text-gray-500">${p.pass_type} | ${new Date(p.issue_date).toLocaleString()}</div>
+              </div>`
+    ).join(""),
+    "<p class='text-gray-400 text-sm'>No history</p>",
+    "Error fetching history"
+  );
 }
 
 // ===================================================
@@ -254,28 +320,25 @@ async function loadSlots() {
 // ================== 7. TRANSACTIONS ================
 // ===================================================
 async function loadTransactions() {
-  const div = document.getElementById("transactionsList");
-  try {
-    const res = await fetch(`${BASE_API}transactions/`, { headers: authHeaders() });
-    const txns = await res.json();
-    div.innerHTML = txns.length
-      ? `<table class="w-full text-sm">
-          <thead><tr><th>Vehicle</th><th>Entry</th><th>Exit</th><th>Fee</th><th>Status</th></tr></thead>
-          <tbody>${txns
-            .map(
-              (t) => `<tr>
-                      <td>${t.vehicle.vehicle_number}</td>
-                      <td>${new Date(t.entry_time).toLocaleString()}</td>
-                      <td>${t.exit_time ? new Date(t.exit_time).toLocaleString() : "-"}</td>
-                      <td>₹${t.fees_paid || 0}</td>
-                      <td>${t.status}</td>
-                    </tr>`
-            )
-            .join("")}</tbody></table>`
-      : "<p class='text-gray-400 text-sm'>No transactions</p>";
-  } catch {
-    div.innerHTML = "Error loading transactions";
-  }
+  await loadPaged(
+    document.getElementById("transactionsList"),
+    `${BASE_API}transactions/`,
+    (txns) => `<table class="w-full text-sm">
+      <thead><tr><th>Vehicle</th><th>Entry</th><th>Exit</th><th>Fee</th><th>Status</th></tr></thead>
+      <tbody>${txns
+        .map(
+          (t) => `<tr>
+                  <td>${t.vehicle.vehicle_number}</td>
+                  <td>${new Date(t.entry_time).toLocaleString()}</td>
+                  <td>${t.exit_time ? new Date(t.exit_time).toLocaleString() : "-"}</td>
+                  <td>₹${t.fees_paid || 0}</td>
+                  <td>${t.status}</td>
+                </tr>`
+        )
+        .join("")}</tbody></table>`,
+    "<p class='text-gray-400 text-sm'>No transactions</p>",
+    "Error loading transactions"
+  );
 }
 
 // ===================================================
@@ -303,7 +366,7 @@ async function loadExpiryAlerts() {
 // =============== AUTO REFRESH AFTER ACTION =========
 // ===================================================
 function refreshAll() {
-  if (document.querySelector(".nav-active")?.dataset.view === "overview") loadOverview();
+  // The overview updates itself from the live stream
   loadTransactions();
   loadSlots();
   loadManagePasses();
@@ -0,0 +1,75 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .facilities import current_facility, facility_alias
+from .models import ParkingPass, ParkingTransaction
+
+STATS_CACHE_KEY = "parking:dashboard-stats:{facility}:{day}"
+
+
+def day_bounds(now):
+    """Start and end of the local day containing `now`.
+
+    Filtering on this range instead of `entry_time__date` lets the database
+    use the entry_time index rather than casting every row.
+    """
+    start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return start, start + timedelta(days=1)
+
+
+def start_of_day(day):
+    """Aware start of a local calendar date."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def compute_dashboard_stats(now=None):
+    """Today's pass and transaction figures for the current facility, in a single query."""
+    now = now or timezone.now()
+    start, end = day_bounds(now)
+    facility_id = current_facility().id
+    connection = connections[router.db_for_read(ParkingTransaction)]
+    quote = connection.ops.quote_name
+    adapt = connection.ops.adapt_datetimefield_value
+
+    sql = f"""
+        SELECT COUNT(*), COUNT(DISTINCT vehicle_id), COALESCE(SUM(fees_paid), 0),
+               (SELECT COUNT(*) FROM {quote(ParkingPass._meta.db_table)}
+                WHERE facility_id = %s AND expiry_date > %s)
+        FROM {quote(ParkingTransaction._meta.db_table)}
+        WHERE facility_id = %s AND entry_time >= %s AND entry_time < %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [facility_id, adapt(now), facility_id, adapt(start), adapt(end)])
+        transactions_today, vehicles_today, earnings_today, active_passes = cursor.fetchone()
+
+    return {
+        "active_passes": active_passes,
+        "transactions_today": transactions_today,
+        "vehicles_today": vehicles_today,
+        "earnings_today": round(float(earnings_today), 2),
+    }
+
+
+def _cache_key(now):
+    return STATS_CACHE_KEY.format(facility=current_facility().code, day=day_bounds(now)[0].date().isoformat())
+
+
+def dashboard_stats():
+    """Cached dashboard stats; recomputed after DASHBOARD_STATS_CACHE_TTL seconds or a write."""
+    now = timezone.now()
+    key = _cache_key(now)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_dashboard_stats(now)
+        cache.set(key, stats, getattr(settings, "DASHBOARD_STATS_CACHE_TTL", 10))
+    return stats
+
+
+def invalidate_dashboard_stats():
+    """Drop the cached stats once the current write commits."""
+    key = _cache_key(timezone.now())
+    transaction.on_commit(lambda: cache.delete(key), using=facility_alias())
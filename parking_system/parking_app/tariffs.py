@@ -0,0 +1,125 @@
+"""
+Parking tariffs and the vectorised fee engine.
+
+Tariffs are configured per vehicle type in settings.PARKING_TARIFFS:
+
+    PARKING_TARIFFS = {
+        'car': {
+            'hourly_rate': 20,
+            'grace_minutes': 10,        # stays shorter than this are free
+            'minimum_hours': 1,         # shortest stay that is billed
+            'daily_cap': 300,           # most charged per 24 hours parked
+            'bands': [                  # time-of-day rate multipliers (local time)
+                {'start': 22, 'end': 6, 'multiplier': 0.5},
+            ],
+        },
+    }
+
+Any key left out falls back to DEFAULT_TARIFFS, which reproduce the original
+flat rates (car 20, bike 10, other 15 per hour, minimum one hour).
+"""
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+SECONDS_PER_DAY = 86400
+
+DEFAULT_TARIFFS = {
+    'car': {'hourly_rate': 20},
+    'bike': {'hourly_rate': 10},
+    'other': {'hourly_rate': 15},
+}
+
+
+class Tariff:
+    def __init__(self, hourly_rate, grace_minutes=0, minimum_hours=1, daily_cap=None, bands=()):
+        self.hourly_rate = float(hourly_rate)
+        self.grace_seconds = float(grace_minutes) * 60
+        self.minimum_hours = float(minimum_hours)
+        self.daily_cap = float(daily_cap) if daily_cap is not None else np.inf
+        # (start, end, multiplier) in seconds of the local day; wrapping bands are split at midnight
+        self.bands = []
+        for band in bands:
+            start, end = band['start'] * 3600, band['end'] * 3600
+            if start < end:
+                self.bands.append((start, end, float(band['multiplier'])))
+            else:
+                self.bands.append((start, SECONDS_PER_DAY, float(band['multiplier'])))
+                self.bands.append((0, end, float(band['multiplier'])))
+
+    def weighted_seconds(self, start, end):
+        """Length of [start, end) with every band's seconds scaled by its multiplier."""
+        weighted = end - start
+        for band_start, band_end, multiplier in self.bands:
+            weighted = weighted + (multiplier - 1) * (
+                _band_seconds_before(end, band_start, band_end) - _band_seconds_before(start, band_start, band_end)
+            )
+        return weighted
+
+    def fees(self, start, end):
+        """Fees for arrays of local entry/exit times in seconds."""
+        duration = np.maximum(end - start, 0)
+        days = np.floor(duration / SECONDS_PER_DAY)
+        remainder_start = start + days * SECONDS_PER_DAY
+
+        day_charge = min(self.daily_cap, self.hourly_rate * self.weighted_seconds(0, SECONDS_PER_DAY) / 3600)
+        remainder_charge = self.hourly_rate * self.weighted_seconds(remainder_start, start + duration) / 3600
+        remainder_charge = np.where(
+            days == 0, np.maximum(remainder_charge, self.hourly_rate * self.minimum_hours), remainder_charge
+        )
+
+        fees = days * day_charge + np.minimum(remainder_charge, self.daily_cap)
+        return np.where(duration < self.grace_seconds, 0.0, fees)
+
+
+def _band_seconds_before(t, band_start, band_end):
+    """Seconds inside the daily band [band_start, band_end) between the epoch and `t`."""
+    days, time_of_day = np.divmod(t, SECONDS_PER_DAY)
+    return days * (band_end - band_start) + np.clip(time_of_day - band_start, 0, band_end - band_start)
+
+
+def get_tariffs():
+    configured = getattr(settings, 'PARKING_TARIFFS', {})
+    return {
+        vehicle_type: Tariff(**{**DEFAULT_TARIFFS.get(vehicle_type, DEFAULT_TARIFFS['other']),
+                                **configured.get(vehicle_type, {})})
+        for vehicle_type in set(DEFAULT_TARIFFS) | set(configured)
+    }
+
+
+def _local_seconds(times):
+    """Aware datetimes as seconds since the epoch in local wall-clock time."""
+    return np.fromiter(
+        (t.timestamp() + timezone.localtime(t).utcoffset().total_seconds() for t in times),
+        dtype=np.float64, count=len(times),
+    )
+
+
+def compute_fees(entry_times, exit_times, vehicle_types):
+    """
+    Fees for parallel sequences of entry times, exit times and vehicle types,
+    as a float array rounded to two decimals. Unknown vehicle types are
+    charged as 'other'.
+    """
+    start = _local_seconds(entry_times)
+    end = _local_seconds(exit_times)
+    types = np.asarray(vehicle_types, dtype=object)
+    fees = np.zeros(len(start))
+
+    tariffs = get_tariffs()
+    unmatched = np.ones(len(start), dtype=bool)
+    for vehicle_type, tariff in tariffs.items():
+        if vehicle_type == 'other':
+            continue
+        mask = types == vehicle_type
+        if mask.any():
+            fees[mask] = tariff.fees(start[mask], end[mask])
+        unmatched &= ~mask
+    if unmatched.any():
+        fees[unmatched] = tariffs['other'].fees(start[unmatched], end[unmatched])
+
+    return np.round(fees, 2)
+
+
+def calculate_fee(entry_time, exit_time, vehicle_type):
+    return float(compute_fees([entry_time], [exit_time], [vehicle_type])[0])
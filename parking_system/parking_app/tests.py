@@ -1,3 +1,1459 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from .models import (
+    Owner, Vehicle, ParkingPass, ParkingTransaction, Notification, DailyRollup, HourlyRollup, GateJournalCheckpoint,
+    Slot, Facility,
+)
+from . import live
+from .authentication import TOKEN_CACHE_KEY, CachedTokenAuthentication, atoken_user
+from .expiry import notify_passes
+from .expiry_scheduler import expiry_scheduler, reset_expiry_scheduler
+from .facilities import FacilityInfo, default_facility, facility_scope, get_facility, reset_facilities
+from .benchmark import compare, listing_views, run, seed, summarise, time_listings, use_sqlite_profile
+from .gate import apply_gate_events, close_async_gate
+from .journal import GateJournal, JournalInUse, reset_gate_journal
+from .metrics import RequestRecorder, registry as metrics_registry
+from .occupancy import ledger
+from .lru import LRUCache
+from .owners import GUEST_OWNER_NAME, reset_guest_owner, upsert_owner
+from .plates import plate_cache, lookup as lookup_plate
+from .plate_search import PlateIndex, canonical, reset_plate_index
+from .rollups import rebuild_rollups
+from .routers import PrimaryReplicaRouter
+from .slots import allocator as slot_allocator
+from .stats import day_bounds
+from .tariffs import calculate_fee, compute_fees
+
+
+class ParkingAPITestCase(TestCase):
+    """Authenticated API client with the in-process state cleared per test."""
+
+    def setUp(self):
+        ledger.reset()
+        slot_allocator.reset()
+        cache.clear()
+        plate_cache.clear()
+        reset_guest_owner()
+        reset_facilities()
+        reset_plate_index()
+        self.user = User.objects.create_user(username="operator", password="secret")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def enter(self, vehicle_number, vehicle_type="car"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                "/api/entry-exit/",
+                {"vehicle_number": vehicle_number, "vehicle_type": vehicle_type},
+                format="json",
+            )
+
+    def exit(self, vehicle_number):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/entry-exit/", {"vehicle_number": vehicle_number}, format="json")
+
+
+class OccupancyLedgerTests(ParkingAPITestCase):
+    databases = {"default", "replica"}
+
+    def test_entry_and_exit_adjust_counts_without_queries(self):
+        self.assertEqual(ledger.snapshot(), {"car": 0, "bike": 0, "other": 0})
+
+        self.assertEqual(self.enter("KA01AB1234").status_code, 201)
+        self.assertEqual(self.enter("KA01XY9999", "bike").status_code, 201)
+        with self.assertNumQueries(0):
+            self.assertEqual(ledger.snapshot(), {"car": 1, "bike": 1, "other": 0})
+
+        self.assertEqual(self.exit("KA01AB1234").status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(ledger.occupied(), 1)
+
+    def test_slots_endpoint_reads_from_ledger(self):
+        self.enter("KA01AB1234", "other")
+        ledger.occupied()
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/available-slots/")
+        self.assertEqual(response.data["cars_occupied"], 1)
+        self.assertEqual(response.data["car_available"], 49)
+
+    def test_check_reports_and_corrects_drift(self):
+        ledger.rebuild()
+        vehicle = Vehicle.objects.create(vehicle_number="KA01AB1234", owner=Owner.objects.create(name="A"))
+        ParkingTransaction.objects.create(vehicle=vehicle)
+
+        with self.assertLogs("parking_app.occupancy", "WARNING"):
+            self.assertEqual(ledger.check(), {"car": -1})
+        self.assertEqual(ledger.occupied("car"), 1)
+        self.assertEqual(ledger.check(), {})
+
+    @override_settings(FACILITY_DATABASES={"north": "replica"})
+    def test_a_rolled_back_batch_at_a_routed_facility_leaves_the_counts(self):
+        call_command("create_facility", "north", "North Car Park", stdout=StringIO())
+        self.addCleanup(reset_facilities)
+        events = [{"vehicle_number": "KA01AB1234", "action": "entry", "vehicle_type": "car"}]
+        with facility_scope(get_facility("north")):
+            self.assertEqual(ledger.occupied(), 0)
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+                with transaction.atomic(using="replica"):
+                    apply_gate_events(events)
+                    raise RuntimeError
+            self.assertEqual(ledger.occupied(), 0)
+
+            with self.captureOnCommitCallbacks(execute=True, using="replica"):
+                apply_gate_events(events)
+            self.assertEqual(ledger.occupied(), 1)
+
+    def test_drift_is_kept_per_facility(self):
+        ledger.rebuild()
+        vehicle = Vehicle.objects.create(vehicle_number="KA01AB1234", owner=Owner.objects.create(name="A"))
+        ParkingTransaction.objects.create(vehicle=vehicle)
+        with self.assertLogs("parking_app.occupancy", "WARNING"):
+            ledger.check()
+
+        call_command("create_facility", "north", "North Car Park", stdout=StringIO())
+        self.addCleanup(reset_facilities)
+        with facility_scope(get_facility("north")):
+            ledger.check()
+        self.assertEqual(ledger.last_drift, {default_facility().id: {"car": -1}, get_facility("north").id: {}})
+
+
+class DashboardStatsTests(ParkingAPITestCase):
+    def test_stats_are_one_query_then_cached(self):
+        ledger.rebuild()
+        with self.assertNumQueries(1):
+            first = self.client.get("/api/dashboard-stats/")
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/dashboard-stats/")
+        self.assertEqual(first.data, second.data)
+
+    def test_gate_and_pass_writes_invalidate_cache(self):
+        self.client.get("/api/dashboard-stats/")
+        self.enter("KA01AB1234")
+        self.enter("KA01AB1234")
+        self.assertEqual(self.client.get("/api/dashboard-stats/").data["vehicles_today"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/create-pass/", {
+                "owner_name": "A", "vehicle_number": "KA01XY0001", "vehicle_type": "car", "pass_type": "daily",
+            }, format="json")
+        response = self.client.get("/api/dashboard-stats/")
+        self.assertEqual(response.data["active_passes_count"], 1)
+        self.assertEqual(response.data["slots_filled"], 1)
+
+    def test_earnings_only_count_today(self):
+        vehicle = Vehicle.objects.create(vehicle_number="KA01AB1234", owner=Owner.objects.create(name="A"))
+        yesterday = timezone.now() - timedelta(days=1)
+        ParkingTransaction.objects.create(vehicle=vehicle, entry_time=yesterday, exit_time=yesterday, fees_paid=50)
+        ParkingTransaction.objects.create(vehicle=vehicle, exit_time=timezone.now(), fees_paid=20)
+
+        self.assertEqual(self.client.get("/parking/api/stats/").json()["earnings_today"], 20.0)
+
+
+class KeysetPaginationTests(ParkingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        owner = Owner.objects.create(name="A")
+        vehicle = Vehicle.objects.create(vehicle_number="KA01AB1234", owner=owner)
+        same_time = timezone.now() - timedelta(hours=1)
+        # Ties on entry_time must still page deterministically through the id tie-breaker
+        entry_times = [same_time if i % 2 else same_time - timedelta(minutes=i) for i in range(11)]
+        ParkingTransaction.objects.bulk_create(
+            ParkingTransaction(vehicle=vehicle, entry_time=entry, exit_time=entry + timedelta(minutes=30), status="Exited")
+            for entry in entry_times
+        )
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            page = self.client.get(url).json()
+            ids.extend(row["id"] for row in page["results"])
+            url, pages = page["next"], pages + 1
+        return ids, pages
+
+    def test_pages_cover_listing_in_order_without_duplicates(self):
+        expected = list(ParkingTransaction.objects.order_by("-entry_time", "-id").values_list("id", flat=True))
+        ids, pages = self.walk("/api/transactions/?page_size=3")
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 4)
+
+    def test_previous_link_returns_to_earlier_page(self):
+        first = self.client.get("/api/transactions/?page_size=4").json()
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get("/api/transactions/?cursor=nope").status_code, 404)
+
+
+class ValuesSerializerTests(ParkingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        owner = Owner.objects.create(name="A", contact_number="98450", email="a@example.com")
+        vehicles = [
+            Vehicle.objects.create(vehicle_number="KA01AB0001", owner=owner),
+            Vehicle.objects.create(vehicle_number="KA01AB0002", vehicle_type="bike"),  # no owner
+        ]
+        now = timezone.now()
+        for vehicle in vehicles:
+            ParkingPass.objects.create(vehicle=vehicle, pass_type="weekly")
+            ParkingTransaction.objects.create(vehicle=vehicle, entry_time=now - timedelta(hours=3),
+                                              exit_time=now - timedelta(hours=1), fees_paid="42.5", status="Exited")
+            ParkingTransaction.objects.create(vehicle=vehicle, entry_time=now - timedelta(minutes=20))
+
+    def test_values_rows_render_the_same_json_as_the_model_serializers(self):
+        for zone in ["UTC", "Asia/Kolkata"]:
+            with self.subTest(zone), timezone.override(zone):
+                results = time_listings(repeat=1)
+                self.assertEqual({name: result["identical"] for name, result in results.items()},
+                                 dict.fromkeys(["owners", "vehicles", "passes", "transactions"], True))
+                self.assertEqual([result["rows"] for result in results.values()], [1, 2, 2, 4])
+
+    def test_list_views_page_values_rows_in_one_query(self):
+        factory = APIRequestFactory()
+        for name, view_class in listing_views().items():
+            with self.subTest(name):
+                request = factory.get("/", {"page_size": 1})
+                force_authenticate(request, self.user)
+                with CaptureQueriesContext(connection) as queries:
+                    page = view_class.as_view()(request).data
+                self.assertEqual(len(queries), 1)
+                expected = view_class.serializer_class(view_class().get_queryset()[:1], many=True).data
+                self.assertEqual(page["results"], expected)
+                if name != "owners":
+                    request = factory.get(page["next"])
+                    force_authenticate(request, self.user)
+                    self.assertEqual(len(view_class.as_view()(request).data["results"]), 1)
+
+
+class TransactionExportTests(ParkingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        owner = Owner.objects.create(name="A")
+        car = Vehicle.objects.create(vehicle_number="KA01AB1234", owner=owner)
+        bike = Vehicle.objects.create(vehicle_number="KA01XY0001", vehicle_type="bike", owner=owner)
+        day = timezone.make_aware(datetime(2025, 3, 10, 9, 0))
+        for i, vehicle in enumerate([car, bike, car]):
+            ParkingTransaction.objects.create(vehicle=vehicle, entry_time=day + timedelta(days=i),
+                                              exit_time=day + timedelta(days=i, hours=2), fees_paid=40)
+
+    def test_csv_export_streams_filtered_rows(self):
+        response = self.client.get("/api/transactions/export/?start=2025-03-10&end=2025-03-11")
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,vehicle_number,vehicle_type,owner_name,entry_time,exit_time,fees_paid,status")
+        self.assertEqual(len(lines), 3)
+
+    def test_ndjson_export_filters_by_vehicle_type(self):
+        response = self.client.get("/api/transactions/export/?output=ndjson&vehicle_type=car")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["vehicle_number"] for row in rows], ["KA01AB1234", "KA01AB1234"])
+        self.assertEqual(rows[0]["fees_paid"], "40.00")
+
+    def test_command_writes_same_rows(self):
+        out = StringIO()
+        call_command("export_transactions", "--format=ndjson", "--start=2025-03-11", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+
+class GateEventBatchTests(ParkingAPITestCase):
+    def post_batch(self, events):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/entry-exit/batch/", {"events": events}, format="json")
+
+    def test_events_apply_in_timestamp_order(self):
+        t0 = timezone.now() - timedelta(hours=3)
+        response = self.post_batch([
+            {"vehicle_number": "ka01ab1234", "action": "exit", "timestamp": (t0 + timedelta(hours=2)).isoformat()},
+            {"vehicle_number": "KA01AB1234", "action": "entry", "timestamp": t0.isoformat()},
+            {"vehicle_number": "KA01XY0001", "action": "entry", "vehicle_type": "bike"},
+            {"vehicle_number": "KA01XY0001", "action": "entry"},
+            {"vehicle_number": "KA99ZZ0000", "action": "exit"},
+        ])
+        self.assertEqual(response.status_code, 200)
+        statuses = [result["status"] for result in response.data["results"]]
+        self.assertEqual(statuses, ["success", "success", "success", "error", "error"])
+        self.assertEqual(response.data["results"][0]["fees_paid"], 40.0)
+
+        txn = ParkingTransaction.objects.get(vehicle__vehicle_number="KA01AB1234")
+        self.assertEqual((txn.status, txn.fees_paid), ("Exited", 40))
+        self.assertEqual(ledger.snapshot(), {"car": 0, "bike": 1, "other": 0})
+
+    def test_pass_holders_exit_free(self):
+        self.enter("KA01AB1234")
+        ParkingPass.objects.create(vehicle=Vehicle.objects.get(vehicle_number="KA01AB1234"), pass_type="monthly")
+        response = self.post_batch([{"vehicle_number": "KA01AB1234", "action": "exit"}])
+        self.assertEqual(response.data["results"][0]["fees_paid"], 0.0)
+
+    def test_burst_uses_constant_number_of_queries(self):
+        for i in range(50):
+            self.enter(f"KA01AB{i:04d}")
+        events = [{"vehicle_number": f"KA01AB{i:04d}", "action": "exit"} for i in range(50)]
+        events += [{"vehicle_number": f"KA02CD{i:04d}", "action": "entry"} for i in range(200)]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_batch(events)
+        self.assertEqual(response.data["applied"], 250)
+        # Independent of batch size; rollup upkeep adds a few per touched hour/day bucket
+        self.assertLessEqual(len(ctx.captured_queries), 20)
+
+
+class SlotAllocationTests(ParkingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        call_command("create_slots", "Level 1", car=2, bike=1, stdout=StringIO())
+        call_command("create_slots", "Level 2", car=1, stdout=StringIO())
+
+    def slot(self, response):
+        return response.data.get("slot", {}).get("zone"), response.data.get("slot", {}).get("label")
+
+    def test_entries_take_free_bays_and_exits_release_them(self):
+        self.assertEqual(self.slot(self.enter("KA01AB0001")), ("Level 1", "C0001"))
+        self.assertEqual(self.slot(self.enter("KA01AB0002", "other")), ("Level 1", "C0002"))
+        self.assertEqual(self.slot(self.enter("KA01AB0003", "bike")), ("Level 1", "B0001"))
+        self.assertEqual(self.slot(self.enter("KA01AB0004")), ("Level 2", "C0001"))
+        full = self.enter("KA01AB0005")
+        self.assertEqual((full.status_code, full.data["message"]), (400, "No free car bay."))
+
+        self.exit("KA01AB0001")
+        self.assertEqual(self.slot(self.enter("KA01AB0005")), ("Level 1", "C0001"))
+        self.assertEqual(
+            list(ParkingTransaction.objects.filter(exit_time__isnull=True).order_by("slot__zone__name", "slot__label")
+                 .values_list("vehicle__vehicle_number", flat=True)),
+            ["KA01AB0003", "KA01AB0005", "KA01AB0002", "KA01AB0004"],
+        )
+
+    def test_zone_availability_and_totals_come_from_the_inventory(self):
+        self.enter("KA01AB0001")
+        self.enter("KA01AB0002", "bike")
+        with self.assertNumQueries(0):
+            zones = self.client.get("/api/available-slots/zones/").data
+        self.assertEqual(zones, [
+            {"id": zones[0]["id"], "name": "Level 1", "slots": {
+                "car": {"total": 2, "occupied": 1, "available": 1},
+                "bike": {"total": 1, "occupied": 1, "available": 0},
+            }},
+            {"id": zones[1]["id"], "name": "Level 2", "slots": {"car": {"total": 1, "occupied": 0, "available": 1}}},
+        ])
+        slots = self.client.get("/api/available-slots/").data
+        self.assertEqual((slots["total_car_slots"], slots["car_available"]), (3, 2))
+        self.assertEqual((slots["total_bike_slots"], slots["bike_available"]), (1, 0))
+
+    def test_a_restarted_allocator_reloads_taken_bays(self):
+        self.enter("KA01AB0001")
+        slot_allocator.reset()
+        self.assertEqual(self.slot(self.enter("KA01AB0002")), ("Level 1", "C0002"))
+
+    def test_a_bay_taken_by_another_process_is_skipped(self):
+        slot_allocator.rebuild()
+        # Another worker hands out Level 1 C0001 behind this allocator's back
+        bay = Slot.objects.get(zone__name="Level 1", label="C0001")
+        ParkingTransaction.objects.create(vehicle=Vehicle.objects.create(vehicle_number="KA09ZZ0001"), slot=bay)
+        self.assertEqual(self.slot(self.enter("KA01AB0001")), ("Level 1", "C0002"))
+        self.assertEqual(self.enter("KA01AB0001").status_code, 400)
+        self.assertEqual(self.slot(self.enter("KA01AB0003")), ("Level 2", "C0001"))
+
+    def test_batch_entries_take_bays_until_full(self):
+        events = [{"vehicle_number": f"KA01AB000{i}", "action": "entry"} for i in range(4)]
+        events.append({"vehicle_number": "KA01AB0000", "action": "exit"})
+        with self.captureOnCommitCallbacks(execute=True):
+            results = self.client.post("/api/entry-exit/batch/", {"events": events}, format="json").data["results"]
+        self.assertEqual([result.get("slot", {}).get("label") for result in results], ["C0001", "C0002", "C0001", None, None])
+        self.assertEqual(results[3]["message"], "No free car bay.")
+        self.assertEqual(self.slot(self.enter("KA01AB0003")), ("Level 1", "C0001"))
+
+    def test_types_without_bays_fall_back_to_the_settings_totals(self):
+        Slot.objects.filter(slot_type="bike").delete()
+        slot_allocator.reset()
+        self.assertNotIn("slot", self.enter("KA01AB0001", "bike").data)
+        slots = self.client.get("/api/available-slots/").data
+        self.assertEqual((slots["total_bike_slots"], slots["bikes_occupied"]), (settings.TOTAL_BIKE_SLOTS, 1))
+
+    def test_create_slots_continues_numbering(self):
+        call_command("create_slots", "Level 2", car=2, bike=1, stdout=StringIO())
+        self.assertEqual(list(Slot.objects.filter(zone__name="Level 2").order_by("id").values_list("label", flat=True)),
+                         ["C0001", "C0002", "C0003", "B0001"])
+
+
+class FacilityTests(ParkingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        call_command("create_facility", "north", "North Car Park", stdout=StringIO())
+        call_command("create_slots", "Level 1", car=1, facility="north", stdout=StringIO())
+
+    def post(self, url, data, facility=None):
+        headers = {"HTTP_X_FACILITY": facility} if facility else {}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, data, format="json", **headers)
+
+    def get(self, url, facility=None):
+        return self.client.get(url, **({"HTTP_X_FACILITY": facility} if facility else {})).data
+
+    def test_listings_stats_and_slots_are_scoped_to_the_facility(self):
+        self.enter("KA01AB0001")
+        self.enter("KA01AB0002", "bike")
+        self.post("/api/entry-exit/", {"vehicle_number": "KA01AB0003", "vehicle_type": "car"}, "north")
+        self.post("/api/create-pass/", {"owner_name": "Asha", "vehicle_number": "KA01AB0003",
+                                          "vehicle_type": "car", "pass_type": "monthly"}, "north")
+
+        numbers = lambda page: [row["vehicle_number"] for row in page["results"]]
+        self.assertEqual(numbers(self.get("/api/transactions/")), ["KA01AB0002", "KA01AB0001"])
+        self.assertEqual(numbers(self.get("/api/transactions/", "north")), ["KA01AB0003"])
+        self.assertEqual(self.get("/api/passes/")["results"], [])
+        self.assertEqual(len(self.get("/api/passes/", "north")["results"]), 1)
+
+        self.assertEqual(self.get("/api/dashboard-stats/")["slots_filled"], 2)
+        north = self.get("/api/dashboard-stats/", "north")
+        self.assertEqual((north["slots_filled"], north["active_passes_count"], north["vehicles_today"]), (1, 1, 1))
+        self.assertEqual(self.get("/api/available-slots/zones/"), [])
+        [zone] = self.get("/api/available-slots/zones/", "north")
+        self.assertEqual(zone["slots"], {"car": {"total": 1, "occupied": 1, "available": 0}})
+        self.assertEqual(self.get("/api/available-slots/", "north")["car_available"], 0)
+
+    def test_a_vehicle_is_parked_at_one_facility_at_a_time(self):
+        self.enter("KA01AB0001")
+        entry = self.post("/api/entry-exit/", {"vehicle_number": "KA01AB0001", "vehicle_type": "car"}, "north")
+        self.assertEqual(entry.status_code, 400)
+        self.assertEqual(self.post("/api/entry-exit/", {"vehicle_number": "KA01AB0001"}, "north").status_code, 404)
+        batch = self.post("/api/entry-exit/batch/", {"events": [
+            {"vehicle_number": "KA01AB0001", "action": "exit"},
+        ]}, "north").data
+        self.assertEqual(batch["results"][0]["message"], "No active entry for this vehicle.")
+        self.assertEqual(self.exit("KA01AB0001").status_code, 200)
+
+    def test_a_pass_only_covers_its_own_facility(self):
+        self.post("/api/create-pass/", {"owner_name": "Asha", "vehicle_number": "KA01AB0001",
+                                          "vehicle_type": "car", "pass_type": "monthly"}, "north")
+        vehicle = Vehicle.objects.get(vehicle_number="KA01AB0001")
+        ParkingTransaction.objects.create(vehicle=vehicle, entry_time=timezone.now() - timedelta(hours=3))
+        self.exit("KA01AB0001")
+        self.assertGreater(ParkingTransaction.objects.get(vehicle=vehicle).fees_paid, 0)
+
+    def test_an_unknown_facility_is_not_found(self):
+        response = self.client.get("/api/transactions/", HTTP_X_FACILITY="nowhere")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get("/api/transactions/?facility=north").status_code, 200)
+
+    @override_settings(FACILITY_DATABASES={"north": "replica"})
+    def test_a_routed_facility_reads_and_writes_its_own_database(self):
+        router = PrimaryReplicaRouter()
+        with facility_scope(get_facility("north")):
+            self.assertEqual(router.db_for_write(ParkingTransaction), "replica")
+            self.assertEqual(router.db_for_read(Vehicle), "replica")
+            self.assertEqual(router.db_for_read(Facility), "default")
+            self.assertEqual(router.db_for_read(User), "default")
+        self.assertEqual(router.db_for_write(ParkingTransaction), "default")
+
+
+class PlateSearchTests(ParkingAPITestCase):
+    def test_look_alikes_share_a_canonical_form(self):
+        self.assertEqual(canonical("ka-01 ab 1O34"), canonical("KA01AB1034"))
+        self.assertEqual(canonical("KAOIA81D34"), canonical("KA01AB1034"))
+
+    def test_index_finds_plates_one_edit_away(self):
+        index = PlateIndex()
+        index.add_many(["KA01AB1034", "KA01AB1043", "MH12CD5678"])
+        found = lambda read: [(match.vehicle_number, match.distance) for match in index.search(read)]
+        self.assertEqual(found("KA0IAB1O34"), [("KA01AB1034", 0), ("KA01AB1043", 1)])
+        self.assertEqual(found("KA01AB134"), [("KA01AB1034", 1)])
+        self.assertEqual(found("MH12CD56789"), [("MH12CD5678", 1)])
+        self.assertEqual(found("MH21DC5678"), [])
+        index.discard("KA01AB1043")
+        self.assertEqual(found("KA01AB1043"), [("KA01AB1034", 1)])
+
+    @override_settings(PLATE_AUTO_MATCH=True)
+    def test_a_look_alike_exit_read_closes_the_parked_vehicle(self):
+        self.enter("KA01AB1034")
+        response = self.exit("KA0IAB1O34")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["matched_vehicle_number"], "KA01AB1034")
+        self.assertFalse(ParkingTransaction.objects.filter(exit_time__isnull=True).exists())
+
+    @override_settings(PLATE_AUTO_MATCH=True)
+    def test_a_registered_plate_is_never_matched_to_another_car(self):
+        self.enter("KA01AB1034")
+        self.enter("KAO1AB1034")
+        self.assertEqual(self.exit("KAO1AB1034").status_code, 200)
+        # The camera reports the plate again, and a registered car that never entered is read
+        Vehicle.objects.create(vehicle_number="KA01AB1O34")
+        for read in ["KAO1AB1034", "KA01AB1O34"]:
+            response = self.exit(read)
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.data["suggestions"], ["KA01AB1034"])
+        self.assertTrue(ParkingTransaction.objects.filter(
+            vehicle__vehicle_number="KA01AB1034", exit_time__isnull=True).exists())
+
+    def test_other_misreads_get_suggestions_instead(self):
+        self.enter("KA01AB1034")
+        self.enter("KA01AB1035")
+        response = self.exit("KA01AB103")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data["suggestions"], ["KA01AB1034", "KA01AB1035"])
+        self.assertEqual(self.exit("KA0IAB1O34").data["suggestions"], ["KA01AB1034", "KA01AB1035"])
+
+    def test_search_endpoint(self):
+        self.enter("KA01AB1034")
+        self.client.get("/api/vehicles/search/", {"plate": "X"})
+        # Registered after the index loaded
+        with self.captureOnCommitCallbacks(execute=True):
+            Vehicle.objects.create(vehicle_number="KA01AB1043")
+        response = self.client.get("/api/vehicles/search/", {"plate": "KA01A81034"})
+        self.assertEqual(response.data["results"], [
+            {"vehicle_number": "KA01AB1034", "distance": 0},
+            {"vehicle_number": "KA01AB1043", "distance": 1},
+        ])
+        parked = self.client.get("/api/vehicles/search/", {"plate": "KA01A81034", "parked": "true"}).data
+        self.assertEqual([match["vehicle_number"] for match in parked["results"]], ["KA01AB1034"])
+
+
+class TariffTests(TestCase):
+    def setUp(self):
+        self.entry = timezone.make_aware(datetime(2025, 3, 10, 9, 0))
+
+    def fee(self, hours, vehicle_type="car"):
+        return calculate_fee(self.entry, self.entry + timedelta(hours=hours), vehicle_type)
+
+    def test_defaults_match_flat_hourly_rates(self):
+        self.assertEqual(self.fee(0.25), 20.0)
+        self.assertEqual(self.fee(2.5), 50.0)
+        self.assertEqual(self.fee(3, "bike"), 30.0)
+        self.assertEqual(self.fee(3, "truck"), 45.0)
+
+    @override_settings(PARKING_TARIFFS={"car": {"hourly_rate": 20, "grace_minutes": 15, "daily_cap": 100}})
+    def test_grace_period_and_daily_cap(self):
+        self.assertEqual(self.fee(0.2), 0.0)
+        self.assertEqual(self.fee(10), 100.0)
+        self.assertEqual(self.fee(26), 140.0)
+
+    @override_settings(PARKING_TARIFFS={"car": {"hourly_rate": 20, "bands": [{"start": 18, "end": 6, "multiplier": 0.5}]}})
+    def test_time_of_day_bands(self):
+        # 09:00-21:00: nine full-rate hours, then three at half rate
+        self.assertEqual(self.fee(12), 210.0)
+        # A full day: twelve hours at each rate
+        self.assertEqual(self.fee(24), 360.0)
+
+    def test_vectorised_fees_match_single_fees(self):
+        exits = [self.entry + timedelta(minutes=m) for m in (30, 90, 600)]
+        fees = compute_fees([self.entry] * 3, exits, ["car", "bike", "other"])
+        self.assertEqual(fees.tolist(), [calculate_fee(self.entry, e, t) for e, t in zip(exits, ["car", "bike", "other"])])
+
+
+class RecomputeFeesTests(TestCase):
+    def test_reprices_period_and_keeps_pass_holders_free(self):
+        owner = Owner.objects.create(name="A")
+        guest = Vehicle.objects.create(vehicle_number="KA01AB1234", owner=owner)
+        holder = Vehicle.objects.create(vehicle_number="KA01XY0001", owner=owner)
+        entry = timezone.now() - timedelta(hours=3)
+        ParkingPass.objects.create(vehicle=holder, pass_type="yearly")
+        ParkingPass.objects.update(issue_date=entry - timedelta(days=1))
+        charged = ParkingTransaction.objects.create(vehicle=guest, entry_time=entry,
+                                                    exit_time=entry + timedelta(hours=2), fees_paid=1)
+        free = ParkingTransaction.objects.create(vehicle=holder, entry_time=entry,
+                                                 exit_time=entry + timedelta(hours=2), fees_paid=0)
+        today = timezone.localdate()
+        start, end = (today - timedelta(days=1)).isoformat(), today.isoformat()
+
+        with override_settings(PARKING_TARIFFS={"car": {"hourly_rate": 30}}):
+            call_command("recompute_fees", f"--start={start}", f"--end={end}", stdout=StringIO())
+
+        charged.refresh_from_db()
+        free.refresh_from_db()
+        self.assertEqual(charged.fees_paid, 60)
+        self.assertEqual(free.fees_paid, 0)
+
+
+    def test_reprices_one_facility_with_its_own_passes(self):
+        call_command("create_facility", "north", "North Car Park", stdout=StringIO())
+        self.addCleanup(reset_facilities)
+        north = get_facility("north")
+        holder = Vehicle.objects.create(vehicle_number="KA01XY0001", owner=Owner.objects.create(name="A"))
+        entry = timezone.now() - timedelta(hours=3)
+        with facility_scope(north):
+            ParkingPass.objects.create(vehicle=holder, pass_type="yearly")
+        ParkingPass.objects.update(issue_date=entry - timedelta(days=1))
+        stays = {
+            label: ParkingTransaction.objects.create(facility_id=facility.id, vehicle=holder, entry_time=entry,
+                                                     exit_time=entry + timedelta(hours=2), fees_paid=1)
+            for label, facility in (("main", default_facility()), ("north", north))
+        }
+        today = timezone.localdate()
+        dates = [f"--start={(today - timedelta(days=1)).isoformat()}", f"--end={today.isoformat()}"]
+
+        with override_settings(PARKING_TARIFFS={"car": {"hourly_rate": 30}}):
+            call_command("recompute_fees", *dates, "--facility=north", stdout=StringIO())
+            for stay in stays.values():
+                stay.refresh_from_db()
+            self.assertEqual((stays["main"].fees_paid, stays["north"].fees_paid), (1, 0))
+            self.assertEqual(DailyRollup.objects.get(facility_id=north.id).revenue, 0)
+
+            call_command("recompute_fees", *dates, stdout=StringIO())
+            stays["main"].refresh_from_db()
+            self.assertEqual(stays["main"].fees_paid, 60)
+            self.assertEqual(DailyRollup.objects.get(facility_id=default_facility().id).revenue, 60)
+
+
+class CheckExpiryTests(TestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        owner = Owner.objects.create(name="A")
+        now = timezone.now()
+        for i, days in enumerate([-10, -1, 2, 20]):
+            vehicle = Vehicle.objects.create(vehicle_number=f"KA01AB{i:04d}", owner=owner)
+            ParkingPass.objects.create(vehicle=vehicle, pass_type="monthly", expiry_date=now + timedelta(days=days))
+
+    def test_sweep_is_set_based_and_idempotent(self):
+        with CaptureQueriesContext(connection) as ctx:
+            out = StringIO()
+            call_command("check_expiry", stdout=out)
+        # Per chunk: select, savepoint, count, insert, count, release
+        self.assertLessEqual(len(ctx.captured_queries), 15)
+        self.assertEqual(Notification.objects.filter(notification_type="pass_expiry").count(), 2)
+        self.assertEqual(Notification.objects.filter(notification_type="pass_reminder").count(), 1)
+        self.assertIn("2 expiry notifications created", out.getvalue())
+
+        call_command("check_expiry", stdout=StringIO())
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_only_inserted_notifications_are_counted(self):
+        rows = list(ParkingPass.objects.filter(expiry_date__lte=timezone.now())
+                    .values_list("id", "vehicle__owner_id", "vehicle__vehicle_number", "expiry_date"))
+        self.assertEqual(notify_passes(rows[:1], "pass_expiry"), 1)
+        self.assertEqual(notify_passes(rows, "pass_expiry"), 1)
+
+    def test_reminders_are_retired_once_the_pass_expires(self):
+        call_command("check_expiry", stdout=StringIO())
+        ParkingPass.objects.filter(notifications__notification_type="pass_reminder").update(
+            expiry_date=timezone.now() - timedelta(minutes=1)
+        )
+        call_command("check_expiry", stdout=StringIO())
+        reminder = Notification.objects.get(notification_type="pass_reminder")
+        self.assertTrue(reminder.is_read)
+        self.assertEqual(Notification.objects.filter(notification_type="pass_expiry").count(), 3)
+
+    @override_settings(FACILITY_DATABASES={"north": "replica"})
+    def test_sweeps_every_facility_database(self):
+        call_command("create_facility", "north", "North Car Park", stdout=StringIO())
+        self.addCleanup(reset_facilities)
+        with facility_scope(get_facility("north")):
+            vehicle = Vehicle.objects.create(vehicle_number="KA01XY0001", owner=Owner.objects.create(name="B"))
+            ParkingPass.objects.create(vehicle=vehicle, pass_type="daily", expiry_date=timezone.now() - timedelta(days=1))
+
+        call_command("check_expiry", stdout=StringIO())
+        self.assertEqual(Notification.objects.using("replica").get().notification_type, "pass_expiry")
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+class ExpirySchedulerTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.owner = Owner.objects.create(name="A")
+        for i, days in enumerate([-10, -1, 2, 20]):
+            vehicle = Vehicle.objects.create(vehicle_number=f"KA01AB{i:04d}", owner=self.owner)
+            ParkingPass.objects.create(vehicle=vehicle, pass_type="monthly", expiry_date=self.now + timedelta(days=days))
+        reset_expiry_scheduler()
+        self.addCleanup(reset_expiry_scheduler)
+        self.scheduler = expiry_scheduler()
+        self.scheduler.recover(self.now)
+
+    def sent(self, kind):
+        return Notification.objects.filter(notification_type=kind).count()
+
+    def test_recovery_catches_up_and_due_events_fire_without_a_scan(self):
+        self.assertEqual((self.sent("pass_expiry"), self.sent("pass_reminder")), (2, 1))
+        # The +2 day pass: its reminder is already sent, its expiry is held; the +20 day pass is not loaded
+        self.assertEqual(len(self.scheduler), 2)
+        self.scheduler.tick(self.now)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.scheduler.tick(self.now + timedelta(minutes=10)), 0)
+        self.assertEqual(self.scheduler.tick(self.now + timedelta(days=2, minutes=1)), 1)
+        self.assertEqual(self.sent("pass_expiry"), 3)
+        self.assertTrue(Notification.objects.get(notification_type="pass_reminder").is_read)
+
+    def test_window_advances_to_later_passes(self):
+        self.scheduler.tick(self.now + timedelta(days=17, hours=1))
+        self.assertEqual(self.sent("pass_reminder"), 2)
+        self.scheduler.tick(self.now + timedelta(days=20, minutes=1))
+        self.assertEqual(self.sent("pass_expiry"), 4)
+
+    def test_new_and_extended_passes(self):
+        vehicle = Vehicle.objects.create(vehicle_number="KA01XY0001", owner=self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            ParkingPass.objects.create(vehicle=vehicle, pass_type="daily")
+        self.assertEqual(self.scheduler.tick(), 1)
+        self.assertEqual(self.sent("pass_reminder"), 2)
+
+        # Extended before it fires: the old expiry event finds nothing to send
+        ParkingPass.objects.filter(vehicle__vehicle_number="KA01AB0002").update(expiry_date=self.now + timedelta(days=30))
+        self.scheduler.tick(self.now + timedelta(days=2, minutes=1))
+        self.assertEqual(self.sent("pass_expiry"), 3)
+
+
+class RollupTests(ParkingAPITestCase):
+    def rollup_rows(self):
+        return {
+            model.__name__: sorted(model.objects.values_list("bucket", "vehicle_type", "transactions", "revenue", "dwell_seconds"))
+            for model in (HourlyRollup, DailyRollup)
+        }
+
+    def test_exits_maintain_rollups_and_match_a_rebuild(self):
+        t0 = timezone.now() - timedelta(hours=3)
+        self.enter("KA01AB1234")
+        self.exit("KA01AB1234")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/entry-exit/batch/", {"events": [
+                {"vehicle_number": "KA01XY0001", "action": "entry", "vehicle_type": "bike", "timestamp": t0.isoformat()},
+                {"vehicle_number": "KA01XY0001", "action": "exit", "timestamp": (t0 + timedelta(hours=2)).isoformat()},
+            ]}, format="json")
+
+        daily = {row.vehicle_type: row for row in DailyRollup.objects.all()}
+        self.assertEqual(daily["car"].transactions, 1)
+        self.assertEqual(daily["bike"].revenue, 20)
+        self.assertEqual(daily["bike"].average_dwell_minutes, 120)
+
+        incremental = self.rollup_rows()
+        today = timezone.localdate()
+        rebuild_rollups(today - timedelta(days=1), today)
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_revenue_report_reads_only_rollups(self):
+        today = timezone.localdate()
+        DailyRollup.objects.create(bucket=today, vehicle_type="car", transactions=2, revenue=60, dwell_seconds=14400)
+        DailyRollup.objects.create(bucket=today - timedelta(days=1), vehicle_type="car", transactions=1,
+                                   revenue=20, dwell_seconds=1800)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/reports/revenue/", {"period": "month", "start": (today - timedelta(days=1)).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(ParkingTransaction._meta.db_table not in q["sql"] for q in ctx.captured_queries))
+
+        self.assertEqual(sum(row["transactions"] for row in response.data["results"]), 3)
+
+        daily = self.client.get("/api/reports/revenue/").data["results"]
+        self.assertEqual([(row["transactions"], row["revenue"], row["average_dwell_minutes"]) for row in daily],
+                         [(1, 20.0, 30.0), (2, 60.0, 120.0)])
+
+
+class BenchmarkTests(TestCase):
+    def test_seed_and_replay_every_operation(self):
+        plate_cache.clear()
+        reset_guest_owner()
+        reset_facilities()
+        reset_plate_index()
+        seeded = seed(owners=5, vehicles=20, passes=4, days=3, per_day=5, parked=3)
+        self.assertEqual(ParkingTransaction.objects.filter(exit_time__isnull=True).count(), 3)
+        self.assertEqual(ParkingTransaction.objects.filter(exit_time__isnull=False).count(), seeded["transactions"])
+
+        user = User.objects.create_user(username="benchmark")
+        samples = run(user, requests=60)
+        summary = summarise(samples, wall_seconds=1.0)
+        self.assertEqual(summary["overall"]["requests"], 60)
+        self.assertEqual(summary["overall"]["errors"], 0)
+        self.assertEqual(summary["reads"]["requests"] + summary["writes"]["requests"], 60)
+        self.assertLessEqual(summary["endpoints"]["dashboard"]["p50_ms"], summary["endpoints"]["dashboard"]["p99_ms"])
+
+        slower = json.loads(json.dumps(summary))
+        slower["endpoints"]["dashboard"]["p95_ms"] *= 2
+        self.assertEqual(compare(summary, summary), [])
+        self.assertEqual(len(compare(slower, summary)), 1)
+
+
+class RequestMetricsTests(ParkingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        metrics_registry.reset()
+        self.addCleanup(setattr, metrics_registry, "enabled", False)
+        self.admin = User.objects.create_superuser(username="admin", password="secret")
+
+    def test_off_by_default_and_toggled_at_runtime(self):
+        self.assertNotIn("Server-Timing", self.client.get("/api/dashboard-stats/"))
+
+        self.client.force_authenticate(self.admin)
+        self.client.post("/api/metrics/", {"enabled": True}, format="json")
+        response = self.client.get("/api/transactions/")
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="\d+ queries", render;dur=[\d.]+, total')
+
+        endpoint = self.client.get("/api/metrics/").data["endpoints"]["GET /api/transactions/"]
+        self.assertEqual(endpoint["requests"], 1)
+        self.assertGreaterEqual(endpoint["queries_max"], 1)
+
+        self.client.post("/api/metrics/", {"enabled": False, "reset": True}, format="json")
+        self.assertNotIn("Server-Timing", self.client.get("/api/dashboard-stats/"))
+        self.assertEqual(self.client.get("/api/metrics/").data, {"enabled": False, "endpoints": {}})
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        self.assertEqual(self.client.post("/api/metrics/", {"enabled": True}, format="json").status_code, 403)
+        self.assertFalse(metrics_registry.enabled)
+
+    def test_repeated_query_shapes_are_flagged(self):
+        owner = Owner.objects.create(name="A")
+        ids = [Vehicle.objects.create(vehicle_number=f"KA01AB{i:04d}", owner=owner).id for i in range(6)]
+        recorder = RequestRecorder()
+        with connection.execute_wrapper(recorder):
+            for pk in ids:
+                Vehicle.objects.get(pk=pk)
+            list(Vehicle.objects.filter(id__in=ids))
+        self.assertEqual(list(recorder.repeated(5).values()), [6])
+        self.assertEqual(recorder.queries, 7)
+
+
+class PlateCacheTests(ParkingAPITestCase):
+    def reads(self, ctx):
+        tables = (Vehicle._meta.db_table, ParkingPass._meta.db_table, Owner._meta.db_table)
+        return [q["sql"] for q in ctx.captured_queries
+                if q["sql"].startswith("SELECT") and any(f'"{table}"' in q["sql"].split(" WHERE ")[0] for table in tables)]
+
+    def test_pass_holder_gate_events_skip_vehicle_and_pass_reads(self):
+        self.client.post("/api/create-pass/", {
+            "owner_name": "A", "vehicle_number": "KA01AB1234", "vehicle_type": "car", "pass_type": "monthly",
+        }, format="json")
+        self.enter("KA01AB1234")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.exit("KA01AB1234")
+            self.enter("KA01AB1234")
+        self.assertEqual(response.data["message"], "Vehicle KA01AB1234 exited.")
+        self.assertEqual(self.reads(ctx), [])
+
+    def test_new_pass_and_vehicle_edits_evict(self):
+        self.enter("KA01AB1234")
+        self.assertFalse(lookup_plate("KA01AB1234").has_pass())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/create-pass/", {
+                "owner_name": "A", "vehicle_number": "KA01AB1234", "vehicle_type": "car", "pass_type": "daily",
+            }, format="json")
+        self.assertEqual(self.exit("KA01AB1234").data["message"], "Vehicle KA01AB1234 exited.")
+
+        vehicle = Vehicle.objects.get(vehicle_number="KA01AB1234")
+        vehicle.vehicle_type = "bike"
+        with self.captureOnCommitCallbacks(execute=True):
+            vehicle.save()
+        self.assertEqual(lookup_plate("KA01AB1234").vehicle_type, "bike")
+
+    def test_entries_expire_with_the_pass(self):
+        vehicle = Vehicle.objects.create(vehicle_number="KA01AB1234", owner=Owner.objects.create(name="A"))
+        ParkingPass.objects.create(vehicle=vehicle, pass_type="daily", expiry_date=timezone.now() + timedelta(seconds=60))
+        with self.captureOnCommitCallbacks(execute=True):
+            lookup_plate("KA01AB1234")
+        value, expires_at = plate_cache._entries[get_facility(settings.DEFAULT_FACILITY).id, "KA01AB1234"]
+        self.assertLessEqual(expires_at - time.monotonic(), 60)
+
+    def test_lru_is_bounded_and_expires(self):
+        lru = LRUCache(maxsize=2, default_ttl=60)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertEqual((lru.get("a"), lru.get("b"), lru.get("c")), (1, None, 3))
+        lru.set("d", 4, ttl=0)
+        self.assertIsNone(lru.get("d"))
+
+    def test_lru_drops_entries_by_tag(self):
+        lru = LRUCache(maxsize=3)
+        lru.set("a", 1, tag=7)
+        lru.set("b", 2, tag=7)
+        lru.set("c", 3, tag=8)
+        lru.set("b", 2, tag=8)
+        self.assertEqual(lru.discard_tag(7), 1)
+        lru.set("d", 4, tag=8)
+        lru.set("e", 5)  # evicts "c"
+        self.assertEqual(lru.discard_tag(8), 2)
+        self.assertEqual((lru.get("b"), lru.get("d"), lru.get("e")), (None, None, 5))
+        self.assertEqual((lru._tags, lru._tagged), ({}, {}))
+
+
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="operator")
+        self.key = Token.objects.create(user=self.user).key
+        self.auth = CachedTokenAuthentication()
+
+    def test_a_known_token_costs_no_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.auth.authenticate_credentials(self.key)[0], self.user)
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.key)
+        self.assertEqual((user, token.key), (self.user, self.key))
+
+        request = RequestFactory().get("/", headers={"authorization": f"Token {self.key}"})
+        with self.assertNumQueries(0):
+            self.assertEqual(async_to_sync(atoken_user)(request), self.user)
+
+    def test_logout_and_deactivation_evict_the_token(self):
+        self.auth.authenticate_credentials(self.key)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.key}")
+        self.assertEqual(client.post("/parking/api/auth/logout/").status_code, 200)
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+        key = Token.objects.create(user=self.user).key
+        self.auth.authenticate_credentials(key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(key)
+
+    def test_a_delete_in_another_process_is_seen_only_after_the_ttl(self):
+        self.auth.authenticate_credentials(self.key)
+        # Another worker's logout: no signal here, and LocMemCache is not shared
+        Token.objects.filter(key=self.key)._raw_delete("default")
+        self.assertEqual(self.auth.authenticate_credentials(self.key)[0], self.user)
+        cache.delete(TOKEN_CACHE_KEY.format(key=self.key))  # what TOKEN_CACHE_TTL does
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+    @override_settings(TOKEN_CACHE_TTL=0)
+    def test_a_zero_ttl_turns_the_cache_off(self):
+        self.auth.authenticate_credentials(self.key)
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(self.key)
+
+
+class OwnerResolutionTests(ParkingAPITestCase):
+    def test_upsert_returns_the_single_row_per_name(self):
+        first = upsert_owner("A")
+        second = upsert_owner("A")
+        self.assertIsNotNone(first.pk)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Owner.objects.filter(name="A").count(), 1)
+
+    def test_guest_owner_is_resolved_once(self):
+        self.enter("KA01AB0001")
+        with CaptureQueriesContext(connection) as ctx:
+            self.enter("KA01AB0002")
+        self.assertFalse([q for q in ctx.captured_queries if Owner._meta.db_table in q["sql"]])
+        self.assertEqual(
+            set(Vehicle.objects.values_list("owner__name", flat=True)), {GUEST_OWNER_NAME}
+        )
+
+    def test_create_pass_reuses_the_owner(self):
+        for plate in ("KA01AB0001", "KA01AB0002"):
+            self.client.post("/api/create-pass/", {
+                "owner_name": "A", "vehicle_number": plate, "vehicle_type": "car", "pass_type": "daily",
+            }, format="json")
+        owner = Owner.objects.get(name="A")
+        self.assertEqual(owner.vehicles.count(), 2)
+
+
+class ConcurrentGateTests(TransactionTestCase):
+    """Parallel gate workers, each with its own connection to the file-backed test database."""
+
+    WORKERS = 8
+    PLATES = [f"KA01CC{i:04d}" for i in range(10)]
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("needs a file-backed test database")
+        ledger.reset()
+        slot_allocator.reset()
+        cache.clear()
+        plate_cache.clear()
+        reset_guest_owner()
+        reset_facilities()
+        reset_plate_index()
+        self.user = User.objects.create_user(username="operator", password="secret")
+
+    def run_workers(self, payload):
+        """Every worker posts `payload` for every plate at once; returns all status codes."""
+        barrier = threading.Barrier(self.WORKERS)
+
+        def worker(_):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                return [
+                    client.post("/api/entry-exit/", {"vehicle_number": plate, **payload}, format="json").status_code
+                    for plate in self.PLATES
+                ]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            return [code for codes in pool.map(worker, range(self.WORKERS)) for code in codes]
+
+    def test_parallel_gates_neither_double_enter_nor_lose_exits(self):
+        codes = self.run_workers({"vehicle_type": "car"})
+        self.assertEqual(codes.count(201), len(self.PLATES))
+        self.assertEqual(codes.count(400), len(self.PLATES) * (self.WORKERS - 1))
+        self.assertEqual(ParkingTransaction.objects.filter(exit_time__isnull=True).count(), len(self.PLATES))
+        self.assertEqual(Vehicle.objects.count(), len(self.PLATES))
+        self.assertEqual(Owner.objects.filter(name=GUEST_OWNER_NAME).count(), 1)
+
+        codes = self.run_workers({})
+        self.assertEqual(codes.count(200), len(self.PLATES))
+        self.assertEqual(codes.count(404), len(self.PLATES) * (self.WORKERS - 1))
+        self.assertEqual(ParkingTransaction.objects.filter(exit_time__isnull=False).count(), len(self.PLATES))
+        self.assertEqual(sum(DailyRollup.objects.values_list("transactions", flat=True)), len(self.PLATES))
+        self.assertEqual(ledger.snapshot(), ledger.count_from_db())
+
+
+class AsyncGateTests(TransactionTestCase):
+    """The async gate view, whose events run on their own pool threads and connections."""
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("needs a file-backed test database")
+        ledger.reset()
+        slot_allocator.reset()
+        cache.clear()
+        plate_cache.clear()
+        reset_guest_owner()
+        reset_facilities()
+        reset_plate_index()
+        self.token = Token.objects.create(user=User.objects.create_user(username="operator")).key
+
+    async def post_all(self, *payloads, token=None):
+        """Posts the payloads at once; returns (status, body) pairs in order."""
+        async def post(payload):
+            response = await self.async_client.post(
+                "/api/entry-exit/async/", payload, content_type="application/json",
+                headers={"authorization": f"Token {token or self.token}"},
+            )
+            return response.status_code, response.json(), response
+
+        try:
+            return await asyncio.gather(*(post(payload) for payload in payloads))
+        finally:
+            close_async_gate()
+
+    async def test_entry_and_exit_answer_like_the_sync_view(self):
+        [(code, body, _)] = await self.post_all({"vehicle_number": "ka01ab1234", "vehicle_type": "bike"})
+        self.assertEqual((code, body), (201, {"status": "success", "message": "Vehicle KA01AB1234 entered."}))
+        [(code, _, _)] = await self.post_all({"vehicle_number": "KA01AB1234", "vehicle_type": "bike"})
+        self.assertEqual(code, 400)
+
+        [(code, body, _)] = await self.post_all({"vehicle_number": "KA01AB1234"})
+        self.assertEqual(code, 200)
+        self.assertTrue(body["message"].startswith("Vehicle KA01AB1234 exited."))
+        [(code, _, _)] = await self.post_all({"vehicle_number": "KA01AB1234"})
+        self.assertEqual(code, 404)
+
+        txn = await ParkingTransaction.objects.aget()
+        self.assertEqual(txn.status, "Exited")
+
+    async def test_identical_reads_share_one_write(self):
+        results = await self.post_all(*[{"vehicle_number": "KA01AB1234", "vehicle_type": "car"}] * 5)
+        self.assertEqual([code for code, _, _ in results], [201] * 5)
+        self.assertEqual(sum(1 for _, body, _ in results if body.get("coalesced")), 4)
+        self.assertEqual(await ParkingTransaction.objects.acount(), 1)
+
+    @override_settings(GATE_ASYNC_MAX_PENDING=2)
+    async def test_sheds_load_beyond_the_pending_limit(self):
+        results = await self.post_all(*[{"vehicle_number": f"KA01AB000{i}", "vehicle_type": "car"} for i in range(4)])
+        self.assertEqual([code for code, _, _ in results], [201, 201, 503, 503])
+        self.assertEqual(results[2][2]["Retry-After"], "1")
+        self.assertEqual(await ParkingTransaction.objects.acount(), 2)
+
+    async def test_requires_a_token(self):
+        [(code, _, _)] = await self.post_all({"vehicle_number": "KA01AB1234"}, token="wrong")
+        self.assertEqual(code, 401)
+
+
+class GateJournalTests(ParkingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "gate.jsonl")
+
+    def journal(self, **kwargs):
+        journal = GateJournal(self.path, fsync=False, **kwargs)
+        journal.open()
+        self.addCleanup(journal.stop)
+        return journal
+
+    def apply(self, journal):
+        with self.captureOnCommitCallbacks(execute=True):
+            return journal.apply_all()
+
+    def test_events_apply_in_arrival_order(self):
+        journal = self.journal()
+        for plate, action in [("KA01AB0001", "entry"), ("KA01AB0001", "exit"), ("KA01AB0001", "entry"),
+                              ("KA01AB0002", "exit")]:
+            journal.append(plate, action, "car")
+        self.assertEqual(ParkingTransaction.objects.count(), 0)
+
+        self.assertEqual(self.apply(journal), 4)
+        stays = ParkingTransaction.objects.filter(vehicle__vehicle_number="KA01AB0001").order_by("id")
+        self.assertEqual([stay.exit_time is None for stay in stays], [False, True])
+        self.assertEqual(ledger.occupied(), 1)
+        self.assertEqual(GateJournalCheckpoint.objects.get(name="gate.jsonl").sequence, 4)
+        lag = journal.lag()
+        self.assertEqual([lag[key] for key in ["journaled_sequence", "applied_sequence", "pending", "applied", "failed"]],
+                         [4, 4, 0, 3, 1])
+
+    def test_restart_replays_past_the_checkpoint_and_drops_a_torn_line(self):
+        journal = self.journal(batch_size=2)
+        for i in range(3):
+            journal.append(f"KA01AB000{i}", "entry", "car")
+        with self.captureOnCommitCallbacks(execute=True):
+            journal.apply_pending()
+        journal.stop()
+        with open(self.path, "ab") as f:
+            f.write(b'{"seq": 4, "vehicle_nu')  # crashed mid-append, never acknowledged
+
+        restarted = self.journal()
+        self.assertEqual(restarted.lag()["pending"], 1)
+        self.assertEqual(restarted.append("KA01AB0009", "entry", "car"), 4)
+        self.assertEqual(self.apply(restarted), 2)
+        self.assertEqual(ParkingTransaction.objects.filter(exit_time__isnull=True).count(), 4)
+        with open(self.path, "rb") as f:
+            self.assertEqual([json.loads(line)["seq"] for line in f], [1, 2, 3, 4])
+
+
+    def test_a_file_open_in_another_journal_is_refused(self):
+        journal = self.journal()
+        journal.append("KA01AB0001", "entry", "car")
+        with self.assertRaises(JournalInUse):
+            GateJournal(self.path).open()
+        with self.assertRaises(CommandError):
+            call_command("replay_gate_journal", f"--path={self.path}", stdout=StringIO())
+
+        journal.stop()
+        self.assertEqual(self.journal().lag()["pending"], 1)
+
+    def test_events_of_an_unknown_facility_fail_instead_of_moving(self):
+        journal = self.journal()
+        with facility_scope(FacilityInfo(99, "closed", "Closed Car Park")):
+            journal.append("KA01AB0001", "entry", "car")
+        journal.append("KA01AB0002", "entry", "car")
+
+        with self.assertLogs("parking_app.journal", "WARNING"):
+            self.assertEqual(self.apply(journal), 2)
+        self.assertEqual(list(ParkingTransaction.objects.values_list("vehicle__vehicle_number", flat=True)),
+                         ["KA01AB0002"])
+        lag = journal.lag()
+        self.assertEqual([lag[key] for key in ["applied_sequence", "applied", "failed"]], [2, 1, 1])
+
+
+class GateJournalWorkerTests(TransactionTestCase):
+    """The journal endpoint with its background worker, on the file-backed test database."""
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("needs a file-backed test database")
+        ledger.reset()
+        slot_allocator.reset()
+        cache.clear()
+        plate_cache.clear()
+        reset_guest_owner()
+        reset_facilities()
+        reset_plate_index()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(GATE_JOURNAL_PATH=os.path.join(directory.name, "gate.jsonl"))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(reset_gate_journal)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="admin", is_staff=True))
+
+    def test_events_are_acknowledged_then_applied(self):
+        codes = [
+            self.client.post("/api/entry-exit/journal/", {"vehicle_number": "ka01ab0001", "action": action},
+                             format="json")
+            for action in ["entry", "exit"]
+        ]
+        self.assertEqual([response.status_code for response in codes], [202, 202])
+        self.assertEqual([response.data["sequence"] for response in codes], [1, 2])
+
+        deadline = time.monotonic() + 10
+        while self.client.get("/api/entry-exit/journal/").data["pending"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        lag = self.client.get("/api/entry-exit/journal/").data
+        self.assertEqual((lag["applied_sequence"], lag["applied"], lag["failed"]), (2, 2, 0))
+        self.assertTrue(lag["worker_running"])
+        self.assertEqual(ParkingTransaction.objects.get(vehicle__vehicle_number="KA01AB0001").status, "Exited")
+
+
+class SQLiteProfileTests(TransactionTestCase):
+    @skipUnless(connection.vendor == "sqlite" and settings.SQLITE_PROFILE == "performance", "performance profile only")
+    def test_pragmas_are_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            def pragma(name):
+                cursor.execute(f"PRAGMA {name}")
+                return cursor.fetchone()[0]
+
+            if not connection.is_in_memory_db():
+                self.assertEqual(pragma("journal_mode"), "wal")
+            self.assertEqual(pragma("synchronous"), 1)  # NORMAL
+            self.assertEqual(pragma("busy_timeout"), 20000)  # from OPTIONS['timeout']
+            self.assertEqual(pragma("temp_store"), 2)  # MEMORY
+            self.assertEqual(pragma("cache_size"), -65536)
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite only")
+    def test_a_benchmark_profile_is_restored_and_not_shared(self):
+        options = connection.settings_dict["OPTIONS"]
+        with use_sqlite_profile("performance"):
+            self.assertEqual(Owner.objects.count(), 0)
+            self.assertIn("journal_mode=WAL", connection.settings_dict["OPTIONS"]["init_command"])
+            self.assertEqual(connections["replica"].settings_dict["OPTIONS"]["init_command"], options["init_command"])
+        self.assertIs(connection.settings_dict["OPTIONS"], options)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(ParkingAPITestCase):
+    """The replica's test database never receives writes, so rows only show up when read from the primary."""
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        super().setUp()
+        vehicle = Vehicle.objects.create(vehicle_number="KA01AB1234", owner=Owner.objects.create(name="A"))
+        now = timezone.now()
+        ParkingTransaction.objects.create(vehicle=vehicle, entry_time=now - timedelta(hours=2),
+                                          exit_time=now - timedelta(hours=1), status="Exited")
+
+    def test_list_and_stats_views_read_from_the_replica(self):
+        for url in ["/api/transactions/", "/api/passes/", "/api/passes/expiring/", "/api/dashboard-stats/"]:
+            with self.subTest(url=url), CaptureQueriesContext(connections["replica"]) as ctx:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(ctx.captured_queries)
+        self.assertEqual(self.client.get("/api/transactions/").data["results"], [])
+
+    def test_gate_writes_and_their_reads_stay_on_the_primary(self):
+        with CaptureQueriesContext(connections["replica"]) as ctx:
+            self.enter("KA01XY0001")
+            self.exit("KA01XY0001")
+        self.assertEqual(ctx.captured_queries, [])
+
+    def test_writer_reads_its_own_writes(self):
+        self.enter("KA01XY0001")
+        self.assertEqual(len(self.client.get("/api/transactions/").data["results"]), 2)
+
+        other = APIClient()
+        other.force_authenticate(self.user)
+        self.assertEqual(other.get("/api/transactions/").data["results"], [])
+
+    def test_occupancy_is_counted_on_the_primary(self):
+        self.enter("KA01XY0001")
+        ledger.reset()
+        slot_allocator.reset()
+        other = APIClient()
+        other.force_authenticate(self.user)
+        self.assertEqual(other.get("/api/dashboard-stats/").data["slots_filled"], 1)
+
+
+class QueryPlanTests(ParkingAPITestCase):
+    """Hot queries must be answered from an index, never a full table scan."""
+
+    # Every step on the big tables must SEARCH one of these; a SCAN, even of an index, reads the whole table
+    HOT_TABLE_STEP = re.compile(
+        r"\b(SEARCH|SCAN) (parking_app_parkingtransaction|parking_app_parkingpass)\b"
+        r"(?: USING (?:COVERING )?INDEX (\w+)| USING INTEGER PRIMARY KEY)?"
+    )
+    INDEXES = {
+        "parking_app_parkingtransaction": {
+            "txn_facility_entry_idx", "txn_facility_open_idx", "one_open_txn_per_vehicle", "one_open_txn_per_slot",
+        },
+        "parking_app_parkingpass": {
+            "pass_facility_expiry_idx", "pass_facility_issue_idx", "pass_vehicle_expiry_idx",
+            "parking_app_parkingpass_vehicle_id_59cd573d",  # the vehicle foreign key's
+        },
+    }
+
+    def setUp(self):
+        super().setUp()
+        # Mostly closed history with a few vehicles still parked, as in production
+        owner = Owner.objects.create(name="A")
+        now = timezone.now()
+        for i in range(20):
+            vehicle = Vehicle.objects.create(vehicle_number=f"KA01AB{i:04d}", owner=owner)
+            ParkingPass.objects.create(vehicle=vehicle, pass_type="weekly", expiry_date=now - timedelta(days=i))
+            ParkingTransaction.objects.bulk_create(
+                ParkingTransaction(vehicle=vehicle, entry_time=now - timedelta(days=d, hours=2),
+                                   exit_time=now - timedelta(days=d), status="Exited")
+                for d in range(1, 30)
+            )
+            if i < 3:
+                ParkingTransaction.objects.create(vehicle=vehicle)
+
+    def assertIndexedQueries(self, request, ordered_by_index=True):
+        with CaptureQueriesContext(connection) as ctx:
+            response = request()
+        self.assertLess(response.status_code, 500)
+        for query in ctx.captured_queries:
+            if not query["sql"].startswith("SELECT"):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                plan = "\n".join(row[-1] for row in cursor.fetchall())
+            for step, table, index in self.HOT_TABLE_STEP.findall(plan):
+                self.assertEqual(step, "SEARCH", f"{query['sql']}\n{plan}")
+                if index:
+                    self.assertIn(index, self.INDEXES[table], f"{query['sql']}\n{plan}")
+            if ordered_by_index:
+                self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan, query["sql"])
+
+    def test_read_endpoints_use_indexes(self):
+        for url in [
+            "/api/dashboard-stats/",
+            "/parking/api/stats/",
+            "/api/available-slots/",
+            "/api/transactions/",
+            "/api/transactions/?page_size=5&cursor=eyJwIjogWyIyMDI1LTAxLTAxVDAwOjAwOjAwKzAwOjAwIiwgMTBdfQ==",
+            "/api/passes/",
+            "/api/passes/expiring/",
+            "/parking/api/transactions/recent/",
+        ]:
+            with self.subTest(url=url):
+                ledger.reset()
+                slot_allocator.reset()
+                self.assertIndexedQueries(lambda: self.client.get(url))
+
+    def test_gate_events_use_indexes(self):
+        # Gate lookups may sort their (at most one) open transaction in memory
+        self.assertIndexedQueries(lambda: self.exit("KA01AB0001"), ordered_by_index=False)
+        self.assertIndexedQueries(lambda: self.enter("KA01AB0001"), ordered_by_index=False)
+        self.assertIndexedQueries(lambda: self.client.post("/api/create-pass/", {
+            "owner_name": "A", "vehicle_number": "KA01AB0001", "vehicle_type": "car", "pass_type": "daily",
+        }, format="json"), ordered_by_index=False)
+
+
+@override_settings(LIVE_STREAM_SECONDS=5, LIVE_HEARTBEAT_SECONDS=5)
+class LiveDashboardTests(ParkingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        live.broker.reset()
+        self.addCleanup(live.broker.reset)
+
+    @staticmethod
+    def events(frames):
+        events = []
+        for frame in frames.decode().split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in frame.splitlines() if not line.startswith(":"))
+            if "event" in fields:
+                events.append((fields["event"], json.loads(fields["data"])))
+        return events
+
+    def test_gate_event_is_encoded_once_for_every_subscriber(self):
+        first, second = live.broker.subscribe(), live.broker.subscribe()
+        with mock.patch("parking_app.live.encode", wraps=live.encode) as encode:
+            self.enter("KA01AB1234")
+        self.assertEqual(encode.call_count, 1)
+
+        frames = first.drain()
+        self.assertEqual(frames, second.drain())
+        [(event, data)] = self.events(frames)
+        self.assertEqual(event, "gate")
+        self.assertEqual(data["slots_filled"], 1)
+        self.assertEqual(data["occupancy"]["car"], 1)
+        self.assertEqual(data["transactions"][0]["vehicle_number"], "KA01AB1234")
+        self.assertEqual(data["earnings_delta"], 0)
+
+        # Earnings today count stays that entered today
+        now = timezone.now()
+        ParkingTransaction.objects.update(entry_time=max(now - timedelta(hours=3), day_bounds(now)[0]))
+        self.exit("KA01AB1234")
+        [(_, data)] = self.events(first.drain())
+        self.assertEqual(data["slots_filled"], 0)
+        self.assertEqual(data["transactions"][0]["status"], "Exited")
+        self.assertEqual(data["earnings_delta"], float(ParkingTransaction.objects.get().fees_paid))
+
+    def test_legacy_exit_still_returns_the_updated_stats(self):
+        self.enter("KA01AB1234")
+        self.enter("KA01AB0001")
+        response = self.client.post("/parking/api/entry-exit/", {"vehicle_no": "ka01ab1234", "action": "exit"}, format="json")
+        fee = float(ParkingTransaction.objects.get(exit_time__isnull=False).fees_paid)
+        self.assertEqual(response.json()["updated"], {"slots_filled": 1, "earnings_today": fee})
+
+    def test_nothing_is_published_without_subscribers(self):
+        with mock.patch.object(live.broker, "publish") as publish:
+            self.enter("KA01AB1234")
+            self.client.post("/api/entry-exit/batch/", {"events": [
+                {"vehicle_number": "KA01AB1234", "action": "exit"},
+            ]}, format="json")
+        publish.assert_not_called()
+
+    def test_batch_reports_each_stay_once(self):
+        subscriber = live.broker.subscribe()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/entry-exit/batch/", {"events": [
+                {"vehicle_number": "KA01AB0001", "action": "entry"},
+                {"vehicle_number": "KA01AB0002", "action": "entry"},
+                {"vehicle_number": "KA01AB0001", "action": "exit"},
+            ]}, format="json")
+        [(event, data)] = self.events(subscriber.drain())
+        self.assertEqual(event, "gate")
+        self.assertEqual([(t["vehicle_number"], t["status"]) for t in data["transactions"]],
+                         [("KA01AB0001", "Exited"), ("KA01AB0002", "Parked")])
+        self.assertEqual(data["slots_filled"], 1)
+
+    def test_stream_sends_a_snapshot_then_updates(self):
+        self.enter("KA01AB0001")
+        client = APIClient()
+        token = Token.objects.create(user=self.user)
+        response = client.get(f"/parking/api/dashboard/stream/?token={token.key}", HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        chunks = iter(response.streaming_content)
+        [(event, data)] = self.events(next(chunks))
+        self.assertEqual(event, "snapshot")
+        self.assertEqual(data["stats"]["slots_filled"], 1)
+        self.assertEqual(data["recent"][0]["vehicle_number"], "KA01AB0001")
+        self.assertEqual(live.broker.subscribers, 1)
+
+        self.enter("KA01AB0002")
+        events = dict(self.events(next(chunks)))
+        self.assertEqual(events["gate"]["slots_filled"], 2)
+        self.assertEqual(events["stats"]["vehicles_today"], 2)
+
+        response.close()
+        self.assertEqual(live.broker.subscribers, 0)
+
+    def test_stream_requires_a_token(self):
+        response = APIClient().get("/parking/api/dashboard/stream/?token=wrong", HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(response.content.startswith(b"event: error\n"))
+        self.assertEqual(live.broker.subscribers, 0)
+
+    def test_async_stream_wakes_on_publish(self):
+        subscriber = live.broker.subscribe()
+
+        async def read():
+            chunks = live.broker.astream(subscriber, live.encode("snapshot", {}))
+            first = await chunks.__anext__()
+            live.broker.publish("gate", {"n": 1})
+            second = await chunks.__anext__()
+            await chunks.aclose()
+            return first, second
+
+        first, second = async_to_sync(read)()
+        self.assertTrue(first.startswith(b"retry: 2000\n\n"))
+        self.assertIn(("gate", {"n": 1}), self.events(second))
+        self.assertEqual(live.broker.subscribers, 0)
@@ -18,6 +18,7 @@ urlpatterns = [
 
     # Dashboard APIs
     path('api/dashboard/stats/', views.DashboardStatsView.as_view(), name='dashboard_stats'),
+    path('api/dashboard/stream/', views.DashboardStreamView.as_view(), name='dashboard_stream'),
     path('api/passes/', views.AllPassesView.as_view(), name='all_passes'),
     path('api/transactions/recent/', views.RecentTransactionsView.as_view(), name='recent_transactions'),
     path('api/transactions/', views.AllTransactionsView.as_view(), name='transactions'),
@@ -1,26 +1,57 @@
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Sum, Q
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
 from datetime import timedelta
 import json
 
 from rest_framework import generics, views, status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 
-from .models import Owner, Vehicle, ParkingPass, ParkingTransaction
+from .authentication import CachedTokenAuthentication, QueryTokenAuthentication, atoken_user
+from .facilities import current_facility
+from .exports import CONTENT_TYPES, export_rows, iter_export
+from .gate import GateOverloaded, apply_gate_events, async_gate, enter_vehicle, exit_vehicle
+from .journal import gate_journal
+from .live import EventStreamRenderer, broker as live_broker, encode as encode_event, stats_payload
+from .metrics import registry as metrics_registry
+from .models import Owner, Vehicle, ParkingPass, ParkingTransaction, DailyRollup, HourlyRollup
+from .occupancy import ledger
+from .slots import ParkingFull, allocator, slot_totals
+from .owners import upsert_owner
+from .plate_search import match_parked, parked_matches, plate_index
+from .pagination import TransactionPagination, PassPagination, OwnerPagination, VehiclePagination
+from .routers import ReplicaReadMixin
+from .stats import dashboard_stats, invalidate_dashboard_stats, start_of_day
 from .serializers import (
     OwnerSerializer,
     VehicleSerializer,
     ParkingPassSerializer,
     ParkingTransactionSerializer,
+    OwnerValuesSerializer,
+    VehicleValuesSerializer,
+    ParkingPassValuesSerializer,
+    ParkingTransactionValuesSerializer,
+    ValuesListMixin,
     CreatePassRequestSerializer,
     VehicleEntryRequestSerializer,
-    VehicleExitRequestSerializer
+    VehicleExitRequestSerializer,
+    GateEventBatchRequestSerializer,
+    JournaledGateEventRequestSerializer,
+    TransactionExportRequestSerializer,
+    RevenueReportRequestSerializer,
+    HourlyReportRequestSerializer,
+    PlateSearchRequestSerializer,
+    MetricsToggleRequestSerializer
 )
 
 # ======================================================
@@ -57,17 +88,20 @@ def create_pass(request):
     if not owner_name or not vehicle_no:
         return JsonResponse({"error": "Missing required fields"}, status=400)
 
-    owner, _ = Owner.objects.get_or_create(name=owner_name)
+    owner = upsert_owner(owner_name)
     vehicle, _ = Vehicle.objects.get_or_create(
         vehicle_number=vehicle_no.upper(),
         defaults={"vehicle_type": vehicle_type, "owner": owner}
     )
 
-    # Prevent duplicate active pass
-    if ParkingPass.objects.filter(vehicle=vehicle, expiry_date__gt=timezone.now()).exists():
+    # Prevent duplicate active pass at this facility
+    if ParkingPass.objects.filter(
+        facility_id=current_facility().id, vehicle=vehicle, expiry_date__gt=timezone.now()
+    ).exists():
         return JsonResponse({"error": "Vehicle already has an active pass"}, status=400)
 
     ParkingPass.objects.create(vehicle=vehicle, pass_type=pass_type)
+    invalidate_dashboard_stats()
     return JsonResponse({"success": True, "message": f"Pass created for {vehicle_no}"})
 
 
@@ -84,48 +118,35 @@ def record_entry_exit(request):
     if not vehicle_no or not action:
         return JsonResponse({"error": "Missing fields"}, status=400)
 
-    vehicle, _ = Vehicle.objects.get_or_create(
-        vehicle_number=vehicle_no.upper(),
-        defaults={"vehicle_type": vehicle_type}
-    )
-
     # ENTRY
     if action == "entry":
-        if ParkingTransaction.objects.filter(vehicle=vehicle, exit_time__isnull=True).exists():
+        try:
+            transaction = enter_vehicle(vehicle_no.upper(), vehicle_type, guest_owner=False)
+        except ParkingFull as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        if transaction is None:
             return JsonResponse({"error": "Vehicle already parked"}, status=400)
-
-        ParkingTransaction.objects.create(vehicle=vehicle, status="Parked")
-        return JsonResponse({"success": True, "message": f"{vehicle_no} entered successfully"})
+        return JsonResponse({"success": True, "message": f"{vehicle_no} entered successfully",
+                             **_slot_body(transaction)})
 
     # EXIT
     elif action == "exit":
-        transaction = ParkingTransaction.objects.filter(vehicle=vehicle, exit_time__isnull=True).last()
+        vehicle_no, transaction = _exit_misread(vehicle_no.upper())
         if not transaction:
-            return JsonResponse({"error": "Vehicle not currently parked"}, status=400)
-
-        transaction.exit_time = timezone.now()
-        transaction.status = "Exited"
-
-        # If no valid pass, charge fee
-        has_pass = ParkingPass.objects.filter(vehicle=vehicle, expiry_date__gt=timezone.now()).exists()
-        if not has_pass:
-            transaction.fees_paid = transaction.calculate_fees()
-        else:
-            transaction.fees_paid = 0.0
-
-        transaction.save()
+            return JsonResponse({"error": "Vehicle not currently parked",
+                                 "suggestions": _suggestions(vehicle_no)}, status=400)
 
         msg = f"{vehicle_no} exited successfully"
         if transaction.fees_paid:
             msg += f" | Fee: ₹{transaction.fees_paid}"
 
-        # ✅ Trigger auto-dashboard refresh data
+        # ✅ Trigger auto-dashboard refresh data; open dashboards also get it from the live stream
         return JsonResponse({
             "success": True,
             "message": msg,
             "updated": {
-                "slots_filled": ParkingTransaction.objects.filter(exit_time__isnull=True).count(),
-                "earnings_today": float(ParkingTransaction.objects.aggregate(Sum('fees_paid'))['fees_paid__sum'] or 0.0)
+                "slots_filled": ledger.occupied(),
+                "earnings_today": dashboard_stats()["earnings_today"],
             }
         })
 
@@ -135,30 +156,26 @@ def record_entry_exit(request):
 
 
 def get_dashboard_stats(request):
-    now = timezone.now()
-    active_passes = ParkingPass.objects.filter(expiry_date__gt=now).count()
-    vehicles_today = ParkingTransaction.objects.filter(entry_time__date=now.date()).count()
-    earnings_today = ParkingTransaction.objects.aggregate(total=Sum("fees_paid"))["total"] or 0.0
-    slots_filled = ParkingTransaction.objects.filter(exit_time__isnull=True).count()
+    stats = dashboard_stats()
 
     return JsonResponse({
-        "active_passes": active_passes,
-        "vehicles_today": vehicles_today,
-        "earnings_today": earnings_today,
-        "slots_filled": slots_filled
+        "active_passes": stats["active_passes"],
+        "vehicles_today": stats["transactions_today"],
+        "earnings_today": stats["earnings_today"],
+        "slots_filled": ledger.occupied()
     })
 
 
 def get_available_slots(request):
-    TOTAL_CAR_SLOTS = 50
-    TOTAL_BIKE_SLOTS = 50
-
-    cars_occupied = ParkingTransaction.objects.filter(vehicle__vehicle_type="car", exit_time__isnull=True).count()
-    bikes_occupied = ParkingTransaction.objects.filter(vehicle__vehicle_type="bike", exit_time__isnull=True).count()
+    totals = slot_totals()
+    occupancy = ledger.snapshot()
+    # 'other' vehicles park in car bays
+    cars_occupied = occupancy["car"] + occupancy["other"]
+    bikes_occupied = occupancy["bike"]
 
     return JsonResponse({
-        "cars": {"total": TOTAL_CAR_SLOTS, "occupied": cars_occupied, "available": TOTAL_CAR_SLOTS - cars_occupied},
-        "bikes": {"total": TOTAL_BIKE_SLOTS, "occupied": bikes_occupied, "available": TOTAL_BIKE_SLOTS - bikes_occupied},
+        "cars": {"total": totals["car"], "occupied": cars_occupied, "available": totals["car"] - cars_occupied},
+        "bikes": {"total": totals["bike"], "occupied": bikes_occupied, "available": totals["bike"] - bikes_occupied},
     })
 
 
@@ -187,53 +204,73 @@ class LogoutView(views.APIView):
 # ======================================================
 # ========== DASHBOARD / TRANSACTIONS ==================
 # ======================================================
-class DashboardStatsView(views.APIView):
+class DashboardStatsView(ReplicaReadMixin, views.APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        now = timezone.now()
-
-        # Active passes that are not expired
-        active_passes = ParkingPass.objects.filter(expiry_date__gt=now).count()
-
-        # Today's transactions
-        today_txns = ParkingTransaction.objects.filter(entry_time__date=now.date())
-
-        # Distinct vehicles today
-        vehicles_today = today_txns.values("vehicle__vehicle_number").distinct().count()
+        # Active passes, distinct vehicles and earnings today (one cached query)
+        stats = dashboard_stats()
 
-        # Total earnings today
-        earnings = today_txns.aggregate(total=Sum("fees_paid"))["total"] or 0
-
-        # Vehicles still parked (exit_time is null)
-        occupied_count = ParkingTransaction.objects.filter(exit_time__isnull=True).count()
+        # Vehicles still parked, from the in-memory occupancy ledger
+        occupied_count = ledger.occupied()
 
         # Format the data for frontend
         data = {
-            "active_passes_count": active_passes,
-            "vehicles_today": vehicles_today,
-            "earnings_today": round(float(earnings), 2),
+            "active_passes_count": stats["active_passes"],
+            "vehicles_today": stats["vehicles_today"],
+            "earnings_today": stats["earnings_today"],
             "slots_filled": occupied_count,  # send only number, not "x / 100"
         }
 
         return Response(data)
 
 
-class TransactionsView(generics.ListAPIView):
+class DashboardStreamView(views.APIView):
+    """
+    Server-Sent Events feed for the overview: a `snapshot` on connect, then
+    `gate` deltas and changed `stats` as they happen (see live.py).
+    EventSource cannot set headers, so the token may come as ?token=.
+    """
+    authentication_classes = [QueryTokenAuthentication, CachedTokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
-    serializer_class = ParkingTransactionSerializer
+    renderer_classes = [EventStreamRenderer, JSONRenderer]
 
-    def get_queryset(self):
-        return ParkingTransaction.objects.select_related("vehicle__owner").order_by("-entry_time")
-
-
-
-class AllTransactionsView(generics.ListAPIView):
+    def get(self, request):
+        # Subscribe before taking the snapshot so no event falls between the two
+        subscriber = live_broker.subscribe()
+        try:
+            occupancy = ledger.snapshot()
+            recent = (
+                ParkingTransaction.objects.filter(facility_id=current_facility().id)
+                .select_related("vehicle__owner").order_by("-entry_time")[:5]
+            )
+            first = encode_event("snapshot", {
+                "stats": {**stats_payload(), "slots_filled": sum(occupancy.values())},
+                "occupancy": occupancy,
+                "recent": ParkingTransactionSerializer(recent, many=True).data,
+            })
+        except Exception:
+            live_broker.unsubscribe(subscriber)
+            raise
+
+        stream = live_broker.astream if isinstance(request._request, ASGIRequest) else live_broker.stream
+        response = StreamingHttpResponse(stream(subscriber, first), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # stop nginx buffering the stream
+        return response
+
+
+class TransactionsView(ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ParkingTransactionSerializer
+    values_serializer_class = ParkingTransactionValuesSerializer
+    pagination_class = TransactionPagination
 
     def get_queryset(self):
-        return ParkingTransaction.objects.select_related("vehicle__owner").order_by("-entry_time")
+        return (
+            ParkingTransaction.objects.filter(facility_id=current_facility().id)
+            .select_related("vehicle__owner").order_by("-entry_time", "-id")
+        )
 
 
 # ======================================================
@@ -251,38 +288,48 @@ class CreatePassView(views.APIView):
         vehicle_type = serializer.validated_data['vehicle_type']
         pass_type = serializer.validated_data['pass_type']
 
-        owner, _ = Owner.objects.get_or_create(name=owner_name)
+        owner = upsert_owner(owner_name)
         vehicle, created_vehicle = Vehicle.objects.get_or_create(
             vehicle_number=vehicle_number,
             defaults={'owner': owner, 'vehicle_type': vehicle_type}
         )
 
-        if ParkingPass.objects.filter(vehicle=vehicle, expiry_date__gt=timezone.now()).exists():
+        if ParkingPass.objects.filter(
+            facility_id=current_facility().id, vehicle=vehicle, expiry_date__gt=timezone.now()
+        ).exists():
             return Response({'status': 'error', 'message': 'Vehicle already has an active pass.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
         ParkingPass.objects.create(vehicle=vehicle, pass_type=pass_type)
+        invalidate_dashboard_stats()
         return Response({'status': 'success', 'message': f'Pass for {vehicle_number} created successfully!'},
                         status=status.HTTP_201_CREATED)
 
 
-class AllPassesView(generics.ListAPIView):
+class AllPassesView(ReplicaReadMixin, ValuesListMixin, generics.ListAPIView):
     """Returns all parking passes with owner/vehicle details."""
     permission_classes = [IsAuthenticated]
     serializer_class = ParkingPassSerializer
+    values_serializer_class = ParkingPassValuesSerializer
+    pagination_class = PassPagination
 
     def get_queryset(self):
-        return ParkingPass.objects.select_related('vehicle__owner').order_by('-issue_date')
+        return (
+            ParkingPass.objects.filter(facility_id=current_facility().id)
+            .select_related('vehicle__owner').order_by('-issue_date', '-id')
+        )
 
 
-class ExpiryNotificationsView(generics.ListAPIView):
+class ExpiryNotificationsView(ReplicaReadMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ParkingPassSerializer
 
     def get_queryset(self):
         now = timezone.now()
         soon = now + timedelta(days=7)
-        return ParkingPass.objects.filter(expiry_date__gt=now, expiry_date__lte=soon).select_related("vehicle__owner")
+        return ParkingPass.objects.filter(
+            facility_id=current_facility().id, expiry_date__gt=now, expiry_date__lte=soon
+        ).select_related("vehicle__owner")
 
     def list(self, request, *args, **kwargs):
         now = timezone.now()
@@ -309,114 +356,390 @@ class VehicleEntryExitView(views.APIView):
         if entry_serializer.is_valid():
             vehicle_number = entry_serializer.validated_data['vehicle_number'].upper()
             vehicle_type = entry_serializer.validated_data['vehicle_type']
-            guest_owner, _ = Owner.objects.get_or_create(name='Guest')
-
-            vehicle, _ = Vehicle.objects.get_or_create(
-                vehicle_number=vehicle_number,
-                defaults={'owner': guest_owner, 'vehicle_type': vehicle_type}
-            )
 
-            if ParkingTransaction.objects.filter(vehicle=vehicle, exit_time__isnull=True).exists():
+            try:
+                transaction = enter_vehicle(vehicle_number, vehicle_type)
+            except ParkingFull as exc:
+                return Response({'status': 'error', 'message': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            if transaction is None:
                 return Response({'status': 'error', 'message': 'Vehicle is already parked inside.'},
                                 status=status.HTTP_400_BAD_REQUEST)
-
-            ParkingTransaction.objects.create(vehicle=vehicle)
-            return Response({'status': 'success', 'message': f'Vehicle {vehicle_number} entered.'},
-                            status=status.HTTP_201_CREATED)
+            return Response({'status': 'success', 'message': f'Vehicle {vehicle_number} entered.',
+                             **_slot_body(transaction)}, status=status.HTTP_201_CREATED)
 
         # Try exit
         exit_serializer = VehicleExitRequestSerializer(data=request.data)
         if exit_serializer.is_valid():
-            vehicle_number = exit_serializer.validated_data['vehicle_number'].upper()
-            transaction = ParkingTransaction.objects.filter(
-                vehicle__vehicle_number=vehicle_number, exit_time__isnull=True
-            ).first()
+            read = exit_serializer.validated_data['vehicle_number'].upper()
+            vehicle_number, transaction = _exit_misread(read)
 
             if not transaction:
-                return Response({'status': 'error', 'message': 'No active entry for this vehicle.'},
-                                status=status.HTTP_404_NOT_FOUND)
-
-            transaction.exit_time = timezone.now()
-
-            if not ParkingPass.objects.filter(vehicle=transaction.vehicle, expiry_date__gt=timezone.now()).exists():
-                transaction.fees_paid = transaction.calculate_fees()
-
-            transaction.status = "Exited"
-            transaction.save()
+                return Response({'status': 'error', 'message': 'No active entry for this vehicle.',
+                                 'suggestions': _suggestions(read)}, status=status.HTTP_404_NOT_FOUND)
 
             msg = f'Vehicle {vehicle_number} exited.'
             if transaction.fees_paid:
                 msg += f' Fees: ₹{transaction.fees_paid:.2f}'
-            return Response({'status': 'success', 'message': msg}, status=status.HTTP_200_OK)
+            body = {'status': 'success', 'message': msg}
+            if vehicle_number != read:
+                body['matched_vehicle_number'] = vehicle_number
+            return Response(body, status=status.HTTP_200_OK)
 
         return Response({'status': 'error', 'message': 'Invalid entry or exit data.'},
                         status=status.HTTP_400_BAD_REQUEST)
 
+
+class GateEventBatchView(views.APIView):
+    """
+    Applies a burst of buffered camera events ({"events": [...]}) in
+    timestamp order within one transaction and reports a result per event.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = GateEventBatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = apply_gate_events(serializer.validated_data['events'])
+        applied = sum(1 for result in results if result['status'] == 'success')
+        return Response({
+            'status': 'success',
+            'applied': applied,
+            'failed': len(results) - applied,
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+class GateJournalView(views.APIView):
+    """
+    POST journals one gate event and answers 202 before it is applied; a
+    background worker applies it shortly after, in arrival order per plate
+    (see journal.py). GET reports how far the worker lags (admins only).
+    """
+
+    def get_permissions(self):
+        return [IsAdminUser()] if self.request.method == 'GET' else [IsAuthenticated()]
+
+    def post(self, request):
+        serializer = JournaledGateEventRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        event = serializer.validated_data
+
+        sequence = gate_journal().append(event['vehicle_number'].upper(), event['action'], event['vehicle_type'])
+        return Response({'status': 'accepted', 'sequence': sequence}, status=status.HTTP_202_ACCEPTED)
+
+    def get(self, request):
+        return Response(gate_journal().lag())
+
+
+def _exit_misread(vehicle_number):
+    """
+    exit_vehicle(), retried on the one parked vehicle whose plate differs from
+    the read only in look-alike characters (PLATE_AUTO_MATCH). Returns the
+    plate that exited and its transaction, which is None if nothing exited.
+    """
+    transaction = exit_vehicle(vehicle_number)
+    if transaction is None and getattr(settings, 'PLATE_AUTO_MATCH', False):
+        matched = match_parked(vehicle_number)
+        if matched:
+            return matched, exit_vehicle(matched)
+    return vehicle_number, transaction
+
+
+def _suggestions(vehicle_number):
+    """Parked plates within one edit of a read that matched nothing, for the operator to pick from."""
+    return [match.vehicle_number for match in parked_matches(vehicle_number)]
+
+
+# ======================================================
+# ========== ASYNC GATE (served by asgi.py) ============
+# ======================================================
+@csrf_exempt
+async def vehicle_entry_exit_async(request):
+    """
+    VehicleEntryExitView for ASGI servers, with the same payloads and answers.
+
+    An answer shared with an identical in-flight event also carries
+    "coalesced": true. When too many events are queued, the view answers 503
+    with Retry-After. Authenticates with an `Authorization: Token` header.
+    """
+    if request.method != "POST":
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+    if await atoken_user(request) is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+
+    entry_serializer = VehicleEntryRequestSerializer(data=data)
+    exit_serializer = VehicleExitRequestSerializer(data=data)
+    if entry_serializer.is_valid():
+        action, params = "entry", entry_serializer.validated_data
+    elif exit_serializer.is_valid():
+        action, params = "exit", exit_serializer.validated_data
+    else:
+        return JsonResponse({'status': 'error', 'message': 'Invalid entry or exit data.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    vehicle_number = params['vehicle_number'].upper()
+    try:
+        result, coalesced = await async_gate().apply(action, vehicle_number, params.get('vehicle_type', 'car'))
+    except GateOverloaded:
+        response = JsonResponse({'status': 'error', 'message': 'Gate is busy, retry shortly.'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = '1'
+        return response
+    except ParkingFull as exc:
+        return JsonResponse({'status': 'error', 'message': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if action == "entry" and result is None:
+        body, code = {'status': 'error', 'message': 'Vehicle is already parked inside.'}, status.HTTP_400_BAD_REQUEST
+    elif action == "entry":
+        body = {'status': 'success', 'message': f'Vehicle {vehicle_number} entered.', **_slot_body(result)}
+        code = status.HTTP_201_CREATED
+    elif result is None:
+        body, code = {'status': 'error', 'message': 'No active entry for this vehicle.'}, status.HTTP_404_NOT_FOUND
+    else:
+        msg = f'Vehicle {vehicle_number} exited.'
+        if result.fees_paid:
+            msg += f' Fees: ₹{result.fees_paid:.2f}'
+        body, code = {'status': 'success', 'message': msg}, status.HTTP_200_OK
+    if coalesced:
+        body['coalesced'] = True
+    return JsonResponse(body, status=code)
+
+
 # ======================================================
 # ========== SLOT STATUS (for dashboard) ===============
 # ======================================================
 class SlotsDataView(views.APIView):
     """
-    Returns available and occupied slots for cars and bikes.
+    Returns available and occupied slots for cars and bikes. Totals come
+    from the bay inventory, or TOTAL_*_SLOTS where no bays are configured.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        TOTAL_CAR_SLOTS = 50
-        TOTAL_BIKE_SLOTS = 50
-
-        parked = ParkingTransaction.objects.filter(exit_time__isnull=True).select_related('vehicle')
-        cars_occupied = parked.filter(Q(vehicle__vehicle_type='car') | Q(vehicle__vehicle_type='other')).count()
-        bikes_occupied = parked.filter(vehicle__vehicle_type='bike').count()
+        totals = slot_totals()
+        cars_occupied = ledger.occupied('car', 'other')
+        bikes_occupied = ledger.occupied('bike')
 
         return Response({
             'cars_occupied': cars_occupied,
             'bikes_occupied': bikes_occupied,
-            'total_car_slots': TOTAL_CAR_SLOTS,
-            'total_bike_slots': TOTAL_BIKE_SLOTS,
-            'car_available': TOTAL_CAR_SLOTS - cars_occupied,
-            'bike_available': TOTAL_BIKE_SLOTS - bikes_occupied,
+            'total_car_slots': totals['car'],
+            'total_bike_slots': totals['bike'],
+            'car_available': totals['car'] - cars_occupied,
+            'bike_available': totals['bike'] - bikes_occupied,
         })
 
+
+class ZoneAvailabilityView(views.APIView):
+    """Bays, occupied bays and free bays per zone and slot type, from the slot allocator."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(allocator.zones())
+
+
+def _slot_body(transaction):
+    """The bay an entry was given, for the gate to direct the driver to."""
+    bay = transaction.slot_id and allocator.bay(transaction.slot_id)
+    return {'slot': bay.payload()} if bay else {}
+
 # ======================================================
 # ========== OWNERS, VEHICLES & TRANSACTIONS ===========
 # ======================================================
 
-class OwnersListView(generics.ListAPIView):
+class OwnersListView(ValuesListMixin, generics.ListAPIView):
     """
     Returns a list of all vehicle owners.
     """
     permission_classes = [IsAuthenticated]
     serializer_class = OwnerSerializer
+    values_serializer_class = OwnerValuesSerializer
+    pagination_class = OwnerPagination
 
     def get_queryset(self):
-        return Owner.objects.all().order_by('name')
+        return Owner.objects.all().order_by('name', 'id')
+
+
+class PlateSearchView(views.APIView):
+    """
+    Registered plates matching a possibly misread ?plate=, nearest first:
+    distance 0 differs only in look-alike characters, 1 by one more edit.
+    ?parked=true keeps the vehicles parked at this facility.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        serializer = PlateSearchRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        if params['parked']:
+            matches = parked_matches(params['plate'], limit=params['limit'])
+        else:
+            matches = plate_index().search(params['plate'], limit=params['limit'])
+        return Response({
+            'plate': params['plate'],
+            'results': [match._asdict() for match in matches],
+        })
 
 
-class VehiclesListView(generics.ListAPIView):
+class VehiclesListView(ValuesListMixin, generics.ListAPIView):
     """
     Returns all registered vehicles with owner info.
     """
     permission_classes = [IsAuthenticated]
     serializer_class = VehicleSerializer
+    values_serializer_class = VehicleValuesSerializer
+    pagination_class = VehiclePagination
 
     def get_queryset(self):
-        return Vehicle.objects.select_related('owner').order_by('vehicle_number')
+        return Vehicle.objects.select_related('owner').order_by('vehicle_number', 'id')
 
 
-class AllTransactionsView(generics.ListAPIView):
+class AllTransactionsView(ReplicaReadMixin, ValuesListMixin, generics.ListAPIView):
     """
     Returns full transaction history (entry & exit).
     """
     permission_classes = [IsAuthenticated]
     serializer_class = ParkingTransactionSerializer
+    values_serializer_class = ParkingTransactionValuesSerializer
+    pagination_class = TransactionPagination
 
     def get_queryset(self):
-        return ParkingTransaction.objects.select_related('vehicle__owner').order_by('-entry_time')
+        return (
+            ParkingTransaction.objects.filter(facility_id=current_facility().id)
+            .select_related('vehicle__owner').order_by('-entry_time', '-id')
+        )
+
+
+class TransactionExportView(views.APIView):
+    """
+    Streams transaction history as CSV or NDJSON (?output=csv|ndjson),
+    optionally filtered by ?start=, ?end= (inclusive dates) and ?vehicle_type=.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        serializer = TransactionExportRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        output = params['output']
+
+        rows = export_rows(params.get('start'), params.get('end'), params.get('vehicle_type'))
+        response = StreamingHttpResponse(iter_export(output, rows), content_type=CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'attachment; filename="transactions.{output}"'
+        return response
+
 
 class RecentTransactionsView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ParkingTransactionSerializer
 
     def get_queryset(self):
-        return ParkingTransaction.objects.select_related("vehicle__owner").order_by("-entry_time")[:5]
+        return (
+            ParkingTransaction.objects.filter(facility_id=current_facility().id)
+            .select_related("vehicle__owner").order_by("-entry_time")[:5]
+        )
+
+
+# ======================================================
+# ========== REPORTS (rollup tables only) ==============
+# ======================================================
+def _rollup_row(row):
+    transactions = row['transactions']
+    return {
+        'vehicle_type': row['vehicle_type'],
+        'transactions': transactions,
+        'revenue': round(float(row['revenue']), 2),
+        'average_dwell_minutes': round(row['dwell_seconds'] / transactions / 60, 1) if transactions else 0.0,
+    }
+
+
+class RevenueReportView(views.APIView):
+    """
+    Transactions, revenue and average dwell per day/week/month/year and
+    vehicle type, read from the daily rollups.
+    """
+    permission_classes = [IsAuthenticated]
+
+    PERIODS = {
+        'day': (F('bucket'), timedelta(days=30)),
+        'week': (TruncWeek('bucket'), timedelta(weeks=12)),
+        'month': (TruncMonth('bucket'), timedelta(days=365)),
+        'year': (TruncYear('bucket'), timedelta(days=5 * 365)),
+    }
+
+    def get(self, request):
+        serializer = RevenueReportRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        trunc, default_span = self.PERIODS[params['period']]
+        end = params.get('end') or timezone.localdate()
+        start = params.get('start') or end - default_span
+
+        rollups = DailyRollup.objects.filter(facility_id=current_facility().id, bucket__gte=start, bucket__lte=end)
+        if params.get('vehicle_type'):
+            rollups = rollups.filter(vehicle_type=params['vehicle_type'])
+        rows = (
+            rollups.annotate(period_start=trunc)
+            .values('period_start', 'vehicle_type')
+            .annotate(transactions=Sum('transactions'), revenue=Sum('revenue'), dwell_seconds=Sum('dwell_seconds'))
+            .order_by('period_start', 'vehicle_type')
+        )
+
+        return Response({
+            'period': params['period'],
+            'start': start,
+            'end': end,
+            'results': [{'period_start': row['period_start'], **_rollup_row(row)} for row in rows],
+        })
+
+
+class HourlyTrafficReportView(views.APIView):
+    """Per-hour transactions, revenue and dwell for one day (?date=), from the hourly rollups."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        serializer = HourlyReportRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        day = serializer.validated_data.get('date') or timezone.localdate()
+        start = start_of_day(day)
+
+        rows = (
+            HourlyRollup.objects.filter(
+                facility_id=current_facility().id, bucket__gte=start, bucket__lt=start + timedelta(days=1)
+            )
+            .order_by('bucket', 'vehicle_type')
+            .values('bucket', 'vehicle_type', 'transactions', 'revenue', 'dwell_seconds')
+        )
+        return Response({
+            'date': day,
+            'results': [{'hour': row['bucket'], **_rollup_row(row)} for row in rows],
+        })
+
+
+# ======================================================
+# ========== REQUEST METRICS (admin only) ==============
+# ======================================================
+class RequestMetricsView(views.APIView):
+    """
+    GET: per-endpoint query counts and timings recorded by QueryMetricsMiddleware.
+    POST {"enabled": true|false, "reset": true}: switch recording on/off and/or clear the totals.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics_registry.snapshot())
+
+    def post(self, request):
+        serializer = MetricsToggleRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if 'enabled' in serializer.validated_data:
+            metrics_registry.enabled = serializer.validated_data['enabled']
+        if serializer.validated_data['reset']:
+            metrics_registry.reset()
+        return Response(metrics_registry.snapshot())
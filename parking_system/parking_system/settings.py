@@ -1,6 +1,8 @@
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
@@ -29,6 +31,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'parking_app.metrics.QueryMetricsMiddleware',  # Query counts/timings, toggled at /api/metrics/
+    'parking_app.routers.ReadYourWritesMiddleware',  # Keeps a client's reads on the primary right after it writes
+    'parking_app.facilities.FacilityMiddleware',  # Picks the facility (X-Facility or ?facility=) for the request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', # Add CORS middleware
@@ -63,12 +68,123 @@ WSGI_APPLICATION = 'parking_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+# PRAGMAs run on every new SQLite connection. 'performance' lets dashboard reads
+# proceed alongside gate writes (WAL) and trades fsyncs on every commit for
+# durability at checkpoints (synchronous=NORMAL); 'default' keeps SQLite's own.
+# Pick one with PARKING_SQLITE_PROFILE. 'default' is the default because WAL mode
+# is stored in the database file itself (and keeps -wal/-shm files next to it),
+# which would modify the committed development db.sqlite3; opt in to
+# 'performance' for deployments and load tests.
+SQLITE_PROFILES = {
+    'default': {},
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 268435456,         # 256 MiB of the file memory-mapped
+        'cache_size': -65536,           # 64 MiB page cache (negative = KiB)
+        'temp_store': 'MEMORY',
+    },
 }
+SQLITE_PROFILE = os.environ.get('PARKING_SQLITE_PROFILE', 'default')
+if SQLITE_PROFILE not in SQLITE_PROFILES:
+    raise ImproperlyConfigured(
+        f'PARKING_SQLITE_PROFILE must be one of {", ".join(SQLITE_PROFILES)}, not "{SQLITE_PROFILE}".'
+    )
+
+# PARKING_DB_ENGINE selects the backend: 'sqlite' (default) or 'postgresql'.
+# For PostgreSQL set PARKING_DB_NAME/USER/PASSWORD/HOST/PORT; connections come
+# from a psycopg pool (needs `pip install "psycopg[binary,pool]"`) sized by
+# PARKING_DB_POOL_MIN/MAX. PARKING_DB_REPLICA_HOST adds a 'replica' alias.
+DB_ENGINE = os.environ.get('PARKING_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    def postgres_database(host):
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('PARKING_DB_NAME', 'parking'),
+            'USER': os.environ.get('PARKING_DB_USER', 'parking'),
+            'PASSWORD': os.environ.get('PARKING_DB_PASSWORD', ''),
+            'HOST': host,
+            'PORT': os.environ.get('PARKING_DB_PORT', '5432'),
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('PARKING_DB_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('PARKING_DB_POOL_MAX', 10)),
+                    'timeout': 10,
+                },
+            },
+            # Pooled connections are returned to the pool after each request
+            'CONN_MAX_AGE': 0,
+        }
+
+    DATABASES = {'default': postgres_database(os.environ.get('PARKING_DB_HOST', 'localhost'))}
+    if os.environ.get('PARKING_DB_REPLICA_HOST'):
+        DATABASES['replica'] = postgres_database(os.environ['PARKING_DB_REPLICA_HOST'])
+        DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+else:
+    SQLITE_OPTIONS = {
+        # Take the write lock at BEGIN so parallel gate workers queue on the busy
+        # timeout instead of failing to upgrade a read lock mid-transaction
+        'transaction_mode': 'IMMEDIATE',
+        # Seconds to wait for a lock before "database is locked" (SQLite's busy_timeout), in every profile
+        'timeout': 20,
+        'init_command': ';'.join(
+            f'PRAGMA {name}={value}' for name, value in SQLITE_PROFILES[SQLITE_PROFILE].items()
+        ),
+    }
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            'OPTIONS': SQLITE_OPTIONS,
+            # Reuse connections across requests instead of reconnecting (and re-running the PRAGMAs) each time
+            'CONN_MAX_AGE': int(os.environ.get('PARKING_DB_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'TEST': {
+                # File-backed so the concurrency tests' threads share one real database
+                'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+            },
+        },
+        # Local stand-in for a read replica: a second connection to the same file
+        # (a replica with no lag). Its test database is a separate, never-updated
+        # file, which makes replica reads easy to tell apart in tests.
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            'OPTIONS': SQLITE_OPTIONS,
+            'CONN_MAX_AGE': int(os.environ.get('PARKING_DB_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db_replica.sqlite3')},
+        },
+    }
+
+# Facilities served from a database of their own, as "code=alias,..." in
+# PARKING_FACILITY_DATABASES. Each alias is added below (for SQLite, a file
+# named after it) unless already configured. Run `migrate --database <alias>`
+# and then `create_facility <code> <name>`.
+FACILITY_DATABASES = dict(
+    pair.split('=', 1) for pair in os.environ.get('PARKING_FACILITY_DATABASES', '').split(',') if '=' in pair
+)
+for _alias in FACILITY_DATABASES.values():
+    if _alias in DATABASES:
+        continue
+    if DB_ENGINE == 'postgresql':
+        DATABASES[_alias] = {**postgres_database(os.environ.get('PARKING_DB_HOST', 'localhost')), 'NAME': _alias}
+    else:
+        DATABASES[_alias] = {**DATABASES['default'], 'NAME': os.path.join(BASE_DIR, f'{_alias}.sqlite3'),
+                             'TEST': {'NAME': os.path.join(BASE_DIR, f'test_{_alias}.sqlite3')}}
+
+# The facility served when a request names none (X-Facility header or ?facility=)
+DEFAULT_FACILITY = os.environ.get('PARKING_DEFAULT_FACILITY', 'main')
+
+DATABASE_ROUTERS = ['parking_app.routers.PrimaryReplicaRouter']
+
+# Aliases the read-only list/stats views may read from (comma-separated in
+# PARKING_DB_READ_REPLICAS); empty sends every query to 'default'
+DATABASE_REPLICAS = [alias for alias in os.environ.get('PARKING_DB_READ_REPLICAS', '').split(',') if alias]
+
+# Seconds a client's reads stay on the primary after it writes, covering replica lag
+REPLICA_PIN_SECONDS = 5
 
 
 # Password validation
@@ -118,10 +234,84 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom settings for Parking App
 LOGIN_URL = 'login' # Name of your login URL pattern in parking_app/urls.py
 
-# Total parking slots (configurable)
+# Total parking slots, used for each slot type that has no bays in the Zone/Slot inventory
 TOTAL_CAR_SLOTS = 50
 TOTAL_BIKE_SLOTS = 50
 
+# Seconds between re-loads of the bay allocator's free lists from the database
+SLOT_CHECK_INTERVAL = 60
+
+# Parking tariffs per vehicle type; see parking_app/tariffs.py for all options
+PARKING_TARIFFS = {
+    'car': {'hourly_rate': 20, 'grace_minutes': 0, 'minimum_hours': 1, 'daily_cap': None, 'bands': []},
+    'bike': {'hourly_rate': 10, 'grace_minutes': 0, 'minimum_hours': 1, 'daily_cap': None, 'bands': []},
+    'other': {'hourly_rate': 15, 'grace_minutes': 0, 'minimum_hours': 1, 'daily_cap': None, 'bands': []},
+}
+
+# Seconds between occupancy ledger re-counts against the open transactions
+OCCUPANCY_CHECK_INTERVAL = 60
+
+# Seconds the combined dashboard stats stay cached between writes
+DASHBOARD_STATS_CACHE_TTL = 10
+
+# Default page size for the keyset-paginated listings (?page_size= overrides, max 500)
+API_PAGE_SIZE = 50
+
+# Rows fetched per round trip when streaming transaction exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Largest burst of camera events accepted by the batch entry/exit endpoint
+GATE_BATCH_MAX_EVENTS = 1000
+
+# Async gate endpoint (served through asgi.py): threads applying events per worker process,
+# and events running or queued before it answers 503
+GATE_ASYNC_CONCURRENCY = 4
+GATE_ASYNC_MAX_PENDING = 200
+
+# Write-behind gate journal (parking_app/journal.py): the append-only file (one per process, locked while open),
+# whether each append is fsynced before it is acknowledged, events applied per database
+# transaction, and the size past which a fully applied file is truncated
+GATE_JOURNAL_PATH = os.environ.get('PARKING_GATE_JOURNAL', os.path.join(BASE_DIR, 'gate_journal.jsonl'))
+GATE_JOURNAL_FSYNC = True
+GATE_JOURNAL_BATCH_SIZE = 500
+GATE_JOURNAL_MAX_BYTES = 16 * 1024 * 1024
+
+# Plates held by the gate lookup cache, and seconds an entry lives (never past its pass expiry)
+PLATE_CACHE_SIZE = 10000
+PLATE_CACHE_TTL = 300
+
+# Seconds between loads of newly registered vehicles into the fuzzy plate index (parking_app/plate_search.py),
+# and whether an exit read of an unregistered plate that matches no parked vehicle is applied to the one
+# parked vehicle whose plate differs from it only in look-alike characters (O/0, I/1, B/8, ...). Off by
+# default: the gate answers 404 with suggestions for the operator instead
+PLATE_INDEX_REFRESH = 60
+PLATE_AUTO_MATCH = False
+
+# Seconds an API token's user stays cached after a lookup (parking_app/authentication.py). Logging out
+# or saving the user evicts it, but only from this process unless CACHES is shared (e.g. Redis), so this
+# is also how long other workers may accept a revoked token. 0 turns the cache off
+TOKEN_CACHE_TTL = 30
+
+# Pass expiry scheduler (parking_app/expiry_scheduler.py, run by run_expiry_scheduler): days before expiry
+# that owners are reminded, seconds of upcoming expiries held beyond that, and seconds between checks for
+# passes created by other processes
+EXPIRY_REMINDER_DAYS = 3
+EXPIRY_SCHEDULER_HORIZON = 3600
+EXPIRY_SCHEDULER_POLL = 60
+
+# Per-request query/timing metrics (parking_app/metrics.py); can be toggled at runtime via /api/metrics/
+REQUEST_METRICS_ENABLED = False
+
+# Identical SELECT shapes per request at which a request is flagged as a likely N+1
+REQUEST_METRICS_N_PLUS_ONE_THRESHOLD = 5
+
+# Live dashboard stream (parking_app/live.py): events a slow client may fall behind before it is dropped,
+# seconds between stats checks, seconds between keep-alives and seconds before a stream is recycled
+LIVE_QUEUE_SIZE = 100
+LIVE_STATS_INTERVAL = 1
+LIVE_HEARTBEAT_SECONDS = 15
+LIVE_STREAM_SECONDS = 300
+
 
 # Security setting for local development without HTTPS
 # Set to True in production with HTTPS
@@ -138,7 +328,7 @@ CORS_ALLOWED_ORIGINS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'parking_app.authentication.CachedTokenAuthentication',  # TokenAuthentication without a query per request
         'rest_framework.authentication.SessionAuthentication', # Optional, for browsable API
     ],
     'DEFAULT_PERMISSION_CLASSES': [